@@ -1,15 +1,20 @@
+# Start the startup clock before the heavy imports
+from startup import LINK_STAGES, StartupTimer
+startup = StartupTimer(("window",) + LINK_STAGES + ("first frame",))
 # import Tkinter to create our GUI.
 from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu
-# import openCV for receiving the video frames
-import cv2
-# make imports from the Pillow library for displaying the video stream with Tkinter.
-from PIL import Image, ImageTk
+# import the video loop, which reads, resizes and shows the frames whenever the drone sends a new one
+from video_pipeline import VideoPipeline
 # Import the tello module
 from djitellopy import tello
-# Import threading for our takeoff/land method
-import threading
+# Import the asyncio command client for our takeoff/land method
+from tello_client import LAND_WAIT, AsyncTelloClient
 # import our flight commands
 from flight_commands import start_flying, stop_flying
+# import the telemetry recorder for the HUD and the flight log
+from telemetry import TelemetryRecorder, draw_hud
+# import the background link bring-up
+from drone_link import DroneLink
 
 
 # Class for controlling the drone via keyboard commands
@@ -23,12 +28,16 @@ class DroneController:
         # Create a hidden frame to handle input from key presses and releases
         self.input_frame = Frame(self.root)
 
-        # Initialize, connect, and turn on the drones video stream
+        # Initialize the drone, then connect and turn on its video stream on a background thread,
+        # so the window does not wait for the drone
         self.drone = tello.Tello()
-        self.drone.connect()
-        self.drone.streamon()
-        # Initialize a variable to get the video frames from the drone
-        self.frame = self.drone.get_frame_read()
+        # Record the drone's state packets into a ring buffer, from before it is connected
+        self.telemetry = TelemetryRecorder()
+        self.telemetry.tap_djitellopy(self.drone)
+        self.link = DroneLink(self.drone, startup, frame_size=(720, 480)).start()
+
+        # Start the command client; it sends takeoff and land from one background event loop
+        self.client = AsyncTelloClient().start()
 
         # Define a speed for the drone to fly at
         self.drone.speed = 50
@@ -36,6 +45,9 @@ class DroneController:
         # Label for displaying video stream
         self.cap_lbl = Label(self.root)
 
+        # Show the drone's video on the label, with the battery, height and speed drawn on top
+        self.pipeline = VideoPipeline(self.link, frame_size=(720, 480), overlay=self.draw_hud, startup=startup)
+
         # Frame to hold buttons
         self.button_frame = Frame(self.root)
 
@@ -55,11 +67,15 @@ class DroneController:
 
     # Define a method for taking off and landing
     def takeoff_land(self):
-        # Set the command for taking off or landing by checking the drones is_flying attribute
-        if self.drone.is_flying:
-            threading.Thread(target=self.drone.land).start()
+        # Set the command for taking off or landing by checking the clients is_flying attribute
+        if self.client.is_flying:
+            self.client.land().add_done_callback(self.on_landed)
         else:
-            threading.Thread(target=self.drone.takeoff).start()
+            self.client.takeoff()
+
+    # Save the flight's telemetry once the drone has landed
+    def on_landed(self, future):
+        self.telemetry.dump_flight()
 
     # Dummy method to show dropdown (no functionality for now)
     def show_dropdown(self):
@@ -109,8 +125,9 @@ class DroneController:
             self.dropdown_menu.pack(side='left', padx=10)
             self.button_frame.pack(anchor="center", pady=10)
 
-            # Call the video stream method
-            self.video_stream()
+            # Start showing the video; the link's notifications tell the pipeline when there is a new frame
+            startup.mark("window")
+            self.pipeline.attach(self.cap_lbl)
 
             # Start the tkinter main loop
             self.root.mainloop()
@@ -125,41 +142,26 @@ class DroneController:
     def dummy_function(self, event, key):
         print(f"Key {key} pressed")
 
-    # Method to display video stream
-    def video_stream(self):
-        # Define the height and width to resize the current frame to
-        h = 480
-        w = 720
-
-        # Read a frame from our drone
-        frame = self.frame.frame
-
-        frame = cv2.resize(frame, (w, h))
-
-        # Convert the current frame to the rgb colorspace
-        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-
-        # Convert this to a Pillow Image object
-        img = Image.fromarray(cv2image)
-
-        # Convert this then to a Tkinter compatible PhotoImage object
-        imgtk = ImageTk.PhotoImage(image=img)
-
-        # Set it to the photo image
-        self.cap_lbl.imgtk = imgtk
-
-        # Configure the photo image as the displayed image
-        self.cap_lbl.configure(image=imgtk)
-
-        # Update the video stream label with the current frame
-        # by recursively calling the method itself with a delay.
-        self.cap_lbl.after(10, self.video_stream)
+    # Draw battery, height and speed on top of every frame the pipeline shows,
+    # including the link status shown until the first frame arrives
+    def draw_hud(self, frame):
+        return draw_hud(frame, self.telemetry.ring)
 
     # Method for cleaning up resources
     def cleanup(self) -> None:
+        # Release any resources
+        print("Cleaning up resources...")
+        self.pipeline.stop()
+        # djitellopy did not take off itself, so land through the client if we are still in the air; never let a
+        # failed or slow landing skip the rest of the teardown or hang the GUI
+        if self.client.is_flying:
+            try:
+                self.client.land().result(timeout=LAND_WAIT)
+            except Exception as e:
+                print(f"Error landing during cleanup: {e}")
         try:
-            # Release any resources
-            print("Cleaning up resources...")
+            self.client.stop()
+            self.telemetry.stop()
             self.drone.end()
             self.root.quit()  # Quit the Tkinter main loop
             exit()
@@ -1,69 +1,13 @@
 from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu
 import cv2
-from PIL import Image, ImageTk
 from djitellopy import tello
 import threading
-import face_recognition
-import os
-import numpy as np
 
 from flight_commands import start_flying, stop_flying
-
-# Load known faces and their encodings from a directory
-def load_known_faces(directory):
-    known_face_encodings = []
-    known_face_names = []
-
-    for file_name in os.listdir(directory):
-        if file_name.endswith((".jpg", ".png")):
-            image_path = os.path.join(directory, file_name)
-            image = face_recognition.load_image_file(image_path)
-            face_encodings = face_recognition.face_encodings(image)
-            if face_encodings:
-                known_face_encodings.append(face_encodings[0])
-                known_face_names.append(os.path.splitext(file_name)[0])
-
-    return known_face_encodings, known_face_names
-
-# Function to calculate confidence from face distance
-def calculate_confidence(face_distance, face_match_threshold=0.6):
-    if face_distance > face_match_threshold:
-        linear_val = (1.0 - face_distance) / (0.1 - face_match_threshold)
-        return max(0.0, min(1.0, linear_val)) * 100
-    else:
-        linear_val = (1.0 - face_distance) / (face_match_threshold - 0.1)
-        return max(0.0, min(1.0, linear_val)) * 100
-
-# Function to perform face recognition on a single frame
-def recognize_faces(frame, known_face_encodings, known_face_names):
-    small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-    rgb_small_frame = small_frame[:, :, ::-1]
-    face_locations = face_recognition.face_locations(rgb_small_frame)
-    face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-    face_names = []
-    face_confidences = []
-    face_distances = []
-
-    for face_encoding in face_encodings:
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-        name = "Unknown"
-        confidence = 0.0
-        distance = 0.0  
-
-        face_distances_current = face_recognition.face_distance(known_face_encodings, face_encoding)
-        best_match_index = np.argmin(face_distances_current)
-        if matches[best_match_index]:
-            name = known_face_names[best_match_index]
-            confidence = calculate_confidence(face_distances_current[best_match_index])
-            distance = face_distances_current[best_match_index]  
-
-        face_names.append(name)
-        face_confidences.append(confidence)
-        face_distances.append(distance)
-
-    return face_locations, face_names, face_confidences, face_distances
-
+from face_recognition_system import FaceRecognition
+from gui_helpers import set_menu_options
+from drone_link import DroneLink
+from video_pipeline import VideoPipeline
 
 class DroneController:
     def __init__(self):
@@ -73,10 +17,9 @@ class DroneController:
 
         self.input_frame = Frame(self.root)
 
+        # Connect and start the video in the background while the UI is built and the gallery loads
         self.drone = tello.Tello()
-        self.drone.connect()
-        self.drone.streamon()
-        self.frame = self.drone.get_frame_read()
+        self.link = DroneLink(self.drone, frame_size=(720, 480)).start()
 
         self.drone.speed = 50
 
@@ -88,10 +31,15 @@ class DroneController:
 
         
         faces_dir = "faces"
-        self.known_face_encodings, self.known_face_names = load_known_faces(faces_dir)
+        self.face_recognition_system = FaceRecognition(faces_dir, min_confidence=0, load=False)
+        # Frames are resized and converted into reusable buffers shared with the recognition pipeline
+        self.pipeline = VideoPipeline(self.link, self.process_frame, pool=self.face_recognition_system.frame_pool)
+        self.face_recognition_system.load_in_background()
         self.dropdown_var = StringVar(self.root)
         self.dropdown_var.set("Disable")
-        self.dropdown_menu = OptionMenu(self.button_frame, self.dropdown_var, "Disable", *self.known_face_names)
+        self.dropdown_menu = OptionMenu(self.button_frame, self.dropdown_var, "Disable")
+        self.dropdown_menu.configure(state="disabled")
+        self.menu_gallery_version = None
 
         
         self.FOCAL_LENGTH = 800  
@@ -147,7 +95,8 @@ class DroneController:
             self.dropdown_menu.pack(side='left', padx=10)
             self.button_frame.pack(anchor="center", pady=10)
 
-            self.video_stream()
+            self.refresh_face_menu()
+            self.pipeline.attach(self.cap_lbl)
 
             self.root.mainloop()
 
@@ -156,77 +105,66 @@ class DroneController:
         finally:
             self.cleanup()
 
-    def video_stream(self):
-        h, w = 480, 720
-
-        
-        frame = self.frame.frame
-
-        if frame is not None:
-            frame = cv2.resize(frame, (w, h))
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            selected_name = self.face_detection_var.get()
-            if selected_name != "Disable":
-                if selected_name in self.known_face_names:
-                    idx = self.known_face_names.index(selected_name)
-                    target_encodings = [self.known_face_encodings[idx]]
-                    target_names = [self.known_face_names[idx]]
-                else:
-                    target_encodings = self.known_face_encodings
-                    target_names = self.known_face_names
-
-                face_locations, face_names, face_confidences, face_distances = recognize_faces(frame, target_encodings, target_names)
-                for (top, right, bottom, left), name, confidence, distance in zip(face_locations, face_names, face_confidences, face_distances):
-                    top *= 4
-                    right *= 4
-                    bottom *= 4
-                    left *= 4
-
-                    if name != "Unknown":
-                        face_width_pixels = right - left
-                        distance = self.calculate_distance(face_width_pixels)
-
-                        
-                        if distance > 200:
-                            self.drone.move_forward(20)  
-                        elif distance < 190:
-                            self.drone.move_back(20)  
-
-                        
-                        face_center_x = (left + right) // 2
-                        frame_center_x = w // 2
-                        if face_center_x < frame_center_x - 50:
-                            self.drone.move_left(20)  
-                        elif face_center_x > frame_center_x + 50:
-                            self.drone.move_right(20)  
-
-                        
-                        face_center_y = (top + bottom) // 2
-                        frame_center_y = h // 2
-                        if face_center_y < frame_center_y - 50:
-                            self.drone.move_up(20)  
-                        elif face_center_y > frame_center_y + 50:
-                            self.drone.move_down(20)  
-
-                        # Display the bounding box and label
-                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                        cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
-                        font = cv2.FONT_HERSHEY_DUPLEX
-                        label = f"{name} ({confidence:.2f}%) Distance: {distance:.2f} cm"
-                        cv2.putText(frame, label, (left + 6, bottom - 6), font, 0.5, (255, 255, 255), 1)
-
-            img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA))
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.cap_lbl.imgtk = imgtk
-            self.cap_lbl.configure(image=imgtk)
-
-        self.cap_lbl.after(10, self.video_stream)
-
+    def refresh_face_menu(self):
+        """Keep the dropdown in step with the gallery, which loads and changes in the background"""
+        recognition = self.face_recognition_system
+        if recognition.ready.is_set() and recognition.gallery_version != self.menu_gallery_version:
+            self.menu_gallery_version = recognition.gallery_version
+            set_menu_options(self.dropdown_menu, self.dropdown_var, ["Disable", *recognition.known_face_names])
+            self.dropdown_menu.configure(state="normal")
+        if recognition.load_error is None:
+            self.root.after(250, self.refresh_face_menu)
+
+    def process_frame(self, frame, arrival):
+        h, w = frame.shape[:2]
+
+        selected_name = self.dropdown_var.get()
+        if selected_name != "Disable":
+            face_locations, face_names, face_confidences, face_distances = self.face_recognition_system.recognize_faces(frame)
+            for (top, right, bottom, left), name, confidence, distance in zip(face_locations, face_names, face_confidences, face_distances):
+                if name != selected_name:
+                    continue
+
+                top, right, bottom, left = self.face_recognition_system.to_frame((top, right, bottom, left))
+
+                if name != "Unknown":
+                    face_width_pixels = right - left
+                    distance = self.calculate_distance(face_width_pixels)
+
+
+                    if distance > 200:
+                        self.drone.move_forward(20)  
+                    elif distance < 190:
+                        self.drone.move_back(20)  
+
+
+                    face_center_x = (left + right) // 2
+                    frame_center_x = w // 2
+                    if face_center_x < frame_center_x - 50:
+                        self.drone.move_left(20)  
+                    elif face_center_x > frame_center_x + 50:
+                        self.drone.move_right(20)  
+
+
+                    face_center_y = (top + bottom) // 2
+                    frame_center_y = h // 2
+                    if face_center_y < frame_center_y - 50:
+                        self.drone.move_up(20)  
+                    elif face_center_y > frame_center_y + 50:
+                        self.drone.move_down(20)  
+
+                    # Display the bounding box and label
+                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+                    cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
+                    font = cv2.FONT_HERSHEY_DUPLEX
+                    label = f"{name} ({confidence:.2f}%) Distance: {distance:.2f} cm"
+                    cv2.putText(frame, label, (left + 6, bottom - 6), font, 0.5, (255, 255, 255), 1)
+        return frame
 
     def cleanup(self):
         try:
             print("Cleaning up resources...")
+            self.pipeline.stop()
             self.drone.end()
             self.root.quit()
             exit()
@@ -1,121 +1,50 @@
-import os
-import cv2
-import numpy as np
-import face_recognition
-from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu
-from PIL import Image, ImageTk
-
-class FaceRecognition:
-    def __init__(self, faces_dir):
-        self.faces_dir = faces_dir
-        self.known_face_encodings, self.known_face_names = self.load_known_faces()
-        self.locked_face_name = None
-        self.FOCAL_LENGTH = 800
-        self.KNOWN_FACE_WIDTH = 16  # Rata-rata lebar wajah manusia dalam cm
-
-    def load_known_faces(self):
-        known_face_encodings = []
-        known_face_names = []
-        for file_name in os.listdir(self.faces_dir):
-            if file_name.endswith((".jpg", ".png")):
-                image_path = os.path.join(self.faces_dir, file_name)
-                image = face_recognition.load_image_file(image_path)
-                face_encodings = face_recognition.face_encodings(image)
-                if face_encodings:
-                    known_face_encodings.append(face_encodings[0])
-                    known_face_names.append(os.path.splitext(file_name)[0])
-        return known_face_encodings, known_face_names
-
-    @staticmethod
-    def calculate_confidence(face_distance, face_match_threshold=0.7):
-        if face_distance > face_match_threshold:
-            linear_val = (1.0 - face_distance) / (0.1 - face_match_threshold)
-            return max(0.0, min(1.0, linear_val)) * 100
-        else:
-            linear_val = (1.0 - face_distance) / (face_match_threshold - 0.1)
-            return max(0.0, min(1.0, linear_val)) * 100
-
-    def calculate_distance(self, face_width_pixels):
-        if face_width_pixels == 0:
-            return 0.0
-        return (self.KNOWN_FACE_WIDTH * self.FOCAL_LENGTH) / face_width_pixels
-
-    def recognize_faces(self, frame):
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = small_frame[:, :, ::-1]
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-        face_names = []
-        face_confidences = []
-        face_distances = []
-
-        for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-            name = "Unknown"
-            confidence = 0.0
-            distance = 0.0
-
-            face_distances_current = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances_current)
-            if matches[best_match_index]:
-                confidence = self.calculate_confidence(face_distances_current[best_match_index])
-                if confidence > 95:
-                    name = self.known_face_names[best_match_index]
-
-            face_names.append(name)
-            face_confidences.append(confidence)
-            face_distances.append(distance)
-
-        return face_locations, face_names, face_confidences, face_distances
-
-    def lock_face(self, name):
-        if name in self.known_face_names:
-            self.locked_face_name = name
-            print(f"Locked face: {self.locked_face_name}")
-        else:
-            self.locked_face_name = None
-            print("Face recognition is enable")
-
-    def display_results(self, frame, face_locations, face_names, face_confidences, face_distances):
-        for (top, right, bottom, left), name, confidence, distance in zip(face_locations, face_names, face_confidences, face_distances):
-            if self.locked_face_name is None or name == self.locked_face_name:
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-
-                face_width_pixels = right - left
-                distance = self.calculate_distance(face_width_pixels)
-
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                label = f"{name} ({confidence:.2f}%) Distance: {distance:.2f} cm"
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
-                font = cv2.FONT_HERSHEY_DUPLEX
-                fontScale = 0.5 
-                cv2.putText(frame, label, (left + 6, bottom - 6), font, fontScale, (255, 255, 255), 1)
-
-        return frame
+import sys
+from startup import StartupTimer
+# Start the clock before the heavy imports, for the startup time breakdown
+startup = StartupTimer()
+
+from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu, simpledialog, messagebox
+from face_recognition_system import FaceRecognition
+from frame_sources import open_source
+from gui_helpers import set_menu_options
+from quality_governor import QualityGovernor
+from tiled_detection import TiledDetector, parse_tiles
+from video_pipeline import VideoPipeline
 
 class WebcamController:
-    def __init__(self, face_recognition_system):
+    def __init__(self, face_recognition_system, source):
         self.root = Tk()
         self.root.title("Webcam Controller - Tkinter")
         self.root.minsize(800, 600)
 
         self.face_recognition_system = face_recognition_system
-        self.cap = cv2.VideoCapture(0)
+        # A webcam by default, read on its own thread, which wakes the display for every new frame
+        self.source = source
 
         self.input_frame = Frame(self.root)
         self.cap_lbl = Label(self.root)
+        # Click a face in the video to select it for enrollment
+        self.cap_lbl.bind("<Button-1>", self.on_video_click)
+        # Trades detection rate, detection scale, display rate and encoder for latency; a webcam never lands
+        self.governor = QualityGovernor(face_recognition_system, landed_profile=None)
+        # Frames are resized and converted into reusable buffers shared with the recognition pipeline
+        self.pipeline = VideoPipeline(source, self.process_frame, pool=face_recognition_system.frame_pool,
+                                      startup=startup, governor=self.governor)
         self.button_frame = Frame(self.root)
 
         self.demo_button = Button(self.button_frame, text="Demo Button", command=self.demo_function)
         self.demo_button.pack(side='left', padx=10)
 
+        self.enroll_button = Button(self.button_frame, text="Enroll Face", command=self.enroll_face)
+        self.enroll_button.pack(side='left', padx=10)
+
         self.face_detection_var = StringVar(self.root)
         self.face_detection_var.set("Disable")
-        self.face_detection_menu = OptionMenu(self.button_frame, self.face_detection_var, "Disable", "Enable All", *self.face_recognition_system.known_face_names, command=self.on_dropdown_select)
+        self.face_detection_menu = OptionMenu(self.button_frame, self.face_detection_var, "Disable", command=self.on_dropdown_select)
+        # Face recognition loads in the background; the dropdown is enabled once it is ready
+        self.face_detection_menu.configure(state="disabled")
+        # Gallery version the dropdown entries were built from
+        self.menu_gallery_version = None
         self.face_detection_menu.pack(side='left')
 
         self.button_frame.pack(anchor="center", pady=10)
@@ -123,6 +52,22 @@ class WebcamController:
     def demo_function(self):
         print("Demo Button clicked!")
 
+    def on_video_click(self, event):
+        # Recognition works on a reduced-size frame
+        name = self.face_recognition_system.select_face(*self.face_recognition_system.to_detection(event.x, event.y))
+        if name is not None:
+            print(f"Selected face: {name}")
+
+    def enroll_face(self):
+        name = simpledialog.askstring("Enroll Face", "Name of the selected person:", parent=self.root)
+        if not name:
+            return
+        persist = messagebox.askyesno("Enroll Face", f"Also save {name.strip()} to the faces folder?", parent=self.root)
+        try:
+            self.face_recognition_system.start_enrollment(name.strip(), persist=persist)
+        except ValueError as e:
+            print(f"Cannot enroll: {e}")
+
     def on_dropdown_select(self, selection):
         print(f"{selection} is clicked")
         if selection == "Disable":
@@ -137,7 +82,11 @@ class WebcamController:
             self.input_frame.pack()
             self.input_frame.focus_set()
             self.cap_lbl.pack(anchor="center", pady=15)
-            self.video_stream()
+            startup.mark("window")
+            self.face_recognition_system.load_in_background(startup)
+            self.refresh_face_menu()
+            self.source.start()
+            self.pipeline.attach(self.cap_lbl)
             self.button_frame.pack(anchor="s", pady=10) 
             self.root.mainloop()
         except Exception as e:
@@ -145,36 +94,49 @@ class WebcamController:
         finally:
             self.cleanup()
 
-    def video_stream(self):
-        h, w = 480, 720
-        ret, frame = self.cap.read()
-
-        if ret:
-            frame = cv2.resize(frame, (w, h))
-            face_locations, face_names, face_confidences, face_distances = [], [], [], []
-
-            if self.face_detection_var.get() != "Disable":
-                face_locations, face_names, face_confidences, face_distances = self.face_recognition_system.recognize_faces(frame)
-
-            frame = self.face_recognition_system.display_results(frame, face_locations, face_names, face_confidences, face_distances)
-
-            img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA))
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.cap_lbl.imgtk = imgtk
-            self.cap_lbl.configure(image=imgtk)
-
-        self.cap_lbl.after(10, self.video_stream)
+    def refresh_face_menu(self):
+        """Keep the dropdown in step with the gallery, which loads and changes in the background"""
+        recognition = self.face_recognition_system
+        if recognition.ready.is_set() and recognition.gallery_version != self.menu_gallery_version:
+            self.menu_gallery_version = recognition.gallery_version
+            options = ["Disable", "Enable All", *recognition.known_face_names]
+            set_menu_options(self.face_detection_menu, self.face_detection_var, options, self.on_dropdown_select)
+            self.face_detection_menu.configure(state="normal")
+            if recognition.locked_face_name is not None:
+                # A newly enrolled face is locked straight away
+                self.face_detection_var.set(recognition.locked_face_name)
+        if recognition.load_error is None:
+            self.root.after(250, self.refresh_face_menu)
+
+    def process_frame(self, frame, arrival):
+        face_locations, face_names, face_confidences, face_distances = [], [], [], []
+
+        if self.face_detection_var.get() != "Disable":
+            face_locations, face_names, face_confidences, face_distances = self.face_recognition_system.recognize_faces(
+                frame, native=self.pipeline.source_frame)
+            frame = self.face_recognition_system.display_stats(frame)
+
+        return self.face_recognition_system.display_results(frame, face_locations, face_names, face_confidences, face_distances)
 
     def cleanup(self):
         try:
             print("Cleaning up resources...")
-            self.cap.release()
+            self.pipeline.stop()
             self.root.quit()
         except Exception as e:
             print(f"Error performing cleanup: {e}")
 
 if __name__ == "__main__":
     faces_dir = "faces"
-    face_recognition_system = FaceRecognition(faces_dir)
-    gui = WebcamController(face_recognition_system)
+    # Optional first argument selects the face encoder (dlib-large, dlib-small or sface)
+    encoder = sys.argv[1] if len(sys.argv) > 1 else "dlib-large"
+    # Optional second argument selects the video: a webcam number (default 0), a video file or "sim"
+    # Optional third argument detects on the full-size frame cut into tiles, e.g. 2x2, for far-away faces; the
+    # video is then kept at the camera's own size for it
+    tiles = parse_tiles(sys.argv[3]) if len(sys.argv) > 3 else None
+    source = open_source(sys.argv[2] if len(sys.argv) > 2 else "0", frame_size=None if tiles else (720, 480))
+    face_recognition_system = FaceRecognition(faces_dir, encoder, load=False)
+    if tiles:
+        face_recognition_system.set_tiled_detection(TiledDetector(tiles))
+    gui = WebcamController(face_recognition_system, source)
     gui.run_app()
@@ -1,120 +1,61 @@
 import os
-import cv2
-import numpy as np
-import face_recognition
-from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu
-from PIL import Image, ImageTk
-from djitellopy import Tello
-import threading
-
-class FaceRecognition:
-    def __init__(self, faces_dir):
-        self.faces_dir = faces_dir
-        self.known_face_encodings, self.known_face_names = self.load_known_faces()
-        self.locked_face_name = None
-        self.FOCAL_LENGTH = 800
-        self.KNOWN_FACE_WIDTH = 16 
-
-    def load_known_faces(self):
-        known_face_encodings = []
-        known_face_names = []
-        for file_name in os.listdir(self.faces_dir):
-            if file_name.endswith((".jpg", ".png")):
-                image_path = os.path.join(self.faces_dir, file_name)
-                image = face_recognition.load_image_file(image_path)
-                face_encodings = face_recognition.face_encodings(image)
-                if face_encodings:
-                    known_face_encodings.append(face_encodings[0])
-                    known_face_names.append(os.path.splitext(file_name)[0])
-        return known_face_encodings, known_face_names
-
-    @staticmethod
-    def calculate_confidence(face_distance, face_match_threshold=0.7):
-        if face_distance > face_match_threshold:
-            linear_val = (1.0 - face_distance) / (0.1 - face_match_threshold)
-            return max(0.0, min(1.0, linear_val)) * 100
-        else:
-            linear_val = (1.0 - face_distance) / (face_match_threshold - 0.1)
-            return max(0.0, min(1.0, linear_val)) * 100
-
-    def calculate_distance(self, face_width_pixels):
-        if face_width_pixels == 0:
-            return 0.0
-        return (self.KNOWN_FACE_WIDTH * self.FOCAL_LENGTH) / face_width_pixels
-
-    def recognize_faces(self, frame):
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = small_frame[:, :, ::-1]
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-        face_names = []
-        face_confidences = []
-        face_distances = []
-
-        for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-            name = "Unknown"
-            confidence = 0.0
-            distance = 0.0
-
-            face_distances_current = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances_current)
-            if matches[best_match_index]:
-                confidence = self.calculate_confidence(face_distances_current[best_match_index])
-                if confidence > 80:
-                    name = self.known_face_names[best_match_index]
-
-            face_names.append(name)
-            face_confidences.append(confidence)
-            face_distances.append(distance)
-
-        return face_locations, face_names, face_confidences, face_distances
-
-    def lock_face(self, name):
-        if name in self.known_face_names:
-            self.locked_face_name = name
-            print(f"Locked face: {self.locked_face_name}")
-        else:
-            self.locked_face_name = None
-            print("Face recognition is enabled")
-
-    def display_results(self, frame, face_locations, face_names, face_confidences, face_distances):
-        for (top, right, bottom, left), name, confidence, distance in zip(face_locations, face_names, face_confidences, face_distances):
-            if self.locked_face_name is None or name == self.locked_face_name:
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-
-                face_width_pixels = right - left
-                distance = self.calculate_distance(face_width_pixels)
-
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                label = f"{name} ({confidence:.2f}%) Distance: {distance:.2f} cm"
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
-                font = cv2.FONT_HERSHEY_DUPLEX
-                fontScale = 0.5 
-                cv2.putText(frame, label, (left + 6, bottom - 6), font, fontScale, (255, 255, 255), 1)
-
-        return frame
-
+import sys
+import time
+
+# The shared GCS modules live one folder up, in Interface/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+# Start the clock before the heavy imports, for the startup time breakdown
+from startup import LINK_STAGES, STARTUP_STAGES, StartupTimer
+startup = StartupTimer(STARTUP_STAGES + LINK_STAGES)
+
+from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu, simpledialog, messagebox
+
+from face_recognition_system import FaceRecognition
+from follow_controller import PredictiveFollower, arrival_time
+from telemetry import TelemetryRecorder, draw_hud
+from tello_client import LAND_WAIT, TELLO_IP, AsyncTelloClient
+from gui_helpers import set_menu_options
+from frame_sources import open_source
+from quality_governor import QualityGovernor
+from tiled_detection import TiledDetector, parse_tiles
+from video_pipeline import VideoPipeline
 
 class DroneController:
-    def __init__(self, face_recognition_system):
+    def __init__(self, face_recognition_system, source):
         self.root = Tk()
         self.root.title("Drone Controller - Tkinter")
         self.root.minsize(800, 600)
 
         self.face_recognition_system = face_recognition_system
 
-        # Initialize the Tello drone
-        self.drone = Tello()
-        self.drone.connect()
-        self.drone.streamon()
+        # The djitellopy Tello behind the source, or None for a simulated drone, a webcam or a video file
+        self.drone = getattr(source, "drone", None)
+        # Record the state packets djitellopy receives into a ring buffer for the HUD
+        self.telemetry = TelemetryRecorder()
+        if self.drone is not None:
+            self.telemetry.tap_djitellopy(self.drone)
+
+        # Connect and start the video on a background thread while the UI is built and the gallery loads
+        self.link = source.start()
+
+        # Takeoff, land and follow commands go through one background event loop instead of a thread each
+        self.client = AsyncTelloClient(source.host or TELLO_IP).start()
+
+        # Steers toward where the target is now, not where the delayed video shows it
+        self.follower = PredictiveFollower(frame_size=(720, 480))
+        # Time the frame behind the current recognition results was read
+        self.results_frame_time = time.time()
+        # Trades detection rate, detection scale, display rate and encoder for latency, and idles on the ground
+        self.governor = QualityGovernor(face_recognition_system)
 
         self.input_frame = Frame(self.root)
         self.cap_lbl = Label(self.root)
+        # Click a face in the video to select it for enrollment
+        self.cap_lbl.bind("<Button-1>", self.on_video_click)
+        # Frames are resized and converted into reusable buffers shared with the recognition pipeline
+        self.pipeline = VideoPipeline(self.link, self.process_frame, pool=face_recognition_system.frame_pool,
+                                      overlay=self.draw_hud, startup=startup, governor=self.governor,
+                                      flying=lambda: self.client.is_flying)
         self.button_frame = Frame(self.root)
 
         self.takeoff_land_button = Button(self.button_frame, text="Takeoff/Land", command=self.takeoff_land)
@@ -123,29 +64,58 @@ class DroneController:
         self.stop_following_button = Button(self.button_frame, text="Stop Following", command=self.stop_following)
         self.stop_following_button.pack(side='left', padx=10)
 
+        self.enroll_button = Button(self.button_frame, text="Enroll Face", command=self.enroll_face)
+        self.enroll_button.pack(side='left', padx=10)
+
         self.face_detection_var = StringVar(self.root)
         self.face_detection_var.set("Disable")
-        self.face_detection_menu = OptionMenu(self.button_frame, self.face_detection_var, "Disable", "Enable All", *self.face_recognition_system.known_face_names, command=self.on_dropdown_select)
+        self.face_detection_menu = OptionMenu(self.button_frame, self.face_detection_var, "Disable", command=self.on_dropdown_select)
+        # Face recognition loads in the background; the dropdown is enabled once it is ready
+        self.face_detection_menu.configure(state="disabled")
+        # Gallery version the dropdown entries were built from
+        self.menu_gallery_version = None
         self.face_detection_menu.pack(side='left')
 
         self.button_frame.pack(anchor="center", pady=10)
 
     def takeoff_land(self):
-        if self.drone.is_flying:
-            threading.Thread(target=self.drone.land).start()
+        if self.client.is_flying:
+            self.client.land().add_done_callback(self.on_landed)
         else:
-            threading.Thread(target=self.drone.takeoff).start()
+            self.client.takeoff()
+
+    def on_landed(self, future):
+        self.telemetry.dump_flight()
 
     def stop_following(self):
         self.face_recognition_system.lock_face(None)
+        self.send_rc(self.follower.stop())
         print("Stopped Following")
 
+    def on_video_click(self, event):
+        # Recognition works on a reduced-size frame
+        name = self.face_recognition_system.select_face(*self.face_recognition_system.to_detection(event.x, event.y))
+        if name is not None:
+            print(f"Selected face: {name}")
+
+    def enroll_face(self):
+        name = simpledialog.askstring("Enroll Face", "Name of the selected person:", parent=self.root)
+        if not name:
+            return
+        persist = messagebox.askyesno("Enroll Face", f"Also save {name.strip()} to the faces folder?", parent=self.root)
+        try:
+            self.face_recognition_system.start_enrollment(name.strip(), persist=persist)
+        except ValueError as e:
+            print(f"Cannot enroll: {e}")
+
     def on_dropdown_select(self, selection):
         print(f"{selection} selected")
         if selection == "Disable":
             self.face_recognition_system.lock_face(None)
+            self.send_rc(self.follower.stop())
         elif selection == "Enable All":
             self.face_recognition_system.lock_face(None)
+            self.send_rc(self.follower.stop())
         else:
             self.face_recognition_system.lock_face(selection)
 
@@ -154,7 +124,10 @@ class DroneController:
             self.input_frame.pack()
             self.input_frame.focus_set()
             self.cap_lbl.pack(anchor="center", pady=15)
-            threading.Thread(self.video_stream()).start() #change this
+            startup.mark("window")
+            self.face_recognition_system.load_in_background(startup)
+            self.refresh_face_menu()
+            self.pipeline.attach(self.cap_lbl)
             self.button_frame.pack(anchor="s", pady=10)
             self.root.mainloop()
         except Exception as e:
@@ -162,63 +135,86 @@ class DroneController:
         finally:
             self.cleanup()
 
-    def video_stream(self):
-        h, w = 480, 720
-
-        # Capture frame from Tello drone
-        frame = self.drone.get_frame_read(max_queue_len=0).frame
-        frame = cv2.resize(frame, (w, h))
-
+    def refresh_face_menu(self):
+        """Keep the dropdown in step with the gallery, which loads and changes in the background"""
+        recognition = self.face_recognition_system
+        if recognition.ready.is_set() and recognition.gallery_version != self.menu_gallery_version:
+            self.menu_gallery_version = recognition.gallery_version
+            options = ["Disable", "Enable All", *recognition.known_face_names]
+            set_menu_options(self.face_detection_menu, self.face_detection_var, options, self.on_dropdown_select)
+            self.face_detection_menu.configure(state="normal")
+            if recognition.locked_face_name is not None:
+                # A newly enrolled face is locked straight away
+                self.face_detection_var.set(recognition.locked_face_name)
+        if recognition.load_error is None:
+            self.root.after(250, self.refresh_face_menu)
+
+    def process_frame(self, frame, arrival):
+        # When the frame arrived rather than now, so the follower's prediction covers the wait for this tick too
+        frame_time = arrival_time(arrival)
         face_locations, face_names, face_confidences, face_distances = [], [], [], []
 
         if self.face_detection_var.get() != "Disable":
-            face_locations, face_names, face_confidences, face_distances = self.face_recognition_system.recognize_faces(frame)
-
-            # Drone following logic
-            for (top, right, bottom, left), name in zip(face_locations, face_names):
-                if name == self.face_recognition_system.locked_face_name:
-                    self.follow_person(top, right, bottom, left)
-
-        frame = self.face_recognition_system.display_results(frame, face_locations, face_names, face_confidences, face_distances)
-
-        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA))
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.cap_lbl.imgtk = imgtk
-        self.cap_lbl.configure(image=imgtk)
-
-        self.cap_lbl.after(10, self.video_stream)
-
-    def follow_person(self, top, right, bottom, left):
-        frame_center_x = 360
-        frame_center_y = 240
-        face_center_x = (left + right) // 2
-        face_center_y = (top + bottom) // 2
-
-        error_x = face_center_x - frame_center_x
-        error_y = face_center_y - frame_center_y
-
-        if abs(error_x) > 20:
-            if error_x > 0:
-                self.drone.send_rc_control(0, 0, 0, 20)  # Turn right
-            else:
-                self.drone.send_rc_control(0, 0, 0, -20)  # Turn left
-
-        if abs(error_y) > 20:
-            if error_y > 0:
-                self.drone.send_rc_control(0, -20, 0, 0)  # Move down
-            else:
-                self.drone.send_rc_control(0, 20, 0, 0)  # Move up
+            face_locations, face_names, face_confidences, face_distances = self.face_recognition_system.recognize_faces(
+                frame, native=self.pipeline.source_frame)
+            frame = self.face_recognition_system.display_stats(frame)
+            if self.face_recognition_system.last_results_fresh:
+                self.results_frame_time = frame_time
+
+            # Drone following logic, driven by the one track the locked face is pinned to
+            if self.face_recognition_system.locked_face_name is not None:
+                target = self.face_recognition_system.locked_target()
+                if target is not None:
+                    self.follow_person(*target, frame_time=self.results_frame_time)
+                else:
+                    self.send_rc(self.follower.lost())
+
+        return self.face_recognition_system.display_results(frame, face_locations, face_names, face_confidences, face_distances)
+
+    def draw_hud(self, frame):
+        return draw_hud(frame, self.telemetry.ring)
+
+    def follow_person(self, top, right, bottom, left, frame_time):
+        # Recognition works on a reduced-size frame
+        box = self.face_recognition_system.to_frame((top, right, bottom, left))
+        self.send_rc(self.follower.update(box, frame_time))
+
+    def send_rc(self, rc):
+        # The follower returns None when the command has not changed
+        if rc is not None and self.client.is_flying:
+            self.client.send_rc(*rc)
 
     def cleanup(self):
+        print("Cleaning up resources...")
+        # Land first, but never let a failed or slow landing skip the rest of the teardown or hang the GUI
+        if self.client.is_flying:
+            try:
+                self.client.land().result(timeout=LAND_WAIT)
+            except Exception as e:
+                print(f"Error landing during cleanup: {e}")
         try:
-            print("Cleaning up resources...")
-            self.drone.streamoff()
+            self.client.stop()
+            self.telemetry.stop()
+            self.pipeline.stop()
+            if self.drone is not None and self.link.ready.is_set():
+                self.drone.streamoff()
             self.root.quit()
         except Exception as e:
             print(f"Error performing cleanup: {e}")
 
 if __name__ == "__main__":
     faces_dir = "faces"
-    face_recognition_system = FaceRecognition(faces_dir)
-    drone_controller = DroneController(face_recognition_system)
+    # Optional first argument selects the face encoder (dlib-large, dlib-small or sface)
+    encoder = sys.argv[1] if len(sys.argv) > 1 else "dlib-large"
+    # Optional second argument selects the video: "tello" (the default), "sim" or "sim:<face photo>" for a
+    # simulated drone, a webcam number or a video file
+    # Optional third argument detects on the full-size frame cut into tiles, e.g. 2x2, for far-away faces; the
+    # video is then kept at the drone's own size for it
+    tiles = parse_tiles(sys.argv[3]) if len(sys.argv) > 3 else None
+    source = open_source(sys.argv[2] if len(sys.argv) > 2 else "tello", frame_size=None if tiles else (720, 480),
+                         startup=startup)
+    face_recognition_system = FaceRecognition(faces_dir, encoder, load=False)
+    if tiles:
+        face_recognition_system.set_tiled_detection(TiledDetector(tiles))
+    drone_controller = DroneController(face_recognition_system, source)
     drone_controller.run_app()
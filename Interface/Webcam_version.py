@@ -2,8 +2,9 @@
 from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu
 # import openCV for receiving the video frames
 import cv2
-# make imports from the Pillow library for displaying the video stream with Tkinter.
-from PIL import Image, ImageTk
+# import the webcam reader and the video loop that shows its frames
+from frame_sources import CaptureSource
+from video_pipeline import VideoPipeline
 
 # Class for controlling the webcam video stream via keyboard commands
 class WebcamController:
@@ -16,8 +17,8 @@ class WebcamController:
         # Create a hidden frame to handle input from key presses and releases
         self.input_frame = Frame(self.root)
 
-        # Initialize the webcam
-        self.cap = cv2.VideoCapture(0)
+        # Initialize the webcam; it is read on a background thread that tells the video loop about every new frame
+        self.cap = CaptureSource(0)
 
         # Load the face detection cascade
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
@@ -25,6 +26,9 @@ class WebcamController:
         # Label for displaying video stream
         self.cap_lbl = Label(self.root)
 
+        # The video loop: resizes each new frame to 720x480, runs our detect_faces method on it and shows the result
+        self.pipeline = VideoPipeline(self.cap, self.detect_faces, frame_size=(720, 480))
+
         # Frame to hold buttons
         self.button_frame = Frame(self.root)
 
@@ -57,8 +61,9 @@ class WebcamController:
             self.face_detection_menu.pack(side='left')
             self.button_frame.pack(anchor="center", pady=10)
 
-            # Call the video stream method
-            self.video_stream()
+            # Start the webcam and show its frames on the video label
+            self.cap.start()
+            self.pipeline.attach(self.cap_lbl)
 
             # Start the tkinter main loop
             self.root.mainloop()
@@ -73,50 +78,23 @@ class WebcamController:
     def dummy_function(self, event, key):
         print(f"Key {key} pressed")
 
-    # Method to display video stream
-    def video_stream(self):
-        # Define the height and width to resize the current frame to
-        h = 480
-        w = 720
-
-        # Read a frame from the webcam
-        ret, frame = self.cap.read()
-
-        if ret:
-            frame = cv2.resize(frame, (w, h))
-
-            # Convert the current frame to the rgb colorspace
-            cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-
-            # Check if face detection is enabled
-            if self.face_detection_var.get() == "Enable":
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(cv2image, (x, y), (x+w, y+h), (255, 0, 0), 2)
-
-            # Convert this to a Pillow Image object
-            img = Image.fromarray(cv2image)
-
-            # Convert this then to a Tkinter compatible PhotoImage object
-            imgtk = ImageTk.PhotoImage(image=img)
-
-            # Set it to the photo image
-            self.cap_lbl.imgtk = imgtk
-
-            # Configure the photo image as the displayed image
-            self.cap_lbl.configure(image=imgtk)
+    # Method called by the video loop with each new frame, returning the frame to show
+    def detect_faces(self, frame, arrival):
+        # Check if face detection is enabled
+        if self.face_detection_var.get() == "Enable":
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            for (x, y, w, h) in faces:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
 
-        # Update the video stream label with the current frame
-        # by recursively calling the method itself with a delay.
-        self.cap_lbl.after(10, self.video_stream)
+        return frame
 
     # Method for cleaning up resources
     def cleanup(self) -> None:
         try:
             # Release any resources
             print("Cleaning up resources...")
-            self.cap.release()
+            self.pipeline.stop()
             self.root.quit()  # Quit the Tkinter main loop
             exit()
         except Exception as e:
@@ -6,10 +6,10 @@ import cv2
 from PIL import Image, ImageTk
 # Import the tello module
 from djitellopy import tello
-# Import threading for our takeoff/land method
-import threading
 # import our flight commands
 from flight_commands import start_flying, stop_flying
+# Import the asyncio command client for our takeoff/land and flip commands
+from tello_client import LAND_WAIT, AsyncTelloClient
 
 
 # Class for controlling the drone via keyboard commands
@@ -31,6 +31,9 @@ class DroneController:
         # Initialize a variable to get the video frames from the drone
         self.frame = self.drone.get_frame_read()
 
+        # Start the command client; it sends takeoff, land and flips from one background event loop
+        self.client = AsyncTelloClient().start()
+
         # Define a speed for the drone to fly at
         self.drone.speed = 50
 
@@ -51,39 +54,31 @@ class DroneController:
         # ----------------------------------------------------------------------------------------------------------------
 
     # --------------------------------------------------------------------------------------------------------------------
-    """STEP 2: Create a method to send flip commands in a separate thread when buttons are pressed. """
+    """STEP 2: Create a method to queue flip commands on the command client when buttons are pressed. """
     def execute_flip(self, direction):
         try:
-            if self.drone.is_flying and self.flipping is False:
-                if direction == 'right':
-                    print('flipping right')
-                    threading.Thread(target=lambda: self.drone.flip_right()).start()
-                    self.flipping = True
-                elif direction == 'left':
-                    print('flipping left')
-                    threading.Thread(target=lambda: self.drone.flip_left()).start()
-                    self.flipping = True
-                elif direction == 'forward':
-                    print('flipping forward')
-                    threading.Thread(target=lambda: self.drone.flip_forward()).start()
-                    self.flipping = True
-                elif direction == 'back':
-                    print('flipping back')
-                    threading.Thread(target=lambda: self.drone.flip_back()).start()
-                    self.flipping = True
+            if self.client.is_flying and self.flipping is False:
+                print(f'flipping {direction}')
+                self.flipping = True
+                # Only clear the flag once the drone has answered, so flips can never overlap
+                self.client.flip(direction).add_done_callback(self.flip_done)
         except Exception as e:
-            print(f"Error in execute flip: {e}")
-        finally:
             self.flipping = False
+            print(f"Error in execute flip: {e}")
+
+    def flip_done(self, future):
+        self.flipping = False
+        if future.exception() is not None:
+            print(f"Error in execute flip: {future.exception()}")
     # ----------------------------------------------------------------------------------------------------------------
 
     # Define a method for taking off and landing
     def takeoff_land(self):
-        # Set the command for taking off or landing by checking the drones is_flying attribute
-        if self.drone.is_flying:
-            threading.Thread(target=lambda: self.drone.land()).start()
+        # Set the command for taking off or landing by checking the clients is_flying attribute
+        if self.client.is_flying:
+            self.client.land()
         else:
-            threading.Thread(target=lambda: self.drone.takeoff()).start()
+            self.client.takeoff()
 
     # Method to run the application
     def run_app(self):
@@ -188,9 +183,17 @@ class DroneController:
 
     # Method for cleaning up resources
     def cleanup(self) -> None:
+        # Release any resources
+        print("Cleaning up resources...")
+        # djitellopy did not take off itself, so land through the client if we are still in the air; never let a
+        # failed or slow landing skip the rest of the teardown or hang the GUI
+        if self.client.is_flying:
+            try:
+                self.client.land().result(timeout=LAND_WAIT)
+            except Exception as e:
+                print(f"Error landing during cleanup: {e}")
         try:
-            # Release any resources
-            print("Cleaning up resources...")
+            self.client.stop()
             self.drone.end()
             self.root.quit()  # Quit the Tkinter main loop
             exit()
@@ -1,9 +1,8 @@
 # import Tkinter to create our GUI.
 from tkinter import Tk, Label, Button
-# import openCV for receiving the video frames
-import cv2
-# make imports from the Pillow library for displaying the video stream with Tkinter.
-from PIL import Image, ImageTk
+# import the webcam reader and the video loop that shows its frames
+from frame_sources import CaptureSource
+from video_pipeline import VideoPipeline
 
 
 # Class for controlling the drone via keyboard commands
@@ -15,13 +14,14 @@ class DroneController:
         self.root.title("Drone Keyboard Controller - Tkinter")
         self.root.minsize(800, 600)
 
-        self.cap = cv2.VideoCapture(0)
+        # The webcam is read on a background thread, so the window never waits for a frame
+        self.cap = CaptureSource(0)
 
         # Label for displaying video stream
         self.cap_lbl = Label(self.root)
 
-        # Optimizing the video taking process
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # The video loop: resizes each new frame and shows it, whenever the webcam has one
+        self.pipeline = VideoPipeline(self.cap)
 
         # Create a button to send takeoff and land commands to the drone
         self.takeoff_land_button = Button(self.root, text="Takeoff/Land", command=lambda: None)
@@ -32,10 +32,11 @@ class DroneController:
             # Add the button and video stream label to the window
             self.takeoff_land_button.pack(side='bottom', pady=10)
 
-            self.cap_lbl.pack(anchor="center")
+            self.cap_lbl.pack(anchor="center", pady=15)
 
-            # Call the video stream method
-            self.video_stream()
+            # Start the webcam and show its frames on the video label
+            self.cap.start()
+            self.pipeline.attach(self.cap_lbl)
 
             # Start the tkinter main loop
             self.root.mainloop()
@@ -46,39 +47,12 @@ class DroneController:
             # When the root window is exited out of ensure to clean up any resources.
             self.cleanup()
 
-    # Method to display video stream
-    def video_stream(self):
-        # Read a frame from our drone
-        ret, frame = self.cap.read()
-
-        # Convert the current frame to the rgb colorspace
-        cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-
-        # Convert this to a Pillow Image object
-        img = Image.fromarray(cv2image)
-
-        # Convert this then to a Tkinter compatible PhotoImage object
-        imgtk = ImageTk.PhotoImage(image=img)
-
-        # Place the image label at the center of the window
-        self.cap_lbl.pack(anchor="center", pady=15)
-
-        # Set it to the photo image
-        self.cap_lbl.imgtk = imgtk
-
-        # Configure the photo image as the displayed image
-        self.cap_lbl.configure(image=imgtk)
-
-        # Update the video stream label with the current frame 
-        # by recursively calling the method itself with a delay.
-        self.cap_lbl.after(5, self.video_stream)
-
     # Method for cleaning up resources
     def cleanup(self) -> None:
         try:
             # Release any resources
             print("Cleaning up resources...")
-            self.cap.release()
+            self.pipeline.stop()
             self.root.quit()  # Quit the Tkinter main loop
             exit()
         except Exception as e:
@@ -0,0 +1,156 @@
+"""
+Appearance model of the locked person, for when their face is not visible.
+
+The face encoding used to be the only identity signal, so following stopped as
+soon as the target turned away or looked down. AppearanceModel keeps an HSV
+colour histogram of the torso below the locked face, taken when the lock is
+first pinned to a track and slowly updated while the face is recognised. While
+the face is lost the torso is searched for by back-projecting the histogram
+onto the detection-size frame and moving the last torso window with mean
+shift, a fraction of a millisecond per frame against tens of milliseconds to
+encode one face. It is used to
+
+  - keep the target alive: the face position inferred from the torso is
+    returned by locked_target(), so the follower keeps steering;
+  - re-acquire it: a face that is not recognised yet (a profile view, a
+    distant face) is pinned as the target straight away when the torso below
+    it matches, instead of waiting for an encoding good enough to match.
+
+Colour only tells people apart when they are dressed differently. A pinned
+face is still re-verified by the face recognition, which unpins it if it turns
+out to be somebody else.
+"""
+
+import cv2
+import numpy as np
+
+# Histogram bins of hue, saturation and value: hue tells clothes apart best, value is the most lighting dependent
+HUE_BINS, SATURATION_BINS, VALUE_BINS = 12, 8, 4
+
+
+def torso_box(face_box, frame_size):
+    """
+    (top, right, bottom, left) of the torso below a face box, clipped to a
+    (width, height) frame, or None if too little of it is in view.
+    """
+    top, right, bottom, left = face_box
+    width = right - left
+    centre = (left + right) / 2
+    # Shoulders are about two and a half faces wide; take three faces' height from just below the chin
+    full_width, full_height = 2.5 * width, 3.0 * width
+    top, bottom = int(bottom + 0.3 * width), int(bottom + 0.3 * width + full_height)
+    left, right = int(centre - full_width / 2), int(centre + full_width / 2)
+    top, right, bottom, left = max(0, top), min(frame_size[0], right), min(frame_size[1], bottom), max(0, left)
+    # Too little of it left to be told apart from the background
+    if bottom - top < max(4, full_height / 4) or right - left < max(4, full_width / 2):
+        return None
+    return top, right, bottom, left
+
+
+def bin_image(hsv):
+    """
+    Histogram bin of every pixel of an 8-bit HSV image. Done with numpy rather
+    than calcHist and calcBackProject, whose 3-d back projection comes out
+    empty for some OpenCV builds.
+    """
+    hue = hsv[..., 0].astype(np.int32) * HUE_BINS // 180
+    saturation = hsv[..., 1] // (256 // SATURATION_BINS)
+    value = hsv[..., 2] // (256 // VALUE_BINS)
+    return (hue * SATURATION_BINS + saturation) * VALUE_BINS + value
+
+
+def histogram(bins, box):
+    """Normalised colour histogram of a (top, right, bottom, left) region of a bin image"""
+    top, right, bottom, left = box
+    counts = np.bincount(bins[top:bottom, left:right].ravel(), minlength=HUE_BINS * SATURATION_BINS * VALUE_BINS)
+    return counts / max(1, counts.sum())
+
+
+def distance(hist_a, hist_b):
+    """Bhattacharyya distance between two histograms: 0 is identical, 1 nothing in common"""
+    return float(np.sqrt(max(0.0, 1.0 - np.sum(np.sqrt(hist_a * hist_b)))))
+
+
+class AppearanceModel:
+    def __init__(self, max_distance=0.5, reacquire_distance=0.35, learning_rate=0.05, max_lost=150):
+        # Furthest a window may be from the model and still be followed as the target...
+        self.max_distance = max_distance
+        # ...and, stricter, for an unrecognised face to be pinned as the target on its torso
+        self.reacquire_distance = reacquire_distance
+        # Weight of each new view of the recognised target in the model
+        self.learning_rate = learning_rate
+        # Frames the target is followed by appearance alone before it counts as lost
+        self.max_lost = max_lost
+
+        self.histogram = None
+        # Histogram scaled to a maximum of 255, to look up the back projection in
+        self._back_projection = None
+        # Last torso window (x, y, width, height) and the face box above it, in the pixels of the frames searched
+        self.window = None
+        self.face_box = None
+        # Frames in a row the face was missing, and how close the last search came to the model
+        self.lost_frames = 0
+        self.last_distance = None
+        # Frames the target was followed on appearance alone, and faces pinned on it
+        self.followed = 0
+        self.reacquired = 0
+
+    @property
+    def ready(self):
+        return self.histogram is not None
+
+    def learn(self, hsv, face_box):
+        """Take in a view of the recognised target; the first one is the model"""
+        torso = torso_box(face_box, (hsv.shape[1], hsv.shape[0]))
+        if torso is None:
+            return
+        hist = histogram(bin_image(hsv), torso)
+        if self.histogram is None:
+            self.histogram = hist
+        else:
+            self.histogram = (1 - self.learning_rate) * self.histogram + self.learning_rate * hist
+        self._back_projection = (self.histogram * (255.0 / self.histogram.max())).astype(np.uint8)
+        top, right, bottom, left = torso
+        self.window = (left, top, right - left, bottom - top)
+        self.face_box = face_box
+        self.lost_frames = 0
+
+    def match(self, hsv, face_box):
+        """Distance between the torso below face_box and the model, or None if the torso is not in view"""
+        torso = torso_box(face_box, (hsv.shape[1], hsv.shape[0]))
+        if torso is None or self.histogram is None:
+            return None
+        return distance(histogram(bin_image(hsv), torso), self.histogram)
+
+    def search(self, hsv):
+        """Follow the torso from its last window; the face box inferred from it, or None if it no longer matches"""
+        if self.histogram is None or self.window is None:
+            return None
+        self.lost_frames += 1
+        if self.lost_frames > self.max_lost:
+            self.window = None
+            return None
+
+        bins = bin_image(hsv)
+        # How much each pixel looks like the torso
+        back = self._back_projection[bins]
+        _, window = cv2.meanShift(back, self.window, (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1))
+        x, y, w, h = window
+        self.last_distance = distance(histogram(bins, (y, x + w, y + h, x)), self.histogram)
+        dx, dy = x - self.window[0], y - self.window[1]
+        top, right, bottom, left = self.face_box
+        # Move on with the colours even when they no longer match well enough to steer on, e.g. while the
+        # torso is half out of view, so the window is still on them when they come back
+        self.face_box = (top + dy, right + dx, bottom + dy, left + dx)
+        self.window = window
+        if self.last_distance > self.max_distance:
+            return None
+        self.followed += 1
+        return self.face_box
+
+    def rescale(self, factor):
+        """Carry the windows over to frames `factor` times the size"""
+        if self.window is not None:
+            self.window = tuple(int(round(v * factor)) for v in self.window)
+        if self.face_box is not None:
+            self.face_box = tuple(int(round(v * factor)) for v in self.face_box)
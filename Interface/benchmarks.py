@@ -0,0 +1,1077 @@
+"""
+Benchmarks for the recognition pipeline.
+
+Run from the Interface folder, e.g.:
+
+    python benchmarks.py encoders --faces faces
+    python benchmarks.py tracker
+    python benchmarks.py follow
+    python benchmarks.py gallery
+    python benchmarks.py quantized
+    python benchmarks.py inference --faces faces
+    python benchmarks.py ingest
+    python benchmarks.py framepool
+    python benchmarks.py display
+    python benchmarks.py pipeline --faces faces
+    python benchmarks.py appearance --faces faces
+    python benchmarks.py longrange --faces faces
+    python benchmarks.py tiled --faces faces
+    python benchmarks.py reacquire --faces faces
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+
+from face_encoders import ENCODERS, DlibEncoder, FaceEncoder, create_encoder
+from face_recognition_system import FaceRecognition
+from face_tracker import FaceTracker
+from appearance_model import AppearanceModel
+from frame_pool import FramePool
+from follow_controller import PredictiveFollower
+from face_gallery import Gallery
+from gallery_store import DTYPES, GalleryStore
+from inference_client import InferenceClient, RemoteEncoder
+from simulator import SimulatedTello, photo_face, run_follow
+from tiled_detection import TiledDetector, parse_tiles
+
+
+def identity_of(file_name):
+    """Person behind a gallery photo, e.g. 'umam2.jpg' -> 'umam'"""
+    return re.sub(r"[\s_-]*\d+$", "", os.path.splitext(file_name)[0]).lower()
+
+
+def load_photos(faces_dir):
+    photos = []
+    for file_name in sorted(os.listdir(faces_dir)):
+        if file_name.endswith((".jpg", ".png")):
+            image = cv2.imread(os.path.join(faces_dir, file_name))
+            if image is not None:
+                photos.append((identity_of(file_name), cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+    return photos
+
+
+def benchmark_encoders(args):
+    """Time detection and encoding per face and measure leave-one-out identification accuracy"""
+    photos = load_photos(args.faces)
+    print(f"{len(photos)} photos of {len(set(i for i, _ in photos))} people in {args.faces}")
+    print(f"{'encoder':<12}{'detect ms':>11}{'encode ms/face':>16}{'accuracy':>10}{'faces':>7}")
+
+    for name in args.encoders or list(ENCODERS):
+        try:
+            encoder = create_encoder(name)
+        except (ImportError, FileNotFoundError) as e:
+            print(f"{name:<12} skipped: {e}")
+            continue
+
+        identities = []
+        encodings = []
+        detect_time = 0.0
+        encode_time = 0.0
+        for identity, rgb_image in photos:
+            start = time.perf_counter()
+            face_locations = encoder.locate(rgb_image)
+            detect_time += time.perf_counter() - start
+            if not face_locations:
+                continue
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                encoding = encoder.encode(rgb_image, face_locations[:1])[0]
+                encode_time += time.perf_counter() - start
+            identities.append(identity)
+            encodings.append(encoding)
+
+        # Match every face against all the others: it must find its own
+        # identity when the person has another photo, and be rejected otherwise
+        correct = 0
+        encodings = np.array(encodings)
+        for i, encoding in enumerate(encodings):
+            others = np.delete(np.arange(len(encodings)), i)
+            distances = encoder.distance(encodings[others], encoding)
+            best = others[np.argmin(distances)] if len(others) else None
+            if best is not None and distances.min() <= encoder.tolerance:
+                confidence = FaceRecognition.calculate_confidence(distances.min(), encoder.confidence_threshold)
+                min_confidence = args.min_confidence if args.min_confidence is not None else encoder.min_confidence
+                accepted = min_confidence is None or confidence > min_confidence
+                predicted = identities[best] if accepted else None
+            else:
+                predicted = None
+            expected = identities[i] if identities.count(identities[i]) > 1 else None
+            correct += predicted == expected
+
+        faces = len(encodings)
+        print(f"{name:<12}{detect_time * 1000 / max(1, len(photos)):>11.1f}"
+              f"{encode_time * 1000 / max(1, faces * args.repeat):>16.2f}"
+              f"{correct / max(1, faces):>10.1%}{faces:>7}")
+
+
+def benchmark_tracker(args):
+    """Per-frame tracker cost and ID switches versus the number of faces in view"""
+    rng = np.random.default_rng(0)
+    print(f"{'faces':>6}{'ms/frame':>10}{'id switches':>13}")
+    for count in args.faces_in_view:
+        # Faces drift around a 960x720 frame on a grid, so boxes rarely overlap
+        side = int(np.ceil(np.sqrt(count)))
+        cell_w, cell_h = 960 / side, 720 / side
+        size = 0.5 * min(cell_w, cell_h)
+        centres = np.array([((i % side + 0.5) * cell_w, (i // side + 0.5) * cell_h) for i in range(count)])
+        velocities = rng.uniform(-1, 1, (count, 2))
+
+        tracker = FaceTracker()
+        owner = {}
+        switches = 0
+        elapsed = 0.0
+        for frame in range(args.frames):
+            offsets = 0.2 * size * np.sin(frame / 20 + velocities)
+            noisy = centres + offsets + rng.normal(0, 1, (count, 2))
+            face_locations = [(int(y - size / 2), int(x + size / 2), int(y + size / 2), int(x - size / 2))
+                              for x, y in noisy]
+
+            start = time.perf_counter()
+            tracks = tracker.update(face_locations)
+            elapsed += time.perf_counter() - start
+
+            for face, track in enumerate(tracks):
+                if owner.setdefault(face, track.id) != track.id:
+                    owner[face] = track.id
+                    switches += 1
+
+        print(f"{count:>6}{elapsed * 1000 / args.frames:>10.3f}{switches:>13}")
+
+
+def benchmark_follow(args):
+    """Tracking error and command rate of the reactive and predictive follow loops in the simulator"""
+    print(f"{'latency s':>10}{'mode':>12}{'error px':>10}{'cmd/s':>8}{'in view':>9}")
+    for latency in args.latencies:
+        for predictive in (False, True):
+            results = [run_follow(PredictiveFollower(predictive=predictive, video_latency=latency),
+                                  duration=args.duration, video_latency=latency, seed=seed)
+                       for seed in range(args.runs)]
+            error, rate, in_view = np.mean(results, axis=0)
+            mode = "predictive" if predictive else "reactive"
+            print(f"{latency:>10.2f}{mode:>12}{error:>10.1f}{rate:>8.2f}{in_view:>9.0%}")
+
+
+class _DistanceOnlyEncoder(FaceEncoder):
+    """Matching only needs the distance, so the gallery benchmark does not load dlib"""
+    name = "dlib-large"
+    distance = DlibEncoder.distance
+
+
+def benchmark_gallery(args):
+    """Open time, match time and size of a large gallery: in-memory float64 rows versus memory-mapped stores"""
+    rng = np.random.default_rng(0)
+    encoder = _DistanceOnlyEncoder()
+    query = rng.normal(0, 0.1, 128)
+    directory = tempfile.mkdtemp(prefix="gallery-benchmark-", dir=args.dir)
+    print(f"{args.identities} identities")
+    print(f"{'format':<24}{'build s':>9}{'open ms':>9}{'match ms':>10}{'MB':>8}")
+    try:
+        # What a gallery used to be: one float64 array per identity in a Python list
+        start = time.perf_counter()
+        rows = [rng.normal(0, 0.1, 128) for _ in range(args.identities)]
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        matrix = np.vstack(rows)
+        open_time = time.perf_counter() - start
+        start = time.perf_counter()
+        np.argmin(np.linalg.norm(matrix - query, axis=1))
+        match_time = time.perf_counter() - start
+        print(f"{'float64 rows in memory':<24}{build:>9.1f}{open_time * 1000:>9.1f}{match_time * 1000:>10.1f}"
+              f"{matrix.nbytes / 1e6:>8.0f}")
+        del rows
+
+        names = [f"person-{i}" for i in range(args.identities)]
+        for dtype in args.dtypes:
+            path = os.path.join(directory, f"{dtype}.gallery")
+            start = time.perf_counter()
+            store = GalleryStore.create(path, encoder.name, 128, dtype)
+            for first in range(0, args.identities, args.segment_size):
+                store = store.append(names[first:first + args.segment_size], matrix[first:first + args.segment_size])
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = GalleryStore.open(path, encoder)
+            open_time = time.perf_counter() - start
+            start = time.perf_counter()
+            index, _ = store.match(encoder, query)
+            match_time = time.perf_counter() - start
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            label = f"{dtype} mmap, {len(store.segments)} segments"
+            print(f"{label:<24}{build:>9.1f}{open_time * 1000:>9.1f}{match_time * 1000:>10.1f}{size / 1e6:>8.0f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+def benchmark_quantized(args):
+    """Memory, match throughput and agreement of int8 two-stage matching versus exact float32 matching"""
+    rng = np.random.default_rng(0)
+    encoder = _DistanceOnlyEncoder()
+    # dlib encodings have a norm around 1, and the same person lands 0.3-0.4 away
+    encodings = rng.normal(0, 0.09, (args.identities, 128)).astype(np.float32)
+    targets = rng.integers(0, args.identities, args.queries)
+    queries = encodings[targets] + rng.normal(0, args.noise, (args.queries, 128)).astype(np.float32)
+    gallery = Gallery(encoder.name, [str(i) for i in range(args.identities)], encodings)
+
+    start = time.perf_counter()
+    exact = [gallery.match(encoder, query)[0] for query in queries]
+    exact_rate = args.queries / (time.perf_counter() - start)
+    print(f"{args.identities} identities, {args.queries} queries")
+    print(f"{'matcher':<18}{'MB':>8}{'queries/s':>11}{'agreement':>11}")
+    print(f"{'exact float32':<18}{encodings.nbytes / 1e6:>8.1f}{exact_rate:>11.1f}{1:>11.1%}")
+
+    start = time.perf_counter()
+    gallery.quantize(encoder)
+    print(f"int8 index built in {time.perf_counter() - start:.2f} s")
+    for k in args.rerank_k:
+        gallery.rerank_k = k
+        start = time.perf_counter()
+        two_stage = [gallery.match(encoder, query)[0] for query in queries]
+        rate = args.queries / (time.perf_counter() - start)
+        agreement = np.mean(np.array(two_stage) == np.array(exact))
+        print(f"{f'int8 + top-{k}':<18}{gallery.index.nbytes / 1e6:>8.1f}{rate:>11.1f}{agreement:>11.1%}")
+
+
+def _run_service(address, encoder, batch_window, max_batch):
+    from inference_service import InferenceService
+    # An empty gallery: only encoding is measured
+    InferenceService(tempfile.mkdtemp(), encoder, address, batch_window, max_batch, report_interval=1e9).start()
+    while True:
+        time.sleep(1.0)
+
+
+def _wait_for_service(address, timeout=60.0):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return InferenceClient(address)
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def benchmark_inference(args):
+    """Encoding throughput and latency through the inference service, for several batch windows"""
+    encoder = create_encoder(args.encoder)
+    faces = []
+    for _, rgb_image in load_photos(args.faces):
+        face_locations = encoder.locate(rgb_image)
+        if face_locations:
+            # Send a crop around the face, about the size of a face in the quarter-size video frame
+            top, right, bottom, left = face_locations[0]
+            pad = (bottom - top) // 2
+            y0, x0 = max(0, top - pad), max(0, left - pad)
+            crop = np.ascontiguousarray(rgb_image[y0:bottom + pad, x0:right + pad])
+            faces.append((crop, [(top - y0, right - x0, bottom - y0, left - x0)]))
+    print(f"{len(faces)} faces, {args.clients} clients, {args.duration:g} s per window")
+    print(f"{'window ms':>10}{'faces/s':>9}{'latency ms':>12}{'batch faces':>13}{'max':>5}{'wait ms':>9}{'busy':>7}")
+
+    address = os.path.join(tempfile.mkdtemp(), "inference.sock") if hasattr(socket, "AF_UNIX") else "127.0.0.1:8766"
+    for window in args.windows:
+        service = multiprocessing.Process(target=_run_service, args=(address, args.encoder, window / 1000,
+                                                                     args.max_batch), daemon=True)
+        service.start()
+        try:
+            _wait_for_service(address).close()
+            latencies = []
+            stop_at = time.perf_counter() + args.duration
+
+            def client(seed):
+                remote = RemoteEncoder(address)
+                order = np.random.default_rng(seed).permutation(len(faces))
+                i = 0
+                while time.perf_counter() < stop_at:
+                    crop, face_locations = faces[order[i % len(order)]]
+                    start = time.perf_counter()
+                    remote.encode(crop, face_locations)
+                    latencies.append(time.perf_counter() - start)
+                    i += 1
+
+            threads = [threading.Thread(target=client, args=(seed,)) for seed in range(args.clients)]
+            stats_client = RemoteEncoder(address)
+            # Count only the measured period
+            stats_client.stats(reset=True)
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            stats = stats_client.stats()
+            print(f"{window:>10g}{len(latencies) / elapsed:>9.1f}{np.mean(latencies) * 1000:>12.1f}"
+                  f"{stats['mean_batch_faces']:>13.2f}{stats['max_batch_faces']:>5}"
+                  f"{stats.get('encode_wait_ms', 0.0):>9.1f}{stats['busy']:>7.0%}")
+        finally:
+            service.terminate()
+            service.join()
+
+
+# Frame numbers are drawn into the synthetic clip as a row of black/white blocks
+_MARKER_BITS = 12
+_MARKER_BLOCK = 32
+
+
+def _make_clip(path, seconds, fps=30, size=(960, 720)):
+    """Write a raw H.264 clip like the Tello's: baseline profile, no B-frames, a keyframe every second"""
+    import av
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8), (0, 0), 3)
+    with av.open(path, "w", format="h264") as container:
+        stream = container.add_stream("libx264", rate=fps)
+        stream.width, stream.height = size
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"profile": "baseline", "tune": "zerolatency", "g": str(fps), "crf": "20"}
+        for i in range(int(seconds * fps)):
+            image = np.roll(background, 4 * i, axis=1)
+            cv2.circle(image, (int(size[0] / 2 + 300 * np.sin(i / 20)), size[1] // 2), 80, (40, 200, 240), -1)
+            for bit in range(_MARKER_BITS):
+                value = 255 if (i >> bit) & 1 else 0
+                x = bit * _MARKER_BLOCK
+                image[:_MARKER_BLOCK, x:x + _MARKER_BLOCK] = value
+            for packet in stream.encode(av.VideoFrame.from_ndarray(image, format="rgb24")):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def _read_marker(frame):
+    height, width = frame.shape[:2]
+    block_x, block_y = _MARKER_BLOCK * width / 960, _MARKER_BLOCK * height / 720
+    number = 0
+    for bit in range(_MARKER_BITS):
+        if frame[int(block_y / 2), int((bit + 0.5) * block_x)].mean() > 128:
+            number |= 1 << bit
+    return number
+
+
+def _stream_clip(path, port, fps, send_times, stop):
+    """Send the clip's access units to localhost:port in real time, like the Tello does"""
+    import av
+    with av.open(path, format="h264") as container:
+        packets = [bytes(packet) for packet in container.demux(video=0) if packet.size]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.perf_counter()
+    for i, data in enumerate(packets):
+        if stop.is_set():
+            break
+        delay = start + i / fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        send_times[i] = time.perf_counter()
+        for offset in range(0, len(data), 1460):
+            sock.sendto(data[offset:offset + 1460], ("127.0.0.1", port))
+    sock.close()
+
+
+def benchmark_ingest(args):
+    """CPU cost and latency of djitellopy's frame reader versus VideoIngest"""
+    from djitellopy.tello import BackgroundFrameRead
+    from video_ingest import VideoIngest
+
+    directory = tempfile.mkdtemp()
+    clip = os.path.join(directory, "clip.h264")
+    _make_clip(clip, args.duration + 2, args.fps)
+    readers = {
+        "djitellopy": lambda address: _DjitellopyReader(BackgroundFrameRead(None, address)),
+        "ingest 1 thread": lambda address: VideoIngest(address, output_size=(720, 480)).start(),
+        "ingest 2 threads": lambda address: VideoIngest(address, threads=2, output_size=(720, 480)).start(),
+        "ingest fast decode": lambda address: VideoIngest(address, output_size=(720, 480), fast_decode=True).start(),
+        "ingest no skipping": lambda address: VideoIngest(address, output_size=(720, 480),
+                                                          skip_when_busy=False).start(),
+    }
+    print(f"{args.duration:g} s of 960x720 H.264 at {args.fps} fps over UDP")
+    print(f"{'reader':<20}{'reads/s':>9}{'CPU ms/frame':>14}{'latency ms':>12}{'p95':>7}{'unread':>8}{'skipping':>10}")
+    # Readers close their socket a while after the stream stops, so every run gets its own port
+    port = args.port
+    try:
+        for consumer_fps in args.consumer_fps:
+            print(f"consumer reading at {consumer_fps:g} fps")
+            for name, create in readers.items():
+                port += 1
+                send_times = {}
+                stop = threading.Event()
+                sender = threading.Thread(target=_stream_clip, args=(clip, port, args.fps, send_times, stop))
+                sender.start()
+                reader = create(f"udp://@127.0.0.1:{port}")
+                latencies = []
+                seen = set()
+                last = None
+                cpu_start = time.process_time()
+                measure_from = time.perf_counter() + 1.0
+                end = measure_from + args.duration
+                while time.perf_counter() < end:
+                    frame = reader.frame
+                    if frame is not last:
+                        last = frame
+                        # The GCS works on 720x480 frames
+                        frame = cv2.resize(frame, (720, 480))
+                        number = _read_marker(frame)
+                        now = time.perf_counter()
+                        if now >= measure_from and number in send_times and number not in seen:
+                            seen.add(number)
+                            latencies.append(now - send_times[number])
+                    time.sleep(1.0 / consumer_fps)
+                cpu = time.process_time() - cpu_start
+                stop.set()
+                reader.stop()
+                sender.join()
+                frames_sent = args.duration * args.fps
+                print(f"{name:<20}{len(latencies) / args.duration:>9.1f}{cpu * 1000 / frames_sent:>14.2f}"
+                      f"{np.mean(latencies) * 1000 if latencies else float('nan'):>12.1f}"
+                      f"{np.percentile(latencies, 95) * 1000 if latencies else float('nan'):>7.1f}"
+                      f"{getattr(reader, 'stats', None) and reader.stats.unread or '-':>8}"
+                      f"{getattr(reader, 'stats', None) and reader.stats.skipping or '-':>10}")
+    finally:
+        shutil.rmtree(directory)
+
+
+class _DjitellopyReader:
+    """BackgroundFrameRead with the start/stop of the ingest readers"""
+
+    def __init__(self, frame_read):
+        self.frame_read = frame_read
+        frame_read.start()
+
+    @property
+    def frame(self):
+        return self.frame_read.frame
+
+    def stop(self):
+        self.frame_read.stop()
+
+
+class _NoFacesEncoder(FaceEncoder):
+    """Finds nothing, so only the frame handling around the encoder is measured"""
+    name = "none"
+
+    def locate(self, rgb_image):
+        return []
+
+    def encode(self, rgb_image, face_locations):
+        return np.empty((0, 128))
+
+
+def benchmark_framepool(args):
+    """Per-tick time, transient memory and pool allocations of the display loop, with and without the pool"""
+    import tracemalloc
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (720, 960, 3), dtype=np.uint8)
+    # A moving scene, so the motion gate lets every frame through to detection
+    frames = [np.roll(background, 7 * i, axis=1) for i in range(30)]
+
+    def recognition():
+        system = FaceRecognition(None, _NoFacesEncoder(), load=False, watch_gallery=False)
+        system.ready.set()
+        return system
+
+    def allocating_tick(system, frame):
+        frame = cv2.resize(frame, (720, 480))
+        results = system.recognize_faces(frame)
+        frame = system.display_results(system.display_stats(frame), *results)
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA))
+
+    def pooled_tick(system, frame):
+        pool = system.frame_pool
+        frame = pool.resize(frame, (720, 480))
+        results = system.recognize_faces(frame)
+        frame = system.display_results(system.display_stats(frame), *results)
+        # What TkFrameView.show does before handing the pixels to Tk
+        with pool.buffer((480, 720, 4)) as rgba:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=rgba)
+            image = Image.frombuffer("RGBA", (720, 480), rgba, "raw", "RGBA", 0, 1)
+        pool.give_back(frame)
+        return image
+
+    print(f"{args.frames} ticks of 960x720 -> 720x480, recognition finding no faces")
+    print(f"{'path':<12}{'ms/tick':>9}{'peak MB/tick':>14}{'pool allocations':>18}")
+    for name, tick in (("allocating", allocating_tick), ("pooled", pooled_tick)):
+        system = recognition()
+        for frame in frames[:5]:
+            tick(system, frame)
+        warm_allocations = system.frame_pool.allocations
+        # The motion gate keeps its reference frame borrowed
+        warm_outstanding = system.frame_pool.outstanding
+
+        start = time.perf_counter()
+        for i in range(args.frames):
+            tick(system, frames[i % len(frames)])
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        peaks = []
+        for i in range(100):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            tick(system, frames[i % len(frames)])
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+
+        pool = system.frame_pool
+        new_allocations = pool.allocations - warm_allocations
+        print(f"{name:<12}{elapsed * 1000 / args.frames:>9.2f}{np.mean(peaks) / 1e6:>14.2f}"
+              f"{f'{new_allocations} after warm-up':>18}")
+        assert pool.outstanding == warm_outstanding, f"{pool.outstanding - warm_outstanding} buffers not given back"
+        if name == "pooled":
+            assert new_allocations == 0, f"{new_allocations} buffers allocated in steady state"
+
+
+def benchmark_display(args):
+    """CPU use, repaints and display timing of after(10) polling versus FrameSignal-driven repaints"""
+    import tkinter
+    from PIL import Image
+    from gui_helpers import FrameSignal
+
+    pool = FramePool()
+    frames = [np.full((480, 720, 3), i * 40, dtype=np.uint8) for i in range(4)]
+
+    class Producer:
+        """Publishes a new frame `fps` times a second, like the decoder thread"""
+
+        def __init__(self, fps, on_frame=None):
+            self.fps = fps
+            self.on_frame = on_frame
+            self.frame, self.published = None, None
+            self.running = True
+
+        def run(self):
+            i = 0
+            next_time = time.perf_counter()
+            while self.running:
+                if self.fps:
+                    self.frame, self.published = frames[i % len(frames)], time.perf_counter()
+                    i += 1
+                    if self.on_frame is not None:
+                        self.on_frame()
+                    next_time += 1.0 / self.fps
+                    time.sleep(max(0.0, next_time - time.perf_counter()))
+                else:
+                    time.sleep(0.05)
+
+    def paint(frame):
+        # What TkFrameView.show does, short of handing the pixels to a window
+        with pool.buffer((480, 720, 4)) as rgba:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=rgba)
+            Image.frombuffer("RGBA", (720, 480), rgba, "raw", "RGBA", 0, 1)
+
+    print(f"{args.duration:g} s per run; the producer publishes 720x480 frames at the given rate")
+    print(f"{'display':<10}{'source fps':>11}{'CPU %':>8}{'repaints/s':>12}{'duplicates':>12}"
+          f"{'latency ms':>12}{'p95 ms':>8}{'jitter ms':>11}")
+    for fps in args.fps:
+        for mode in ("polling", "event"):
+            # A Tcl interpreter runs the same event loop as Tk without needing a display
+            root = tkinter.Tcl()
+            producer = Producer(fps)
+            paints, latencies, new_frame_times = [], [], []
+            last = [None]
+
+            def repaint():
+                frame, published = producer.frame, producer.published
+                if frame is None:
+                    return
+                paint(frame)
+                now = time.perf_counter()
+                paints.append(now)
+                if published != last[0]:
+                    last[0] = published
+                    latencies.append(now - published)
+                    new_frame_times.append(now)
+
+            def tick():
+                repaint()
+                timer[0] = root.after(10, tick)
+
+            timer = [None]
+            if mode == "polling":
+                timer[0] = root.after(10, tick)
+                signal = None
+            else:
+                signal = FrameSignal(root, repaint)
+                producer.on_frame = signal.set
+
+            done = []
+            thread = threading.Thread(target=producer.run, daemon=True)
+            thread.start()
+            root.after(int(args.duration * 1000), lambda: done.append(True))
+            wall, cpu = time.perf_counter(), time.process_time()
+            while not done:
+                root.tk.dooneevent(0)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            producer.running = False
+            thread.join()
+            # Every interpreter on this thread shares one event loop, so stop this run's callbacks
+            if timer[0] is not None:
+                root.after_cancel(timer[0])
+            if signal is not None:
+                signal.close()
+
+            intervals = np.diff(new_frame_times) * 1000
+            duplicates = len(paints) - len(latencies)
+            latency = f"{np.mean(latencies) * 1000:.2f}" if latencies else "-"
+            p95 = f"{np.percentile(latencies, 95) * 1000:.2f}" if latencies else "-"
+            jitter = f"{np.std(intervals):.2f}" if len(intervals) > 1 else "-"
+            print(f"{mode:<10}{fps:>11g}{cpu * 100 / wall:>8.1f}{len(paints) / wall:>12.1f}{duplicates:>12}"
+                  f"{latency:>12}{p95:>8}{jitter:>11}")
+
+
+def _make_face_clip(path, face, seconds, fps=30, size=(720, 480)):
+    """Write a clip of `face` drifting across a textured background, getting nearer and further"""
+    import av
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(60, 200, (size[1], size[0], 3), dtype=np.uint8), (0, 0), 3)
+    with av.open(path, "w") as container:
+        stream = container.add_stream("libx264", rate=fps)
+        stream.width, stream.height = size
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"crf": "20"}
+        for i in range(int(seconds * fps)):
+            image = background.copy()
+            height = int(size[1] * (0.6 + 0.15 * np.sin(i / 25)))
+            width = height * face.shape[1] // face.shape[0]
+            x = int(size[0] / 2 + (size[0] - width) / 2 * 0.8 * np.sin(i / 40)) - width // 2
+            y = (size[1] - height) // 2
+            image[y:y + height, x:x + width] = cv2.resize(face, (width, height))
+            frame = av.VideoFrame.from_ndarray(image, format="bgr24")
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def benchmark_pipeline(args):
+    """Recognition over a video file through VideoPipeline, played as fast as possible and in real time"""
+    from frame_sources import FileSource
+    from video_pipeline import VideoPipeline
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = args.video
+        if path is None:
+            photo = os.path.join(args.faces, sorted(os.listdir(args.faces))[0])
+            path = os.path.join(directory, "clip.mp4")
+            _make_face_clip(path, photo_face(photo), args.duration)
+            print(f"Synthetic {args.duration:g} s clip of {os.path.basename(photo)}")
+
+        print(f"{'playback':<16}{'frames':>8}{'fps':>8}{'ms/frame':>10}{'faces':>8}  results")
+        first_results = None
+        for name, realtime in (("as fast 1", False), ("as fast 2", False), ("real time", True)):
+            recognition = FaceRecognition(args.faces, args.encoder, watch_gallery=False)
+            results = []
+
+            def process(frame, arrival):
+                locations, names = recognition.recognize_faces(frame)[:2]
+                results.append((tuple(map(tuple, locations)), tuple(names)))
+                return frame
+
+            source = FileSource(path, realtime=realtime).start()
+            stats = VideoPipeline(source, process, pool=recognition.frame_pool).run(max_frames=args.frames)
+            source.stop()
+            if first_results is None:
+                first_results, verdict = results, "-"
+            elif realtime:
+                verdict = f"{source.frames_read - stats.frames} frames dropped"
+            else:
+                verdict = "identical to run 1" if results == first_results else "DIFFERENT from run 1"
+            faces = sum(len(names) for _, names in results)
+            print(f"{name:<16}{stats.frames:>8}{stats.fps:>8.1f}{stats.busy_time / max(1, stats.frames) * 1000:>10.1f}"
+                  f"{faces:>8}  {verdict}")
+    finally:
+        shutil.rmtree(directory)
+
+
+def _follow_in_simulator(recognition, drone, follower, duration, dt=1 / 30, on_frame=None):
+    """
+    Fly a simulated drone after the locked face for `duration` seconds, stepped
+    and rendered here rather than on the drone's own threads so the run is
+    repeatable. Returns the frames the target was in view, the frames the
+    locked target was on them, the same two while they were turned away, and
+    the seconds spent in recognize_faces. on_frame(hit) is called after every
+    frame with whether the locked target was on them, or None if they were out
+    of view.
+    """
+    simulator = drone.simulator
+    in_view = on_target = turned_away = turned_away_on_target = 0
+    busy = 0.0
+    for _ in range(int(duration / dt)):
+        simulator.step(dt)
+        frame = drone.render()
+        start = time.perf_counter()
+        recognition.recognize_faces(frame)
+        busy += time.perf_counter() - start
+        box = recognition.locked_target()
+        rc = (follower.update(recognition.to_frame(box), simulator.time, simulator.time) if box is not None
+              else follower.lost(simulator.time))
+        if rc is not None:
+            simulator.send_rc_control(*rc)
+
+        truth = simulator.target_box()
+        if truth is None:
+            if on_frame is not None:
+                on_frame(None)
+            continue
+        in_view += 1
+        turned_away += not simulator.facing_camera
+        hit = False
+        if box is not None:
+            top, right, bottom, left = recognition.to_frame(box)
+            hit = abs((left + right - truth[1] - truth[3]) / 2) < max(8, truth[1] - truth[3])
+            on_target += hit
+            turned_away_on_target += hit and not simulator.facing_camera
+        if on_frame is not None:
+            on_frame(hit)
+    return in_view, on_target, turned_away, turned_away_on_target, busy
+
+
+def benchmark_appearance(args):
+    """Following a target who keeps turning away, on the face alone and with the torso appearance model"""
+    recognition = FaceRecognition(args.faces, args.encoder, watch_gallery=False)
+    target = recognition.known_face_names[0]
+    photo = next(f for f in sorted(os.listdir(args.faces)) if os.path.splitext(f)[0] == target)
+    face = photo_face(os.path.join(args.faces, photo), recognition.encoder)
+    print(f"{target} turns away for {args.turn_away_for:g} s out of every {args.turn_away_every:g} s, "
+          f"{args.duration:g} s per run, {args.runs} runs")
+    print(f"{'identity from':<16}{'in view':>9}{'on target':>11}{'turned away':>13}{'re-acquired':>13}{'ms/frame':>10}")
+
+    dt = 1 / 30
+    for use_appearance in (False, True):
+        totals = np.zeros(4)
+        busy = 0.0
+        for seed in range(args.runs):
+            recognition = FaceRecognition(args.faces, recognition.encoder, watch_gallery=False,
+                                          use_appearance=use_appearance, use_person_detector=False)
+            recognition.lock_face(target)
+            drone = SimulatedTello("127.0.0.2", face, seed=seed, start_distance=100, target_speed=15, video_latency=0,
+                                   turn_away_every=args.turn_away_every, turn_away_for=args.turn_away_for)
+            follower = PredictiveFollower(frame_size=(720, 480), desired_face_width=160, video_latency=0)
+            in_view, on_target, turned_away, turned_away_on_target, seconds = _follow_in_simulator(
+                recognition, drone, follower, args.duration, dt)
+            busy += seconds
+            frames = args.duration / dt
+            reacquired = recognition.appearance.reacquired if use_appearance else 0
+            totals += (in_view / frames, on_target / max(1, in_view), turned_away_on_target / max(1, turned_away),
+                       reacquired)
+        in_view, on_target, turned_away, reacquired = totals / args.runs
+        name = "face + torso" if use_appearance else "face only"
+        print(f"{name:<16}{in_view:>9.0%}{on_target:>11.0%}{turned_away:>13.0%}{reacquired:>13.1f}"
+              f"{busy * 1000 / (args.runs * args.duration / dt):>10.1f}")
+
+    # Per-frame cost of looking for the target by its torso, against encoding one face
+    drone = SimulatedTello("127.0.0.2", face, start_distance=100)
+    drone.simulator.step(dt)
+    small = cv2.resize(drone.render(), (180, 120))
+    hsv, rgb = cv2.cvtColor(small, cv2.COLOR_BGR2HSV), cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    locations = recognition.encoder.locate(rgb)
+    model = AppearanceModel()
+    model.learn(hsv, locations[0])
+    repeat = 200
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model.lost_frames = 0
+        model.search(hsv)
+    search = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(10):
+        recognition.encoder.encode(rgb, locations[:1])
+    encode = (time.perf_counter() - start) / 10
+    print(f"Torso search {search * 1000:.2f} ms per frame, face encoding {encode * 1000:.1f} ms per face")
+
+
+def benchmark_longrange(args):
+    """Following a target at a distance, on faces alone and with the people detector"""
+    recognition = FaceRecognition(args.faces, args.encoder, watch_gallery=False)
+    target = recognition.known_face_names[0]
+    photo = next(f for f in sorted(os.listdir(args.faces)) if os.path.splitext(f)[0] == target)
+    face = photo_face(os.path.join(args.faces, photo), recognition.encoder)
+    print(f"Following {target} for {args.duration:g} s per run, {args.runs} runs, "
+          f"camera focal length {args.focal_length:g} px")
+    print(f"{'distance':<10}{'detection':<18}{'in view':>9}{'on target':>11}{'people found':>14}{'ms/frame':>10}")
+
+    dt = 1 / 30
+    # Faces on the usual quarter-size frame, on a half-size and a full-size one (four and sixteen times the detection
+    # work), and on the quarter-size frame with the people detector
+    configurations = (("quarter faces", 0.25, False), ("half faces", 0.5, False), ("full faces", 1.0, False),
+                      ("quarter + people", 0.25, True))
+    for distance in args.distances:
+        for name, detection_scale, use_person_detector in configurations:
+            totals = np.zeros(3)
+            busy = 0.0
+            for seed in range(args.runs):
+                recognition = FaceRecognition(args.faces, recognition.encoder, watch_gallery=False,
+                                              detection_scale=detection_scale,
+                                              use_person_detector=use_person_detector)
+                recognition.lock_face(target)
+                drone = SimulatedTello("127.0.0.2", face, seed=seed, start_distance=distance, target_speed=15,
+                                       video_latency=0, focal_length=args.focal_length)
+                # Keep the distance the run starts at
+                follower = PredictiveFollower(frame_size=(720, 480), video_latency=0, focal_length=args.focal_length,
+                                              desired_face_width=args.focal_length * 16 / distance)
+                in_view, on_target, _, _, seconds = _follow_in_simulator(recognition, drone, follower, args.duration,
+                                                                         dt)
+                busy += seconds
+                detector = recognition.person_detector
+                totals += (in_view * dt / args.duration, on_target / max(1, in_view),
+                           detector.found / max(1, detector.searches) if detector is not None else 0.0)
+            in_view, on_target, found = totals / args.runs
+            print(f"{f'{distance:g} cm':<10}{name:<18}{in_view:>9.0%}{on_target:>11.0%}"
+                  f"{f'{found:.0%}' if use_person_detector else '-':>14}"
+                  f"{busy * 1000 / (args.runs * args.duration / dt):>10.1f}")
+
+
+def benchmark_reacquire(args):
+    """Time to find a target again after they run out of view: hovering, yaw search, and search with more detection"""
+    recognition = FaceRecognition(args.faces, args.encoder, watch_gallery=False)
+    target = recognition.known_face_names[0]
+    photo = next(f for f in sorted(os.listdir(args.faces)) if os.path.splitext(f)[0] == target)
+    face = photo_face(os.path.join(args.faces, photo), recognition.encoder)
+    print(f"{target} runs out of view every {args.dash_every:g} s, detection on every {args.interval} frames while "
+          f"in view, {args.duration:g} s per run, {args.runs} runs")
+    print(f"{'on loss':<24}{'losses':>8}{'found again':>13}{'mean s':>8}{'median s':>10}{'ms/frame':>10}")
+
+    dt = 1 / 30
+    configurations = (("hover", False, False), ("yaw search", True, False), ("yaw search + detection", True, True))
+    for name, search, use_target_search in configurations:
+        # Seconds from when the target went out of view to when it was followed again, inf if it never was
+        times = []
+        busy = 0.0
+        for seed in range(args.runs):
+            recognition = FaceRecognition(args.faces, recognition.encoder, watch_gallery=False,
+                                          use_target_search=use_target_search)
+            recognition.detection_interval = args.interval
+            recognition.lock_face(target)
+            drone = SimulatedTello("127.0.0.2", face, seed=seed, start_distance=100, target_speed=15, video_latency=0,
+                                   dash_every=args.dash_every, dash_for=args.dash_for, dash_speed=args.dash_speed)
+            follower = PredictiveFollower(frame_size=(720, 480), desired_face_width=160, video_latency=0, search=search)
+            simulator = drone.simulator
+            # Whether the last frame was in a dash, whether the target is still to be lost and found again after the
+            # last dash, and when they went out of view
+            state = {"dashing": False, "armed": False, "lost": None}
+
+            def on_frame(hit, simulator=simulator, state=state):
+                if simulator.dashing and not state["dashing"]:
+                    if state["lost"] is not None:
+                        # Never found after the last dash
+                        times.append(float("inf"))
+                    state["armed"], state["lost"] = True, None
+                state["dashing"] = simulator.dashing
+                if not state["armed"]:
+                    return
+                if hit is None and state["lost"] is None:
+                    state["lost"] = simulator.time
+                elif hit and state["lost"] is not None:
+                    times.append(simulator.time - state["lost"])
+                    state["armed"], state["lost"] = False, None
+
+            *_, seconds = _follow_in_simulator(recognition, drone, follower, args.duration, dt, on_frame)
+            busy += seconds
+            if state["lost"] is not None:
+                times.append(float("inf"))
+        times = np.array(times)
+        found = times[np.isfinite(times)]
+        print(f"{name:<24}{len(times):>8}{len(found) / max(1, len(times)):>13.0%}"
+              f"{found.mean() if len(found) else float('nan'):>8.1f}"
+              f"{np.median(found) if len(found) else float('nan'):>10.1f}"
+              f"{busy * 1000 / (args.runs * args.duration / dt):>10.1f}")
+
+
+def _crowd_frame(faces, widths, size, rng):
+    """
+    An RGB frame of one face of each width scattered over a noisy background,
+    and their (top, right, bottom, left) boxes.
+    """
+    width, height = size
+    frame = rng.integers(60, 160, (height // 8, width // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+    boxes = []
+    for face_width in widths:
+        face = faces[rng.integers(len(faces))]
+        # photo_face() leaves 0.3 of the face width as margin on each side
+        factor = face_width * 1.6 / face.shape[1]
+        face = cv2.resize(face, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        h, w = face.shape[:2]
+        for _ in range(100):
+            y, x = int(rng.integers(0, height - h)), int(rng.integers(0, width - w))
+            if all(y + h < top or y > bottom or x + w < left or x > right for top, right, bottom, left in boxes):
+                break
+        frame[y:y + h, x:x + w] = face
+        margin = (w - face_width) // 2
+        boxes.append((y + margin, x + w - margin, y + h - margin, x + margin))
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), boxes
+
+
+def benchmark_tiled(args):
+    """Faces found and wall time per frame, detecting on the quarter-size frame, the full-size one, and in tiles"""
+    encoder = create_encoder(args.encoder)
+    faces = []
+    for file_name in sorted(os.listdir(args.faces)):
+        if file_name.endswith((".jpg", ".png")):
+            try:
+                faces.append(photo_face(os.path.join(args.faces, file_name), encoder))
+            except ValueError:
+                # A photo the detector finds no face in is no use to paste either
+                pass
+    rng = np.random.default_rng(0)
+    frames = [_crowd_frame(faces, args.face_widths, tuple(args.size), rng) for _ in range(args.frames)]
+    print(f"{args.frames} frames of {args.size[0]}x{args.size[1]} with faces "
+          f"{', '.join(map(str, args.face_widths))} px wide; {os.cpu_count()} cores")
+    print(f"{'detection':<26}{'ms/frame':>9}" + "".join(f"{f'{w} px':>8}" for w in args.face_widths))
+
+    def run(name, locate):
+        locate(frames[0][0])
+        found = np.zeros(len(args.face_widths))
+        start = time.perf_counter()
+        for rgb, boxes in frames:
+            locations = locate(rgb)
+            for i, (top, right, bottom, left) in enumerate(boxes):
+                # A detection centred on the face and of about its size
+                found[i] += any(top < (t + b) / 2 < bottom and left < (l + r) / 2 < right
+                                and 0.5 < (r - l) / (right - left) < 2 for t, r, b, l in locations)
+        elapsed = (time.perf_counter() - start) / len(frames)
+        print(f"{name:<26}{elapsed * 1000:>9.1f}" + "".join(f"{n / len(frames):>8.0%}" for n in found))
+
+    def quarter(rgb):
+        small = cv2.resize(rgb, None, fx=0.25, fy=0.25)
+        return [(t * 4, r * 4, b * 4, l * 4) for t, r, b, l in encoder.locate(small)]
+
+    run("quarter-size frame", quarter)
+    run("full-size frame", encoder.locate)
+    for tiles in args.tiles:
+        for workers in args.workers:
+            detector = TiledDetector(tiles, args.overlap, workers)
+            detector.start(encoder.name)
+            run(f"{detector!r}", lambda rgb: detector.locate(rgb, encoder.name))
+            detector.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    encoders_parser = subparsers.add_parser("encoders", help="ms/face and identification accuracy of each encoder")
+    encoders_parser.add_argument("--faces", default="faces")
+    encoders_parser.add_argument("--encoders", nargs="*", choices=list(ENCODERS))
+    encoders_parser.add_argument("--repeat", type=int, default=5)
+    encoders_parser.add_argument("--min-confidence", type=float,
+                                 help="reject matches below this confidence (default: the encoder's own cut-off)")
+    encoders_parser.set_defaults(run=benchmark_encoders)
+
+    tracker_parser = subparsers.add_parser("tracker", help="per-frame tracker cost versus number of tracks")
+    tracker_parser.add_argument("--faces-in-view", nargs="*", type=int, default=[1, 2, 5, 10, 20, 50, 100])
+    tracker_parser.add_argument("--frames", type=int, default=300)
+    tracker_parser.set_defaults(run=benchmark_tracker)
+
+    follow_parser = subparsers.add_parser("follow", help="reactive versus predictive following in the simulator")
+    follow_parser.add_argument("--latencies", nargs="*", type=float, default=[0.1, 0.2, 0.3])
+    follow_parser.add_argument("--duration", type=float, default=60.0)
+    follow_parser.add_argument("--runs", type=int, default=5)
+    follow_parser.set_defaults(run=benchmark_follow)
+
+    gallery_parser = subparsers.add_parser("gallery", help="open and match time of in-memory versus mmap galleries")
+    gallery_parser.add_argument("--identities", type=int, default=1000000)
+    gallery_parser.add_argument("--segment-size", type=int, default=250000)
+    gallery_parser.add_argument("--dtypes", nargs="*", choices=DTYPES, default=list(DTYPES))
+    gallery_parser.add_argument("--dir", default=None, help="where to write the temporary stores")
+    gallery_parser.set_defaults(run=benchmark_gallery)
+
+    quantized_parser = subparsers.add_parser("quantized", help="int8 two-stage versus exact gallery matching")
+    quantized_parser.add_argument("--identities", type=int, default=1000000)
+    quantized_parser.add_argument("--queries", type=int, default=50)
+    quantized_parser.add_argument("--noise", type=float, default=0.03, help="per-dimension query noise")
+    quantized_parser.add_argument("--rerank-k", nargs="*", type=int, default=[1, 8, 32, 128])
+    quantized_parser.set_defaults(run=benchmark_quantized)
+
+    inference_parser = subparsers.add_parser("inference", help="batched encoding through the inference service")
+    inference_parser.add_argument("--faces", default="faces")
+    inference_parser.add_argument("--encoder", default="dlib-large")
+    inference_parser.add_argument("--clients", type=int, default=4)
+    inference_parser.add_argument("--windows", nargs="*", type=float, default=[0, 2, 5, 20], help="batch windows in ms")
+    inference_parser.add_argument("--max-batch", type=int, default=32)
+    inference_parser.add_argument("--duration", type=float, default=10.0)
+    inference_parser.set_defaults(run=benchmark_inference)
+
+    ingest_parser = subparsers.add_parser("ingest", help="djitellopy's frame reader versus VideoIngest")
+    ingest_parser.add_argument("--duration", type=float, default=10.0)
+    ingest_parser.add_argument("--fps", type=int, default=30)
+    ingest_parser.add_argument("--consumer-fps", nargs="*", type=float, default=[30, 5],
+                               help="how often the consumer reads a frame")
+    ingest_parser.add_argument("--port", type=int, default=21111, help="first local UDP port to stream to")
+    ingest_parser.set_defaults(run=benchmark_ingest)
+
+    framepool_parser = subparsers.add_parser("framepool", help="display loop with and without the frame pool")
+    framepool_parser.add_argument("--frames", type=int, default=300)
+    framepool_parser.set_defaults(run=benchmark_framepool)
+
+    display_parser = subparsers.add_parser("display", help="after(10) polling versus event-driven repaints")
+    display_parser.add_argument("--duration", type=float, default=10.0)
+    display_parser.add_argument("--fps", nargs="*", type=float, default=[30, 5, 0],
+                                help="source frame rates; 0 is a stalled feed")
+    display_parser.set_defaults(run=benchmark_display)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="recognition over a video file, repeatable and real time")
+    pipeline_parser.add_argument("--faces", default="faces")
+    pipeline_parser.add_argument("--encoder", default="dlib-large")
+    pipeline_parser.add_argument("--video", help="video file to play; default a synthetic clip of the first face")
+    pipeline_parser.add_argument("--duration", type=float, default=10.0, help="length of the synthetic clip")
+    pipeline_parser.add_argument("--frames", type=int, default=None, help="stop after this many frames")
+    pipeline_parser.set_defaults(run=benchmark_pipeline)
+
+    appearance_parser = subparsers.add_parser("appearance", help="following a target who turns away, with and "
+                                                                 "without the torso appearance model")
+    appearance_parser.add_argument("--faces", default="faces")
+    appearance_parser.add_argument("--encoder", default="dlib-large")
+    appearance_parser.add_argument("--duration", type=float, default=30.0)
+    appearance_parser.add_argument("--runs", type=int, default=3)
+    appearance_parser.add_argument("--turn-away-every", type=float, default=6.0)
+    appearance_parser.add_argument("--turn-away-for", type=float, default=2.5)
+    appearance_parser.set_defaults(run=benchmark_appearance)
+
+    longrange_parser = subparsers.add_parser("longrange", help="following a distant target, with and without the "
+                                                               "people detector")
+    longrange_parser.add_argument("--faces", default="faces")
+    longrange_parser.add_argument("--encoder", default="dlib-large")
+    longrange_parser.add_argument("--duration", type=float, default=20.0)
+    longrange_parser.add_argument("--runs", type=int, default=2)
+    longrange_parser.add_argument("--distances", type=float, nargs="+", default=[300, 350, 400, 450],
+                                  help="following distances in cm")
+    # About the Tello's 82.6 degree diagonal field of view at 720x480
+    longrange_parser.add_argument("--focal-length", type=float, default=490)
+    longrange_parser.set_defaults(run=benchmark_longrange)
+
+    reacquire_parser = subparsers.add_parser("reacquire", help="time to find a target again after they run out of "
+                                                               "view, with and without the search")
+    reacquire_parser.add_argument("--faces", default="faces")
+    reacquire_parser.add_argument("--encoder", default="dlib-large")
+    reacquire_parser.add_argument("--duration", type=float, default=60.0)
+    reacquire_parser.add_argument("--runs", type=int, default=2)
+    reacquire_parser.add_argument("--interval", type=int, default=3, help="detect on every n-th frame")
+    reacquire_parser.add_argument("--dash-every", type=float, default=15.0)
+    reacquire_parser.add_argument("--dash-for", type=float, default=0.6)
+    reacquire_parser.add_argument("--dash-speed", type=float, default=150.0, help="cm/s")
+    reacquire_parser.set_defaults(run=benchmark_reacquire)
+
+    tiled_parser = subparsers.add_parser("tiled", help="faces found and time per frame of tiled full-size detection")
+    tiled_parser.add_argument("--faces", default="faces")
+    tiled_parser.add_argument("--encoder", default="dlib-large")
+    tiled_parser.add_argument("--size", nargs=2, type=int, default=[960, 720], help="frame width and height")
+    tiled_parser.add_argument("--face-widths", nargs="*", type=int, default=[24, 32, 48, 64, 96, 160])
+    tiled_parser.add_argument("--frames", type=int, default=20)
+    tiled_parser.add_argument("--tiles", nargs="*", type=parse_tiles, default=[(2, 2), (3, 2)])
+    tiled_parser.add_argument("--workers", nargs="*", type=int, default=[1, 2, 4])
+    tiled_parser.add_argument("--overlap", type=int, default=96)
+    tiled_parser.set_defaults(run=benchmark_tiled)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
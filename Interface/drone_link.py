@@ -0,0 +1,118 @@
+"""
+Background bring-up of the Tello link.
+
+connect(), streamon() and the wait for the first decoded video frame each block
+for seconds, and much longer when the drone is not there (djitellopy retries
+every command). DroneLink runs them on a background thread while the window is
+built and the face gallery loads. The controller shows `status` on a
+placeholder frame until `ready` is set, and a failed attempt is retried until
+the link comes up or the app closes. `on_frame` tells the controller when
+there is something new to show, so it repaints only then.
+
+Video is read with VideoIngest rather than djitellopy's frame reader, decoded
+with low-delay settings and converted to `frame_size` only when read.
+DroneLink is the Tello's frame source (see frame_sources.py).
+"""
+
+import threading
+import time
+from djitellopy import Tello
+from frame_sources import FrameSource
+from video_ingest import VideoIngest
+
+
+class DroneLink(FrameSource):
+    def __init__(self, drone=None, startup=None, retry_delay=2.0, first_frame_timeout=10.0, video_port=None,
+                 frame_size=None, video_options=None, on_frame=None):
+        super().__init__(on_frame)
+        self.drone = drone if drone is not None else Tello()
+        self.host = self.drone.address[0]
+        # With several drones in station mode each one has to stream to its own local port
+        self.video_port = video_port
+        # Optional StartupTimer that gets the 'connect', 'stream on' and 'drone frame' stages
+        self.startup = startup
+        self.retry_delay = retry_delay
+        self.first_frame_timeout = first_frame_timeout
+        # (width, height) the frames are wanted at, or None for the drone's 960x720
+        self.frame_size = frame_size
+        # Further VideoIngest arguments, e.g. {"threads": 2}
+        self.video_options = video_options or {}
+
+        self.status = "Waiting to connect"
+        self.attempts = 0
+        self.frame_read = None
+        # Seconds from start() until the first decoded frame, once there is one
+        self.time_to_first_frame = None
+        self._started = None
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        if self.frame_read is not None:
+            self.frame_read.stop()
+
+    def _set_status(self, status):
+        self.status = status
+        print(f"Drone link: {status}")
+        self._notify()
+
+    def _stage(self, name, function):
+        start = time.perf_counter()
+        result = function()
+        if self.startup is not None:
+            self.startup.mark(name, time.perf_counter() - start)
+        return result
+
+    def _run(self):
+        while not self._stopped:
+            self.attempts += 1
+            try:
+                self._set_status("Connecting...")
+                self._stage("connect", self.drone.connect)
+                if self.video_port is not None:
+                    self.drone.change_vs_udp(self.video_port)
+                self._set_status("Starting video stream...")
+                self._stage("stream on", self.drone.streamon)
+                self._set_status("Waiting for first frame...")
+                self._stage("drone frame", self._wait_for_first_frame)
+            except Exception as e:
+                self.error = e
+                self._set_status(f"Attempt {self.attempts} failed ({e}), retrying in {self.retry_delay:g} s")
+                time.sleep(self.retry_delay)
+                continue
+
+            self.error = None
+            self.time_to_first_frame = time.perf_counter() - self._started
+            self.ready.set()
+            self._set_status(f"Connected, first frame after {self.time_to_first_frame:.2f} s")
+            return
+
+    def _wait_for_first_frame(self):
+        if self.frame_read is not None:
+            # Left over from a failed attempt
+            self.frame_read.stop()
+        self.frame_read = VideoIngest(self.drone.get_udp_video_address(), output_size=self.frame_size,
+                                      open_timeout=self.first_frame_timeout, on_frame=self._notify,
+                                      **self.video_options).start()
+        # The reader starts out holding a blank placeholder frame
+        placeholder = self.frame_read.frame
+        deadline = time.perf_counter() + self.first_frame_timeout
+        while self.frame_read.frame is placeholder:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"no video frame within {self.first_frame_timeout:.0f} s")
+            time.sleep(0.01)
+
+    def read(self):
+        """The newest decoded frame and the perf_counter() time it arrived, or (None, None) until the link is up"""
+        if not self.ready.is_set():
+            return None, None
+        # Reading the frame converts a pending one and moves frame_arrival on to it
+        frame = self.frame_read.frame
+        return frame, self.frame_read.frame_arrival
@@ -0,0 +1,269 @@
+"""
+Face encoder backends for the recognition pipeline.
+
+Every encoder exposes the same small interface, so the gallery and the matcher
+do not care which network produced an encoding:
+
+    locate(rgb_image)                        -> [(top, right, bottom, left), ...]
+    encode(rgb_image, face_locations)        -> matrix with one encoding per row
+    encode_batch([(rgb_image, face_locations), ...]) -> one such matrix per image
+    distance(encodings, encoding)            -> distance of `encoding` to every row
+    average(encodings)                       -> one encoding for several of the same face
+    eye_landmarks(rgb_image, face_locations) -> [(left_eye, right_eye, nose), ...]
+
+Each encoder also carries its own match tolerance and confidence threshold,
+which replace the fixed 0.6 / 0.7 values that used to live in the controllers.
+"""
+
+import os
+import cv2
+import numpy as np
+
+# Folder holding the OpenCV model files (see README.md for download links)
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+class FaceEncoder:
+    """Base class for the encoder backends"""
+
+    # Unique name, used to tag galleries built with this encoder
+    name = None
+    # Largest distance that still counts as a match
+    tolerance = 0.6
+    # Threshold used by FaceRecognition.calculate_confidence
+    confidence_threshold = 0.7
+    # Confidence (0-100) a match within tolerance also needs to be accepted, or None to accept every such match
+    min_confidence = None
+    # What distance() computes, "l2" or "cosine"; the quantized index ranks candidates the same way
+    metric = "l2"
+    # True when every instance uses the same underlying models, so instances must not run concurrently
+    shares_models = False
+
+    def locate(self, rgb_image):
+        raise NotImplementedError
+
+    def encode(self, rgb_image, face_locations):
+        raise NotImplementedError
+
+    def encode_batch(self, items):
+        """encode() for several (rgb_image, face_locations) pairs; backends that can run them as one batch override this"""
+        return [self.encode(rgb_image, face_locations) for rgb_image, face_locations in items]
+
+    def distance(self, encodings, encoding):
+        raise NotImplementedError
+
+    def eye_landmarks(self, rgb_image, face_locations):
+        # Backends without cheap landmarks skip the pose check
+        return [None] * len(face_locations)
+
+    def average(self, encodings):
+        """One encoding standing for several of the same face"""
+        return np.mean(encodings, axis=0)
+
+
+class DlibEncoder(FaceEncoder):
+    """
+    The 128-d dlib ResNet behind face_recognition.face_encodings.
+
+    landmark_model="large" aligns with the 68-point predictor (the previous
+    behaviour), "small" with the 5-point one, which is several times cheaper.
+    """
+
+    # face_recognition loads its dlib models once, as module globals
+    shares_models = True
+    # 0.6 lets through look-alikes; a confidence of 80 accepts distances up to about 0.52
+    min_confidence = 80
+
+    def __init__(self, landmark_model="large", num_jitters=1):
+        import face_recognition
+        self._face_recognition = face_recognition
+        self.landmark_model = landmark_model
+        self.num_jitters = num_jitters
+        self.name = f"dlib-{landmark_model}"
+
+    def locate(self, rgb_image):
+        return self._face_recognition.face_locations(rgb_image)
+
+    def encode(self, rgb_image, face_locations):
+        encodings = self._face_recognition.face_encodings(rgb_image, face_locations,
+                                                          num_jitters=self.num_jitters,
+                                                          model=self.landmark_model)
+        return np.array(encodings).reshape(len(encodings), 128)
+
+    def encode_batch(self, items):
+        # Same landmarks and network as face_encodings, but every face of every image goes through one call
+        import dlib
+        api = self._face_recognition.api
+        images = []
+        detections = []
+        for rgb_image, face_locations in items:
+            if face_locations:
+                images.append(rgb_image)
+                detections.append(dlib.full_object_detections(
+                    api._raw_face_landmarks(rgb_image, face_locations, self.landmark_model)))
+        descriptors = iter(api.face_encoder.compute_face_descriptor(images, detections, self.num_jitters)
+                           if images else [])
+        return [np.array(next(descriptors)).reshape(len(face_locations), 128) if face_locations
+                else np.empty((0, 128)) for _, face_locations in items]
+
+    def distance(self, encodings, encoding):
+        if len(encodings) == 0:
+            return np.empty(0)
+        return np.linalg.norm(encodings - encoding, axis=1)
+
+    def eye_landmarks(self, rgb_image, face_locations):
+        # The 5-point model is cheap next to the ResNet
+        landmarks = []
+        for points in self._face_recognition.face_landmarks(rgb_image, face_locations, model="small"):
+            landmarks.append((np.mean(points["left_eye"], axis=0), np.mean(points["right_eye"], axis=0),
+                              points["nose_tip"][0]))
+        return landmarks
+
+
+class SFaceEncoder(FaceEncoder):
+    """
+    OpenCV's YuNet detector and SFace recognizer (cv2.FaceRecognizerSF), CPU only.
+
+    Encodings are L2-normalised, so the distance is 1 - cosine similarity.
+    OpenCV publishes 0.363 as the cosine similarity threshold for SFace.
+    """
+
+    name = "sface"
+    metric = "cosine"
+    tolerance = 1.0 - 0.363
+    confidence_threshold = 1.0 - 0.363 + 0.1
+    # The tolerance is already the calibrated operating point
+    min_confidence = None
+
+    def __init__(self, detector_model=None, recognizer_model=None, score_threshold=0.8):
+        detector_model = detector_model or os.path.join(MODELS_DIR, "face_detection_yunet_2023mar.onnx")
+        recognizer_model = recognizer_model or os.path.join(MODELS_DIR, "face_recognition_sface_2021dec.onnx")
+        for path in (detector_model, recognizer_model):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"SFace model file not found: {path}")
+
+        self.detector = cv2.FaceDetectorYN.create(detector_model, "", (320, 320), score_threshold)
+        self.recognizer = cv2.FaceRecognizerSF.create(recognizer_model, "")
+        # YuNet rows (box, 5 landmarks and score) from the last locate() call
+        self._last_detections = {}
+
+    def _detect(self, bgr_image):
+        h, w = bgr_image.shape[:2]
+        self.detector.setInputSize((w, h))
+        _, faces = self.detector.detect(bgr_image)
+        return faces if faces is not None else np.empty((0, 15), dtype=np.float32)
+
+    def locate(self, rgb_image):
+        bgr_image = np.ascontiguousarray(rgb_image[:, :, ::-1])
+        h, w = bgr_image.shape[:2]
+        face_locations = []
+        self._last_detections = {}
+        for row in self._detect(bgr_image):
+            x, y, fw, fh = row[:4]
+            location = (max(0, int(y)), min(w, int(x + fw)), min(h, int(y + fh)), max(0, int(x)))
+            face_locations.append(location)
+            self._last_detections[location] = row
+        return face_locations
+
+    def _detection_for(self, bgr_image, location):
+        row = self._last_detections.get(tuple(location))
+        if row is not None:
+            return row
+
+        # The box came from another detector, so find the landmarks inside it
+        top, right, bottom, left = location
+        pad = (bottom - top) // 4
+        y0, x0 = max(0, top - pad), max(0, left - pad)
+        crop = np.ascontiguousarray(bgr_image[y0:bottom + pad, x0:right + pad])
+        faces = self._detect(crop)
+        if len(faces) == 0:
+            return None
+        row = faces[np.argmax(faces[:, 14])].copy()
+        # Back to image coordinates: the box corner and the landmarks, not the box width and height
+        row[0] += x0
+        row[1] += y0
+        row[4:14:2] += x0
+        row[5:14:2] += y0
+        return row
+
+    def encode(self, rgb_image, face_locations):
+        bgr_image = np.ascontiguousarray(rgb_image[:, :, ::-1])
+        encodings = np.zeros((len(face_locations), 128), dtype=np.float32)
+        for i, location in enumerate(face_locations):
+            row = self._detection_for(bgr_image, location)
+            if row is None:
+                continue
+            aligned = self.recognizer.alignCrop(bgr_image, row)
+            feature = self.recognizer.feature(aligned).ravel()
+            encodings[i] = feature / (np.linalg.norm(feature) + 1e-12)
+        return encodings
+
+    def distance(self, encodings, encoding):
+        if len(encodings) == 0:
+            return np.empty(0)
+        return 1.0 - encodings @ encoding
+
+    def average(self, encodings):
+        # Keep the mean on the unit sphere, or 1 - dot is no longer a cosine distance
+        mean = np.mean(encodings, axis=0)
+        return mean / (np.linalg.norm(mean) + 1e-12)
+
+    def eye_landmarks(self, rgb_image, face_locations):
+        # YuNet already found the landmarks: right eye, left eye, nose tip, mouth corners
+        bgr_image = np.ascontiguousarray(rgb_image[:, :, ::-1])
+        landmarks = []
+        for location in face_locations:
+            row = self._detection_for(bgr_image, location)
+            landmarks.append(None if row is None else (row[6:8], row[4:6], row[8:10]))
+        return landmarks
+
+
+class LockedEncoder:
+    """
+    Wraps an encoder so every method call holds `lock`. The gallery watcher
+    encodes on its own thread, and encoders with shares_models must not run
+    at the same time as the video loop's.
+    """
+
+    def __init__(self, encoder, lock):
+        self._encoder = encoder
+        self._lock = lock
+
+    def __getattr__(self, name):
+        value = getattr(self._encoder, name)
+        if not callable(value):
+            return value
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return value(*args, **kwargs)
+        return locked
+
+
+# Encoder names accepted by create_encoder, in order of preference
+ENCODERS = {
+    "dlib-large": lambda: DlibEncoder("large"),
+    "dlib-small": lambda: DlibEncoder("small"),
+    "sface": SFaceEncoder,
+}
+
+# Heavy libraries each encoder imports before it loads its model files
+ENCODER_MODULES = {
+    "dlib-large": ("dlib",),
+    "dlib-small": ("dlib",),
+    "sface": (),
+}
+
+
+# Encoder name that forwards to the local inference service (inference_service.py) instead
+REMOTE_ENCODER = "remote"
+
+
+def create_encoder(name="dlib-large"):
+    """Create an encoder backend by name"""
+    if name == REMOTE_ENCODER:
+        from inference_client import RemoteEncoder
+        return RemoteEncoder()
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown face encoder '{name}', expected one of {list(ENCODERS) + [REMOTE_ENCODER]}")
+    return ENCODERS[name]()
@@ -0,0 +1,59 @@
+"""
+Live enrollment of a new identity from the video.
+
+The operator picks an unknown face and gives it a name. Over the next frames
+the pipeline encodes that face's track every time it passes the quality gate,
+and once enough samples are in, their average becomes a new gallery identity.
+The sharpest sample's crop can be saved to faces/ so the identity survives a
+restart.
+"""
+
+import time
+import cv2
+import numpy as np
+
+
+class Enrollment:
+    def __init__(self, name, track_id, samples_needed=5, timeout=15.0, persist=True):
+        self.name = name
+        self.track_id = track_id
+        self.samples_needed = samples_needed
+        self.timeout = timeout
+        self.persist = persist
+        self.started = time.time()
+        self.encodings = []
+        # Sharpest face crop seen so far, for the photo saved to faces/
+        self.photo = None
+        self.photo_sharpness = -1.0
+
+    @property
+    def progress(self):
+        return len(self.encodings), self.samples_needed
+
+    @property
+    def done(self):
+        return len(self.encodings) >= self.samples_needed
+
+    @property
+    def expired(self):
+        return time.time() - self.started > self.timeout
+
+    def add(self, encoding, frame, location):
+        """Add one encoding, with the full-size BGR frame and the face's (top, right, bottom, left) in it"""
+        if not np.any(encoding):
+            # The encoder could not align this face
+            return
+        self.encodings.append(encoding)
+
+        top, right, bottom, left = location
+        margin = (bottom - top) // 2
+        crop = frame[max(0, top - margin):bottom + margin, max(0, left - margin):right + margin]
+        if crop.size == 0:
+            return
+        sharpness = cv2.Laplacian(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+        if sharpness > self.photo_sharpness:
+            self.photo = crop.copy()
+            self.photo_sharpness = sharpness
+
+    def encoding(self, encoder):
+        return encoder.average(np.vstack(self.encodings))
@@ -0,0 +1,226 @@
+"""
+Known-face gallery: one encoding per identity, tagged with the encoder that
+produced it. Encodings from different encoders live in different spaces, so
+matching a gallery with the wrong encoder is rejected instead of returning
+meaningless distances.
+
+GalleryWatcher keeps a gallery in step with the faces folder while the GCS
+runs: new or changed photos are encoded on a background thread and a new
+Gallery is built and handed over whole, so readers never see half an update.
+"""
+
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from quantized_index import Int8Index, two_stage_match
+
+PHOTO_EXTENSIONS = (".jpg", ".png")
+
+
+class Gallery:
+    def __init__(self, encoder_name, names=None, encodings=None):
+        self.encoder_name = encoder_name
+        self.names = list(names or [])
+        # float32 is plenty for matching and half the size of what the encoders return
+        self.encodings = np.asarray(encodings, dtype=np.float32) if encodings is not None else np.empty((0, 128), dtype=np.float32)
+        # Optional int8 index for two-stage matching, see quantize()
+        self.index = None
+        self.rerank_k = 32
+
+    @classmethod
+    def from_directory(cls, faces_dir, encoder):
+        """Encode the first face of every .jpg/.png photo in faces_dir"""
+        names = []
+        encodings = []
+        for file_name in sorted(os.listdir(faces_dir)):
+            if file_name.endswith(PHOTO_EXTENSIONS):
+                encoding = encode_photo(os.path.join(faces_dir, file_name), encoder)
+                if encoding is not None:
+                    encodings.append(encoding)
+                    names.append(os.path.splitext(file_name)[0])
+
+        gallery = cls(encoder.name, names)
+        if encodings:
+            gallery.encodings = np.vstack(encodings).astype(np.float32)
+        return gallery
+
+    def __len__(self):
+        return len(self.names)
+
+    def check_encoder(self, encoder):
+        if encoder.name != self.encoder_name:
+            raise ValueError(f"Gallery was built with '{self.encoder_name}' "
+                             f"but is being matched with '{encoder.name}'")
+
+    def quantize(self, encoder, rerank_k=32):
+        """Match through an int8 coarse pass, re-ranking the best rerank_k candidates exactly"""
+        self.index = Int8Index.build([self.encodings], encoder.metric)
+        self.rerank_k = rerank_k
+        return self
+
+    def match(self, encoder, encoding):
+        """Return (index, distance) of the closest identity, or (None, None) if the gallery is empty"""
+        self.check_encoder(encoder)
+        if len(self.names) == 0:
+            return None, None
+        if self.index is not None:
+            return two_stage_match(self.index, self.encodings.__getitem__, encoder, encoding, self.rerank_k)
+        distances = encoder.distance(self.encodings, encoding)
+        best_match_index = int(np.argmin(distances))
+        return best_match_index, float(distances[best_match_index])
+
+
+def encode_photo(image_path, encoder):
+    """Encode the first face found in a photo, or return None if there is no face"""
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    return encode_image(image, encoder)
+
+
+def encode_image(image, encoder):
+    """Encode the first face found in a BGR image, or return None if there is no face"""
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = encoder.locate(rgb_image)
+    if not face_locations:
+        return None
+    return encoder.encode(rgb_image, face_locations[:1])[0]
+
+
+class GalleryWatcher:
+    """
+    Polls faces_dir for added, changed and removed photos and rebuilds the
+    gallery from the encodings it already has plus the new ones. on_change is
+    called from the watcher thread with the new Gallery.
+    """
+
+    def __init__(self, faces_dir, encoder, on_change=None, interval=1.0):
+        self.faces_dir = faces_dir
+        self.encoder = encoder
+        self.on_change = on_change
+        self.interval = interval
+        # file name -> (mtime, size) of every photo already handled, and the encoding of those with a face
+        self.photos = {}
+        self.encodings = {}
+        self.last_scan = None
+        # scan() runs on the watcher thread, add_identity() on the GUI thread; held to read and update the state,
+        # never while encoding
+        self._lock = threading.Lock()
+        # Seconds between a photo appearing and its identity becoming matchable, newest last
+        self.add_latencies = []
+        self._running = False
+        self._thread = None
+
+    def scan(self):
+        """Encode whatever changed since the last scan and return the new Gallery, or None if nothing did"""
+        scan_time = time.time()
+        current = {}
+        for entry in os.scandir(self.faces_dir):
+            if entry.name.endswith(PHOTO_EXTENSIONS) and entry.is_file():
+                stat = entry.stat()
+                current[entry.name] = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            known = dict(self.photos)
+
+        # Encoded without holding the lock: add_identity() is called from the video loop, which may be holding the
+        # models the encoder is waiting for
+        encoded = {}
+        for file_name in sorted(current):
+            if known.get(file_name) == current[file_name]:
+                continue
+            image = cv2.imread(os.path.join(self.faces_dir, file_name))
+            if image is None:
+                # Probably still being copied; try again on the next scan
+                continue
+            encoded[file_name] = encode_image(image, self.encoder)
+
+        with self._lock:
+            return self._apply(scan_time, known, current, encoded)
+
+    def _apply(self, scan_time, known, current, encoded):
+        # Photos add_identity() saved meanwhile are already in, and newer than what this scan saw
+        removed = [f for f in known if f not in current and self.photos.get(f) == known[f]]
+        for file_name in removed:
+            del self.photos[file_name]
+            self.encodings.pop(file_name, None)
+
+        added = []
+        # Known photos replaced by one with no face: their identity goes too
+        dropped = []
+        for file_name, encoding in encoded.items():
+            if self.photos.get(file_name) != known.get(file_name):
+                continue
+            self.photos[file_name] = current[file_name]
+            if encoding is None:
+                if self.encodings.pop(file_name, None) is not None:
+                    dropped.append(file_name)
+                print(f"Gallery: no face found in {file_name}")
+                continue
+            self.encodings[file_name] = encoding
+            added.append(file_name)
+
+        previous_scan, self.last_scan = self.last_scan, scan_time
+        if not removed and not added and not dropped and previous_scan is not None:
+            return None
+
+        gallery = self.build()
+        if previous_scan is not None:
+            now = time.time()
+            for file_name in added:
+                # A copy can keep the original mtime, but the photo cannot be older than the previous scan
+                appeared = max(self.photos[file_name][0], previous_scan)
+                self.add_latencies.append(now - appeared)
+                print(f"Gallery: {os.path.splitext(file_name)[0]} available "
+                      f"{self.add_latencies[-1]:.2f} s after the photo appeared")
+            for file_name in removed + dropped:
+                print(f"Gallery: removed {os.path.splitext(file_name)[0]}")
+        return gallery
+
+    def add_identity(self, name, encoding, photo=None):
+        """
+        Add an identity that did not come from a photo in faces_dir, such as one
+        enrolled from the video, and return the new Gallery. With a photo (BGR
+        image) it is also saved to faces_dir, so it is still known after a restart.
+        """
+        with self._lock:
+            if photo is None:
+                # Never matches a file in faces_dir, so scans leave it alone
+                file_name = name + ".enrolled"
+            else:
+                file_name = name + ".jpg"
+                path = os.path.join(self.faces_dir, file_name)
+                cv2.imwrite(path, photo)
+                stat = os.stat(path)
+                self.photos[file_name] = (stat.st_mtime, stat.st_size)
+            self.encodings[file_name] = encoding
+            return self.build()
+
+    def build(self):
+        file_names = sorted(self.encodings)
+        gallery = Gallery(self.encoder.name, [os.path.splitext(f)[0] for f in file_names])
+        if file_names:
+            gallery.encodings = np.vstack([self.encodings[f] for f in file_names]).astype(np.float32)
+        return gallery
+
+    def start(self):
+        """Keep scanning on a background thread; the first scan should already have been done"""
+        self._running = True
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+
+    def _watch(self):
+        while self._running:
+            time.sleep(self.interval)
+            try:
+                gallery = self.scan()
+            except OSError as e:
+                print(f"Gallery: cannot scan {self.faces_dir}: {e}")
+                continue
+            if gallery is not None and self.on_change is not None:
+                self.on_change(gallery)
@@ -0,0 +1,90 @@
+"""
+Face quality gate run between detection and encoding.
+
+Encoding is by far the most expensive per-face step, and faces that are
+motion-blurred, tiny or seen in profile will not match anyway. The gate scores
+every detected box on sharpness (variance of the Laplacian), size and rough
+pose (how far the nose sits from the middle of the eyes) and only lets the
+good ones through to the encoder.
+"""
+
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+
+class FaceQualityGate:
+    def __init__(self, min_size=12, min_sharpness=25.0, max_yaw=0.45, rate_window=5.0):
+        # Smallest face width/height in pixels of the detection image
+        self.min_size = min_size
+        # Smallest Laplacian variance of the face crop
+        self.min_sharpness = min_sharpness
+        # Largest nose offset from the eye midpoint, relative to the eye distance
+        self.max_yaw = max_yaw
+
+        self.checked = 0
+        self.skipped = 0
+        # (time, skipped faces) of the last `rate_window` seconds, for the saved-encodes rate
+        self.rate_window = rate_window
+        self.recent_skips = deque()
+
+    @staticmethod
+    def sharpness(rgb_image, location):
+        top, right, bottom, left = location
+        crop = np.ascontiguousarray(rgb_image[max(0, top):bottom, max(0, left):right])
+        if crop.size == 0:
+            return 0.0
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+    @staticmethod
+    def yaw(landmarks):
+        """0 for a frontal face, around 1 for a full profile"""
+        if landmarks is None:
+            return 0.0
+        left_eye, right_eye, nose = (np.asarray(point, dtype=float) for point in landmarks)
+        eye_distance = np.linalg.norm(right_eye - left_eye)
+        if eye_distance == 0:
+            return 1.0
+        return float(abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance)
+
+    def check(self, rgb_image, location, landmarks=None):
+        """Return None if the face is good enough to encode, otherwise the reason it is not"""
+        top, right, bottom, left = location
+        if min(right - left, bottom - top) < self.min_size:
+            return "too small"
+        if self.sharpness(rgb_image, location) < self.min_sharpness:
+            return "blurred"
+        if self.yaw(landmarks) > self.max_yaw:
+            return "profile"
+        return None
+
+    def select(self, encoder, rgb_image, face_locations):
+        """Return the indices of the faces worth encoding"""
+        # Size is free to check, so only compute landmarks for faces that pass it
+        sized = [i for i, (top, right, bottom, left) in enumerate(face_locations)
+                 if min(right - left, bottom - top) >= self.min_size]
+        landmarks = encoder.eye_landmarks(rgb_image, [face_locations[i] for i in sized]) if sized else []
+        landmarks = dict(zip(sized, landmarks))
+
+        selected = [i for i, location in enumerate(face_locations)
+                    if i in landmarks and self.check(rgb_image, location, landmarks[i]) is None]
+
+        skipped = len(face_locations) - len(selected)
+        self.checked += len(face_locations)
+        self.skipped += skipped
+        if skipped:
+            self.recent_skips.append((time.perf_counter(), skipped))
+        return selected
+
+    @property
+    def encodes_saved_per_second(self):
+        now = time.perf_counter()
+        while self.recent_skips and now - self.recent_skips[0][0] > self.rate_window:
+            self.recent_skips.popleft()
+        return sum(skipped for _, skipped in self.recent_skips) / self.rate_window
+
+    def stats(self):
+        return {"checked": self.checked, "skipped": self.skipped,
+                "encodes_saved_per_second": self.encodes_saved_per_second}
@@ -0,0 +1,875 @@
+import importlib
+import os
+import threading
+import time
+from contextlib import nullcontext
+import cv2
+import numpy as np
+from appearance_model import AppearanceModel
+from face_encoders import ENCODER_MODULES, LockedEncoder, create_encoder
+from face_enrollment import Enrollment
+from inference_client import RemoteEncoder
+from face_gallery import Gallery, GalleryWatcher
+from gallery_store import GalleryStore, is_gallery_store
+from face_quality import FaceQualityGate
+from face_tracker import FaceTracker, iou_matrix, scale_box
+from frame_pool import FramePool
+from motion_gate import MotionGate
+from person_detector import PersonDetector, face_box
+
+
+class FaceRecognition:
+    def __init__(self, faces_dir, encoder="dlib-large", min_confidence=None, use_motion_gate=True,
+                 use_quality_gate=True, use_tracker=True, load=True, watch_gallery=True, quantize=False, rerank_k=32,
+                 detection_scale=0.25, use_appearance=True, use_person_detector=True, use_target_search=True):
+        self.faces_dir = faces_dir
+        self.encoder_name = encoder if isinstance(encoder, str) else encoder.name
+        self.encoder = None if isinstance(encoder, str) else encoder
+        self.gallery = Gallery(self.encoder_name)
+        # Pick up photos added to or removed from faces_dir without a restart
+        self.watch_gallery = watch_gallery
+        self.gallery_watcher = None
+        # Bumped on every gallery swap, so the GUI knows when to refresh its menu
+        self.gallery_version = 0
+        self._identities_stale = False
+        # Match through an int8 coarse pass and exact re-ranking of the top rerank_k, for very large galleries
+        self.quantize = quantize
+        self.rerank_k = rerank_k
+        # Set once the encoder and gallery are loaded; until then recognize_faces finds nothing
+        self.ready = threading.Event()
+        self.load_error = None
+        # A match is accepted when its distance is within the encoder's tolerance and its confidence (0-100) above the
+        # encoder's min_confidence, which together put each encoder at its own operating point (a cosine similarity
+        # of 0.363 for SFace). A value here overrides the encoder's cut-off
+        self.min_confidence = min_confidence
+        # Faces are detected on a copy of the frame this many times the size, and the scale set_detection_scale asked
+        # for, which tiled detection and the search for a lost target override while they are on
+        self.detection_scale = detection_scale
+        self._requested_scale = detection_scale
+        # TiledDetector that detects on the full-size frame instead
+        self.tiled_detector = None
+        # Detect on every n-th frame only, showing the last results in between
+        self.detection_interval = 1
+        self.frames_since_detection = 0
+        # Seconds the last detection and the encoding and matching after it took
+        self.stage_times = {"detect": 0.0, "encode": 0.0}
+        # Encoder switch_encoder is building, and the (encoder, gallery watcher, gallery) it built,
+        # which recognize_faces applies
+        self._switch_target = None
+        self._pending_switch = None
+        # Held while recognize_faces runs the encoder, for other threads using the same models
+        self.model_lock = threading.Lock()
+        # Reusable buffers for the per-frame resizes and conversions
+        self.frame_pool = FramePool()
+        # Skip detection on frames where the scene has not changed and reuse the last results
+        self.motion_gate = MotionGate(pool=self.frame_pool) if use_motion_gate else None
+        # Only encode faces that are sharp, large and frontal enough to match
+        self.quality_gate = FaceQualityGate() if use_quality_gate else None
+        # Follow faces across frames and cache their identity instead of encoding them every frame
+        self.tracker = FaceTracker() if use_tracker else None
+        self.last_tracks = []
+        self.last_results = ([], [], [], [])
+        # False when the last recognize_faces call reused older results
+        self.last_results_fresh = False
+        self.locked_face_name = None
+        # Track the locked name is pinned to, so the target cannot swap between people
+        self.locked_track_id = None
+        # Torso colours of the locked person, to follow them while their face is not visible (needs the tracker)
+        self.use_appearance = use_appearance and use_tracker
+        self.appearance = AppearanceModel() if self.use_appearance else None
+        # Face box (detection-scale pixels) inferred from the appearance model while the locked face is lost
+        self.appearance_target = None
+        # People detector that keeps finding the locked person once their face is too small to detect (needs the
+        # tracker), and the person boxes (full-frame pixels) it found on the last frame
+        self.use_person_detector = use_person_detector and use_tracker
+        self.person_detector = PersonDetector() if self.use_person_detector else None
+        self.person_boxes = []
+        # True while the locked face is missing and the people detector looks for them on every detection
+        self.searching_people = False
+        # Narrowest face (detection-scale pixels) the encoder's detector finds; while the locked person's face is
+        # narrower, only the people detector looks for them
+        self.min_detectable_face = 20
+        # Once the locked target is lost, look for it on every frame, at search_detection_scale at least, matching
+        # faces against the locked identity alone, until it is found again and close enough to be detected at the
+        # usual scale
+        self.use_target_search = use_target_search
+        self.search_detection_scale = 0.5
+        self.search_schedule = False
+        # When (time.time()) the locked target was lost while it is searched for, and the seconds each search took
+        self.target_lost_since = None
+        self.reacquire_times = []
+        # (gallery, name, indices, encodings) of the locked identity, for matching against it alone
+        self._locked_encodings = None
+        # Face picked in the video for enrollment, and the enrollment in progress
+        self.selected_track_id = None
+        self.enrollment = None
+        self.FOCAL_LENGTH = 800
+        self.KNOWN_FACE_WIDTH = 16  # Rata-rata lebar wajah manusia dalam cm
+        # Pipeline that owns the gallery, when this one was created by for_stream(), and the ones sharing it
+        self.parent = None
+        self.streams = []
+
+        if load:
+            self.load()
+
+    def load(self, startup=None):
+        """
+        Import the encoder's libraries, load its models, encode the gallery and
+        run one warm-up inference. Takes seconds with dlib, so GUIs call
+        load_in_background instead. Each stage is marked on `startup` if given.
+        """
+        def stage(name):
+            return startup.stage(name) if startup is not None else nullcontext()
+
+        with stage("import"):
+            modules = ENCODER_MODULES.get(self.encoder_name, ()) if self.encoder is None else ()
+            for module in modules + ("scipy.optimize",):
+                importlib.import_module(module)
+        with stage("model load"):
+            if self.encoder is None:
+                self.encoder = create_encoder(self.encoder_name)
+            self.encoder_name = self.encoder.name
+        with stage("gallery load"):
+            if isinstance(self.encoder, RemoteEncoder):
+                # The inference service owns the gallery, watches its folder and matches against it
+                self.gallery = self.encoder.gallery(self.swap_gallery)
+            elif is_gallery_store(self.faces_dir):
+                # A prebuilt memory-mapped gallery opens in milliseconds, however large
+                self.gallery = GalleryStore.open(self.faces_dir, self.encoder)
+            else:
+                self.gallery_watcher = GalleryWatcher(self.faces_dir, self._locked(self.encoder), self.swap_gallery)
+                self.gallery = self.gallery_watcher.scan()
+            if self.quantize:
+                self.gallery.quantize(self.encoder, self.rerank_k)
+        with stage("warm-up"):
+            # The first inference pays for memory allocation and lazy initialisation inside the networks
+            blank = np.zeros((120, 180, 3), dtype=np.uint8)
+            self.encoder.locate(blank)
+            self.encoder.encode(blank, [(40, 100, 100, 40)])
+            if self.tiled_detector is not None:
+                self.tiled_detector.start(self.encoder.name)
+        for stream in self.streams:
+            self._share_with(stream)
+        print(f"Face recognition ready: {len(self.gallery)} known faces, encoder {self.encoder.name}")
+        self.ready.set()
+        if self.watch_gallery and self.gallery_watcher is not None:
+            self.gallery_watcher.start()
+
+    def load_in_background(self, startup=None):
+        """Run load on a background thread; poll `ready` (or `load_error`) to know when it is done"""
+        def run():
+            try:
+                self.load(startup)
+            except Exception as e:
+                self.load_error = e
+                print(f"Error loading face recognition: {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def for_stream(self):
+        """
+        Another pipeline, with its own gates, tracker and locked face, that shares
+        this one's encoder and gallery; for running several video streams at once.
+        """
+        stream = FaceRecognition(self.faces_dir, self.encoder_name, self.min_confidence,
+                                 use_motion_gate=self.motion_gate is not None,
+                                 use_quality_gate=self.quality_gate is not None,
+                                 use_tracker=self.tracker is not None, load=False, watch_gallery=False,
+                                 detection_scale=self._requested_scale, use_appearance=self.use_appearance,
+                                 use_person_detector=self.use_person_detector,
+                                 use_target_search=self.use_target_search)
+        stream.parent = self
+        stream.ready = self.ready
+        # One pool of workers for the machine, shared by all streams
+        stream.set_tiled_detection(self.tiled_detector)
+        # The gallery watcher encodes with the same models
+        stream.model_lock = self.model_lock
+        self.streams.append(stream)
+        if self.ready.is_set():
+            self._share_with(stream)
+        return stream
+
+    def _share_with(self, stream):
+        stream.encoder = self.encoder
+        stream.gallery_watcher = self.gallery_watcher
+        stream.swap_gallery(self.gallery)
+
+    def swap_gallery(self, gallery):
+        """Replace the gallery in one assignment; recognize_faces picks it up on its next call"""
+        if self.quantize and gallery.index is None:
+            gallery.quantize(self.encoder, self.rerank_k)
+        self.gallery = gallery
+        self.gallery_version += 1
+        self._identities_stale = True
+        for stream in self.streams:
+            stream.swap_gallery(gallery)
+
+    def switch_encoder(self, name):
+        """
+        Change to another encoder without stopping recognition. The new encoder
+        and its gallery are built on a background thread, the faces folder is
+        re-encoded with it, and recognize_faces swaps them in once they are ready.
+        Encoders that share models with the current one only detect between the
+        gallery photos meanwhile, so expect a few seconds of stale results.
+        Identities enrolled without a photo only exist for the old encoder and
+        are dropped. Returns True if a switch was started.
+        """
+        if name == (self._switch_target or self.encoder_name) or not self.ready.is_set():
+            return False
+        if name == self.encoder_name:
+            # Changed our mind before the other encoder was ready
+            self._switch_target = None
+            return False
+        if not self.can_switch_encoder:
+            print(f"Cannot switch encoder to {name}: the gallery is not a faces folder this pipeline owns")
+            return False
+
+        def build():
+            try:
+                start = time.perf_counter()
+                encoder = create_encoder(name)
+                watcher = GalleryWatcher(self.faces_dir, self._locked(encoder), self.swap_gallery)
+                gallery = watcher.scan()
+                if self.quantize:
+                    gallery.quantize(encoder, self.rerank_k)
+                if self._switch_target == name:
+                    self._pending_switch = (encoder, watcher, gallery)
+                    print(f"Encoder {name} ready after {time.perf_counter() - start:.1f} s")
+            except Exception as e:
+                self._switch_target = None
+                print(f"Error switching encoder to {name}: {e}")
+
+        self._switch_target = name
+        threading.Thread(target=build, daemon=True).start()
+        return True
+
+    @property
+    def can_switch_encoder(self):
+        """False for gallery stores, the inference service and shared pipelines, which are tied to their encoder"""
+        return self.gallery_watcher is not None and self.parent is None and not self.streams
+
+    @property
+    def switching_encoder(self):
+        """True while switch_encoder is building the new encoder's gallery"""
+        return self._switch_target is not None
+
+    def _locked(self, encoder):
+        """The encoder to hand to background threads; dlib's models are module globals, shared by all instances"""
+        return LockedEncoder(encoder, self.model_lock) if encoder.shares_models else encoder
+
+    def _apply_switch(self):
+        encoder, watcher, gallery = self._pending_switch
+        self._pending_switch = None
+        if encoder.name != self._switch_target:
+            # Called off, or superseded by a switch to yet another encoder, while it was being built
+            return
+        self._switch_target = None
+        self.gallery_watcher.stop()
+        self.encoder = encoder
+        self.encoder_name = encoder.name
+        self.gallery_watcher = watcher
+        self.swap_gallery(gallery)
+        if self.watch_gallery:
+            watcher.start()
+        print(f"Switched encoder to {encoder.name}: {len(gallery)} known faces")
+
+    def set_detection_scale(self, scale):
+        """
+        Detect on frames `scale` times the size from now on, carrying the tracks
+        over. Tiled detection and the search for a lost target use a larger
+        scale while they are on, and come back to this one.
+        """
+        self._requested_scale = scale
+        self._rescale()
+
+    def _rescale(self):
+        if self.tiled_detector is not None:
+            scale = 1.0
+        elif self.search_schedule:
+            scale = max(self._requested_scale, self.search_detection_scale)
+        else:
+            scale = self._requested_scale
+        if scale == self.detection_scale:
+            return
+        factor = scale / self.detection_scale
+        self.detection_scale = scale
+        if self.tracker is not None:
+            self.tracker.rescale(factor)
+        face_locations, *rest = self.last_results
+        self.last_results = ([scale_box(location, factor) for location in face_locations], *rest)
+        if self.appearance is not None:
+            self.appearance.rescale(factor)
+            if self.appearance_target is not None:
+                self.appearance_target = scale_box(self.appearance_target, factor)
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+
+    def set_tiled_detection(self, detector):
+        """
+        Detect on the full-size frame with a TiledDetector from now on, to find
+        faces too small for the detection scale; None goes back to it. Pass
+        recognize_faces the native frame too, or the tiles only get the frame
+        at the size it is shown.
+        """
+        self.tiled_detector = detector
+        self._rescale()
+
+    def to_frame(self, location):
+        """A (top, right, bottom, left) box in detection-scale pixels, in pixels of the full frame"""
+        return scale_box(location, 1 / self.detection_scale)
+
+    def to_detection(self, x, y):
+        """A point on the full frame, in detection-scale pixels"""
+        return x * self.detection_scale, y * self.detection_scale
+
+    @property
+    def known_face_names(self):
+        return self.gallery.names
+
+    @property
+    def known_face_encodings(self):
+        return self.gallery.encodings
+
+    @staticmethod
+    def calculate_confidence(face_distance, face_match_threshold):
+        if face_distance > face_match_threshold:
+            linear_val = (1.0 - face_distance) / (0.1 - face_match_threshold)
+            return max(0.0, min(1.0, linear_val)) * 100
+        else:
+            linear_val = (1.0 - face_distance) / (face_match_threshold - 0.1)
+            return max(0.0, min(1.0, linear_val)) * 100
+
+    def calculate_distance(self, face_width_pixels):
+        if face_width_pixels == 0:
+            return 0.0
+        return (self.KNOWN_FACE_WIDTH * self.FOCAL_LENGTH) / face_width_pixels
+
+    def match_face(self, face_encoding, encoder=None):
+        """
+        Return (name, confidence, distance) of the best gallery match for one
+        encoding; only the locked identity is matched while it is searched for.
+        """
+        encoder = encoder or self.encoder
+        name = "Unknown"
+        confidence = 0.0
+        distance = 0.0
+
+        # The watcher may swap the gallery at any time, so hold on to one
+        gallery = self.gallery
+        if self.searching_target and self.enrollment is None:
+            best_match_index, best_distance = self._match_locked(gallery, encoder, face_encoding)
+        else:
+            best_match_index, best_distance = gallery.match(encoder, face_encoding)
+        if best_match_index is not None and best_distance <= encoder.tolerance:
+            confidence = self.calculate_confidence(best_distance, encoder.confidence_threshold)
+            min_confidence = self.min_confidence if self.min_confidence is not None else encoder.min_confidence
+            if min_confidence is None or confidence > min_confidence:
+                name = gallery.names[best_match_index]
+
+        return name, confidence, distance
+
+    def _match_locked(self, gallery, encoder, face_encoding):
+        """(index, distance) of the closest of the locked identity's encodings, or (None, None)"""
+        if self._locked_encodings is None or self._locked_encodings[:2] != (gallery, self.locked_face_name):
+            indices = [i for i, name in enumerate(gallery.names) if name == self.locked_face_name]
+            # Gallery stores read only the rows asked for
+            encodings = gallery.rows(indices) if hasattr(gallery, "rows") else gallery.encodings[indices]
+            self._locked_encodings = (gallery, self.locked_face_name, indices, encodings)
+        _, _, indices, encodings = self._locked_encodings
+        if not indices:
+            return None, None
+        distances = encoder.distance(encodings, face_encoding)
+        best = int(np.argmin(distances))
+        return indices[best], float(distances[best])
+
+    @property
+    def searching_target(self):
+        """True while the locked target is lost and searched for"""
+        return self.target_lost_since is not None
+
+    def recognize_faces(self, frame, encoder=None, native=None):
+        """
+        Detect, track and identify the faces in a BGR frame. `encoder` overrides
+        self.encoder, for workers that each own an instance of the same encoder.
+        `native` is the same frame at the camera's own size, if it is larger:
+        tiled detection looks for faces on it, and the boxes are given in the
+        frame's pixels all the same.
+        """
+        if not self.ready.is_set():
+            return ([], [], [], [])
+        if self._pending_switch is not None:
+            self._apply_switch()
+        encoder = encoder or self.encoder
+        if self._identities_stale:
+            # Cached identities were matched against the old gallery
+            self._identities_stale = False
+            if self.tracker is not None:
+                self.tracker.forget_identities()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+        # While enrolling, every frame is a chance for another sample
+        if self.enrollment is None:
+            self.frames_since_detection += 1
+            # A distant person looked for with the people detector changes too few pixels for the motion gate, and
+            # a lost target is looked for on every frame
+            searching = self.searching_people or self.search_schedule
+            if (self.frames_since_detection < (1 if self.search_schedule else self.detection_interval)
+                    or self.motion_gate is not None and not searching and not self.motion_gate.needs_update(frame)):
+                return self._reuse_results(frame)
+        if encoder.shares_models and not self.model_lock.acquire(blocking=False):
+            # The gallery watcher is encoding a photo with the same models; keep the video moving
+            # on the last results rather than wait, and detect on the next frame instead
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+            return self._reuse_results(frame)
+        self.frames_since_detection = 0
+
+        small_frame = self.frame_pool.resize(frame, self._detection_size(frame))
+        # dlib only accepts contiguous images, which a reversed-channel view is not
+        rgb_small_frame = self.frame_pool.convert(small_frame, cv2.COLOR_BGR2RGB, 3)
+        try:
+            results = self._recognize(frame, rgb_small_frame, encoder, native)
+        finally:
+            if encoder.shares_models:
+                self.model_lock.release()
+            self.frame_pool.give_back(rgb_small_frame)
+            self.frame_pool.give_back(small_frame)
+        if self.enrollment is not None and self.enrollment.done:
+            # Only once the models are released: adding the identity waits for the gallery watcher, which may be
+            # waiting for the models itself
+            self.finish_enrollment()
+        return results
+
+    def _reuse_results(self, frame):
+        """The last results for a frame that skips detection; a lost target is still followed by appearance"""
+        self.last_results_fresh = False
+        if self.appearance_target is not None:
+            small_frame = self.frame_pool.resize(frame, self._detection_size(frame))
+            hsv = self.frame_pool.convert(small_frame, cv2.COLOR_BGR2HSV, 3)
+            self.appearance_target = self.appearance.search(hsv)
+            self.frame_pool.give_back(hsv)
+            self.frame_pool.give_back(small_frame)
+            # A new position of the target is as good as new results for the follower
+            self.last_results_fresh = self.appearance_target is not None
+        return self.last_results
+
+    def _detection_size(self, frame):
+        height, width = frame.shape[:2]
+        return round(width * self.detection_scale), round(height * self.detection_scale)
+
+    def _recognize(self, frame, rgb_small_frame, encoder, native=None):
+        start = time.perf_counter()
+        face_locations = self._locate(encoder, rgb_small_frame, native)
+        # Faces of people found by the people detector: {index: (upscaled head crop, face location in it)}, or None
+        # for a face box that is only inferred from the person box
+        long_range = {}
+        self.person_boxes = []
+        self.searching_people = self.person_detector is not None and self._locked_face_missing(face_locations)
+        if self.searching_people:
+            face_locations = list(face_locations)
+            long_range = self.find_people(frame, encoder, face_locations)
+        detected = time.perf_counter()
+
+        # Faces the tracker already knows keep their cached identity
+        tracks = self.tracker.update(face_locations) if self.tracker is not None else [None] * len(face_locations)
+        pending = [i for i, track in enumerate(tracks) if track is None or self.tracker.needs_verification(track)]
+        enrolling = self.enrollment_index(tracks)
+        if enrolling is not None and enrolling not in pending:
+            # Every good view of the face being enrolled is a sample
+            pending.append(enrolling)
+        # Faces found by the people detector are too small to encode on the detection frame, so they are encoded from
+        # the head crop they were found in
+        far = [i for i in pending if long_range.get(i) is not None]
+        pending = [i for i in pending if i not in long_range]
+        if self.quality_gate is not None and pending:
+            pending_locations = [face_locations[i] for i in pending]
+            pending = [pending[i] for i in self.quality_gate.select(encoder, rgb_small_frame, pending_locations)]
+        face_encodings = encoder.encode(rgb_small_frame, [face_locations[i] for i in pending])
+        face_encodings = dict(zip(pending, face_encodings))
+        for i in far:
+            crop, location = long_range[i]
+            face_encodings[i] = encoder.encode(crop, [location])[0]
+
+        face_names = []
+        face_confidences = []
+        face_distances = []
+
+        for i, track in enumerate(tracks):
+            if i in face_encodings:
+                name, confidence, distance = self.match_face(face_encodings[i], encoder)
+                if track is not None:
+                    self.tracker.store(track, name, confidence, face_encodings[i])
+            elif track is not None and track.identified:
+                name, confidence, distance = track.name, track.confidence, 0.0
+            else:
+                # Too poor to encode, so it stays unknown until a better view comes along
+                name, confidence, distance = "Unknown", 0.0, 0.0
+            face_names.append(name)
+            face_confidences.append(confidence)
+            face_distances.append(distance)
+
+        if enrolling is not None and enrolling in face_encodings:
+            self.enrollment.add(face_encodings[enrolling], frame, self.to_frame(face_locations[enrolling]))
+
+        if self.tracker is not None:
+            face_names = self.pin_locked_track(tracks, face_names)
+            if self.appearance is not None and self.locked_face_name is not None:
+                face_names = self.follow_appearance(rgb_small_frame, face_locations, tracks, face_names)
+
+        self.stage_times = {"detect": detected - start, "encode": time.perf_counter() - detected}
+        self.last_tracks = tracks
+        self.last_results = (face_locations, face_names, face_confidences, face_distances)
+        self.last_results_fresh = True
+        if self.use_target_search:
+            self._update_target_search()
+        return self.last_results
+
+    def _update_target_search(self):
+        """
+        Start searching for the locked target when it is lost, and go back to
+        the usual schedule once it is found and large enough to be detected on it.
+        """
+        target = None
+        if self.locked_face_name is not None and self.enrollment is None:
+            target = self.locked_target()
+            if target is None and not self.searching_target:
+                self.target_lost_since = time.time()
+                print(f"{self.locked_face_name} out of sight, searching")
+        if target is not None and self.searching_target:
+            seconds = time.time() - self.target_lost_since
+            self.target_lost_since = None
+            self.reacquire_times.append(seconds)
+            if self.tracker is not None:
+                # Faces seen meanwhile were only matched against the target
+                self.tracker.forget_identities()
+            print(f"Found {self.locked_face_name} after {seconds:.1f} s")
+        search_schedule = self.searching_target
+        if target is not None and self.search_schedule:
+            top, right, bottom, left = target
+            # Found by the torso alone, whose box keeps the size the face had, or on the larger frame but too small to
+            # be detected on the usual one until the drone closes in
+            search_schedule = (self.appearance_target is not None or
+                               (right - left) * self._requested_scale / self.detection_scale < self.min_detectable_face)
+        if search_schedule != self.search_schedule:
+            self.search_schedule = search_schedule
+            self._rescale()
+
+    def _locate(self, encoder, rgb_small_frame, native=None):
+        """
+        The faces on the detection frame, except while the locked person is
+        followed with the people detector and too far away for the face
+        detector to find: other faces are not looked for then either. Tiled
+        detection looks on the native frame when there is one.
+        """
+        locked = self.tracker.get(self.locked_track_id) if self.searching_people else None
+        if locked is not None:
+            top, right, bottom, left = locked.predicted_location
+            if right - left < self.min_detectable_face:
+                return []
+        if self.tiled_detector is None:
+            return encoder.locate(rgb_small_frame)
+        if native is None or native.shape[:2] == rgb_small_frame.shape[:2]:
+            return self.tiled_detector.locate(rgb_small_frame, encoder.name)
+
+        rgb_native = self.frame_pool.convert(native, cv2.COLOR_BGR2RGB, 3)
+        try:
+            face_locations = self.tiled_detector.locate(rgb_native, encoder.name)
+        finally:
+            self.frame_pool.give_back(rgb_native)
+        # Back to the detection frame, which need not have the native frame's aspect ratio (960x720 shown at 720x480)
+        height, width = rgb_small_frame.shape[:2]
+        y_factor, x_factor = height / native.shape[0], width / native.shape[1]
+        return [(round(top * y_factor), round(right * x_factor), round(bottom * y_factor), round(left * x_factor))
+                for top, right, bottom, left in face_locations]
+
+    def _locked_face_missing(self, face_locations):
+        """True if a face is locked and none of face_locations continues its track"""
+        if self.locked_face_name is None or self.enrollment is not None:
+            return False
+        locked = self.tracker.get(self.locked_track_id)
+        if locked is None or len(face_locations) == 0:
+            return True
+        return iou_matrix([locked.predicted_location], face_locations).max() < self.tracker.iou_threshold
+
+    def find_people(self, frame, encoder, face_locations):
+        """
+        Look for the locked person with the people detector, near where they
+        were last seen. Appends a face box (detection-scale pixels) for each
+        person found to face_locations: the face found in their upscaled head
+        crop, or the box inferred from the person box while the locked track
+        is still on them or the face is too small or turned away. Returns
+        {index: (head crop, face location in it) or None} of the boxes added.
+        """
+        locked = self.tracker.get(self.locked_track_id)
+        near = locked.predicted_location if locked is not None else self.appearance_target
+        near = self.to_frame(near) if near is not None else None
+        self.person_boxes = self.person_detector.detect(frame, near)
+
+        long_range = {}
+        for person in self.person_boxes:
+            location = scale_box(face_box(person), self.detection_scale)
+            if len(face_locations) and iou_matrix([location], face_locations).max() > 0:
+                # Somebody whose face was found anyway
+                continue
+            found = None
+            # The face only needs finding when there is no identity to carry over, or it is due for re-verification
+            if not (locked is not None and self._continues(locked, location) and locked.identified
+                    and locked.frames_since_verified < self.tracker.reverify_every):
+                found = self._face_in_head(frame, encoder, person)
+            if found is not None:
+                crop, crop_location, location = found
+                found = (crop, crop_location)
+            long_range[len(face_locations)] = found
+            face_locations.append(location)
+        return long_range
+
+    @staticmethod
+    def _continues(track, location):
+        """True if a face box is centred within half a face of where the track was predicted"""
+        top, right, bottom, left = track.predicted_location
+        other_top, other_right, other_bottom, other_left = location
+        return (abs(top + bottom - other_top - other_bottom) <= right - left
+                and abs(right + left - other_right - other_left) <= right - left)
+
+    def _face_in_head(self, frame, encoder, person):
+        """(RGB head crop, face location in it, face location in detection-scale pixels), or None"""
+        head = self.person_detector.head_crop(frame, person)
+        if head is None:
+            return None
+        crop, factor, (y, x) = head
+        rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        locations = encoder.locate(rgb_crop)
+        if len(locations) == 0:
+            return None
+        # The largest face in the crop is the person's own
+        crop_location = max(locations, key=lambda l: (l[1] - l[3]) * (l[2] - l[0]))
+        top, right, bottom, left = scale_box(crop_location, 1 / factor)
+        location = scale_box((top + y, right + x, bottom + y, left + x), self.detection_scale)
+        return rgb_crop, crop_location, location
+
+    def pin_locked_track(self, tracks, face_names):
+        """Keep the locked name on one track, even while its face is briefly unrecognisable"""
+        if self.locked_face_name is None:
+            return face_names
+
+        if self.tracker.get(self.locked_track_id) is None:
+            candidates = [t for t, name in zip(tracks, face_names) if name == self.locked_face_name]
+            self.locked_track_id = max(candidates, key=lambda t: t.confidence).id if candidates else None
+
+        pinned_names = []
+        for track, name in zip(tracks, face_names):
+            if track.id == self.locked_track_id:
+                if name == "Unknown":
+                    name = self.locked_face_name
+                elif name != self.locked_face_name:
+                    # Re-verification says this is somebody else
+                    self.locked_track_id = None
+            pinned_names.append(name)
+        return pinned_names
+
+    def follow_appearance(self, rgb_small_frame, face_locations, tracks, face_names):
+        """
+        Learn the locked person's torso while their face is recognised; once it
+        is not, pin an unrecognised face with a matching torso, or follow the
+        torso on its own.
+        """
+        appearance = self.appearance
+        hsv = self.frame_pool.convert(rgb_small_frame, cv2.COLOR_RGB2HSV, 3)
+        try:
+            index = next((i for i, track in enumerate(tracks) if track.id == self.locked_track_id), None)
+            if index is None and appearance.ready:
+                # Faces the recognition could not put a name to, closest to the model first
+                candidates = [(appearance.match(hsv, location), i)
+                              for i, (location, name) in enumerate(zip(face_locations, face_names)) if name == "Unknown"]
+                candidates = sorted((d, i) for d, i in candidates if d is not None and d < appearance.reacquire_distance)
+                if candidates:
+                    index = candidates[0][1]
+                    self.locked_track_id = tracks[index].id
+                    face_names = list(face_names)
+                    face_names[index] = self.locked_face_name
+                    appearance.reacquired += 1
+                    print(f"Re-acquired {self.locked_face_name} by appearance "
+                          f"(torso distance {candidates[0][0]:.2f})")
+
+            if index is None:
+                self.appearance_target = appearance.search(hsv)
+            else:
+                self.appearance_target = None
+                if tracks[index].name == self.locked_face_name:
+                    # Only views the face recognition vouches for go into the model
+                    appearance.learn(hsv, face_locations[index])
+        finally:
+            self.frame_pool.give_back(hsv)
+        return face_names
+
+    def select_face(self, x, y):
+        """Select the tracked face under (x, y), in detection-scale pixels; returns its name or None"""
+        self.selected_track_id = None
+        for (top, right, bottom, left), name, track in zip(self.last_results[0], self.last_results[1], self.last_tracks):
+            if track is not None and left <= x <= right and top <= y <= bottom:
+                self.selected_track_id = track.id
+                return name
+        return None
+
+    def start_enrollment(self, name, persist=True, samples_needed=5):
+        """Start collecting samples of the selected face as the new identity `name`"""
+        if self.tracker is None:
+            raise ValueError("Enrollment needs the face tracker")
+        if self.selected_track_id is None or self.tracker.get(self.selected_track_id) is None:
+            raise ValueError("Select a face in the video first")
+        if not name or os.path.basename(name) != name or name in ("Unknown", "Disable", "Enable All"):
+            raise ValueError(f"'{name}' cannot be used as a name")
+        if name in self.known_face_names:
+            raise ValueError(f"{name} is already in the gallery")
+        self.enrollment = Enrollment(name, self.selected_track_id, samples_needed, persist=persist)
+        print(f"Enrolling {name}...")
+
+    def enrollment_index(self, tracks):
+        """Index in tracks of the face being enrolled, or None; gives up on lost or stalled enrollments"""
+        if self.enrollment is None:
+            return None
+        index = next((i for i, track in enumerate(tracks)
+                      if track is not None and track.id == self.enrollment.track_id), None)
+        if self.enrollment.expired:
+            reason = "timed out"
+        elif index is None and self.tracker.get(self.enrollment.track_id) is None:
+            reason = "lost the face"
+        else:
+            # A track that missed this frame is still alive, so just wait for it
+            return index
+
+        collected, needed = self.enrollment.progress
+        print(f"Enrollment of {self.enrollment.name} failed: {reason} after {collected} of {needed} samples")
+        self.enrollment = None
+        return None
+
+    def finish_enrollment(self):
+        enrollment = self.enrollment
+        self.enrollment = None
+        self.selected_track_id = None
+        photo = enrollment.photo if enrollment.persist else None
+        # A gallery store is appended to directly; a faces folder goes through its watcher
+        source = self.gallery_watcher if self.gallery_watcher is not None else self.gallery
+        owner = self.parent if self.parent is not None else self
+        owner.swap_gallery(source.add_identity(enrollment.name, enrollment.encoding(self.encoder), photo))
+
+        # Follow the new identity straight away, pinned to the track it was enrolled from
+        self.locked_face_name = enrollment.name
+        self.locked_track_id = enrollment.track_id
+        self._reset_appearance()
+        print(f"Enrolled {enrollment.name} from {len(enrollment.encodings)} samples; locked face: {enrollment.name}")
+
+    def locked_target(self):
+        """Location (in detection-scale pixels) of the locked face in the last results, or None"""
+        face_locations, face_names = self.last_results[:2]
+        if self.tracker is not None:
+            for location, track in zip(face_locations, self.last_tracks):
+                if track.id == self.locked_track_id:
+                    return location
+            # Not in view, or turned away and followed by appearance
+            return self.appearance_target
+
+        for location, name in zip(face_locations, face_names):
+            if name == self.locked_face_name:
+                return location
+        return None
+
+    def lock_face(self, name):
+        self.locked_track_id = None
+        self._reset_appearance()
+        if self.search_schedule:
+            self.target_lost_since = None
+            self.search_schedule = False
+            self._rescale()
+        if name in self.known_face_names:
+            self.locked_face_name = name
+            print(f"Locked face: {self.locked_face_name}")
+        else:
+            self.locked_face_name = None
+            print("Face recognition is enabled")
+
+    def _reset_appearance(self):
+        self.appearance_target = None
+        if self.use_appearance:
+            self.appearance = AppearanceModel()
+
+    def stats(self):
+        """Counters of the work the pipeline avoided, for the on-screen stats"""
+        stats = {}
+        if self.motion_gate is not None:
+            stats["skip_ratio"] = self.motion_gate.skip_ratio
+        if self.quality_gate is not None:
+            stats["encodes_saved_per_second"] = self.quality_gate.encodes_saved_per_second
+        if self.tracker is not None:
+            stats["cache_hit_ratio"] = self.tracker.hit_ratio
+        if self.appearance is not None and self.appearance.ready:
+            stats["appearance_frames"] = self.appearance.followed
+        if self.person_detector is not None and self.person_detector.searches:
+            stats["person_frames"] = self.person_detector.found
+        if self.reacquire_times:
+            stats["reacquire_seconds"] = float(np.mean(self.reacquire_times))
+        return stats
+
+    def display_stats(self, frame):
+        lines = []
+        stats = self.stats()
+        if "skip_ratio" in stats:
+            lines.append(f"Static frames skipped: {stats['skip_ratio']:.0%}")
+        if "encodes_saved_per_second" in stats:
+            lines.append(f"Encodes saved: {stats['encodes_saved_per_second']:.1f}/s")
+        if "cache_hit_ratio" in stats:
+            lines.append(f"Identities from cache: {stats['cache_hit_ratio']:.0%}")
+        if "appearance_frames" in stats:
+            lines.append(f"Followed by appearance: {stats['appearance_frames']} frames")
+        if "person_frames" in stats:
+            lines.append(f"Found by the people detector: {stats['person_frames']} frames")
+        if "reacquire_seconds" in stats:
+            lines.append(f"Target found again in: {stats['reacquire_seconds']:.1f} s on average")
+        if self.searching_target:
+            lines.append(f"Searching for {self.locked_face_name}: {time.time() - self.target_lost_since:.0f} s")
+
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (10, 20 + 20 * i), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 255, 0), 1)
+        return frame
+
+    def display_results(self, frame, face_locations, face_names, face_confidences, face_distances):
+        for (top, right, bottom, left), name, confidence, distance in zip(face_locations, face_names, face_confidences, face_distances):
+            if self.locked_face_name is None or name == self.locked_face_name:
+                top, right, bottom, left = self.to_frame((top, right, bottom, left))
+
+                face_width_pixels = right - left
+                distance = self.calculate_distance(face_width_pixels)
+
+                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+                label = f"{name} ({confidence:.2f}%) Distance: {distance:.2f} cm"
+                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 0, 255), cv2.FILLED)
+                font = cv2.FONT_HERSHEY_DUPLEX
+                fontScale = 0.5
+                cv2.putText(frame, label, (left + 6, bottom - 6), font, fontScale, (255, 255, 255), 1)
+
+        for top, right, bottom, left in self.person_boxes:
+            cv2.rectangle(frame, (left, top), (right, bottom), (255, 255, 255), 1)
+
+        if self.appearance_target is not None:
+            # Where the locked face is thought to be, from the torso below it
+            top, right, bottom, left = self.to_frame(self.appearance_target)
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 165, 255), 2)
+            cv2.putText(frame, f"{self.locked_face_name} (appearance)", (left, top - 8), cv2.FONT_HERSHEY_DUPLEX, 0.5,
+                        (0, 165, 255), 1)
+
+        # Highlight the face picked for enrollment
+        enrolling_id = self.enrollment.track_id if self.enrollment is not None else None
+        for location, track in zip(face_locations, self.last_tracks):
+            if track is None or track.id not in (self.selected_track_id, enrolling_id):
+                continue
+            top, right, bottom, left = self.to_frame(location)
+            if track.id == enrolling_id:
+                label = "Enrolling {} {}/{}".format(self.enrollment.name, *self.enrollment.progress)
+            else:
+                label = "Selected"
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 255), 2)
+            cv2.putText(frame, label, (left, top - 8), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 255, 255), 1)
+
+        return frame
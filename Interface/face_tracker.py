@@ -0,0 +1,246 @@
+"""
+SORT-style multi-face tracker with a per-track identity cache.
+
+Every track runs a constant-velocity Kalman filter over its box (centre, area
+and aspect ratio). Each frame the tracks are predicted forward, the IoU between
+the predicted boxes and the new detections is computed as one matrix, and the
+Hungarian algorithm picks the assignment. This keeps track IDs stable when
+several people are in view, so the locked target cannot swap between frames.
+
+Each track also keeps the identity, confidence and encoding it was last
+verified with, so a face that stays in view is encoded once and then only
+re-verified every few frames or when its box changes substantially. Unknown
+faces are cached the same way, so strangers are not matched against the
+gallery on every frame.
+"""
+
+import itertools
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU between every (top, right, bottom, left) box of boxes_a and boxes_b"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def boxes_to_z(face_locations):
+    """(top, right, bottom, left) boxes -> measurements [centre x, centre y, area, aspect ratio]"""
+    top, right, bottom, left = np.asarray(face_locations, dtype=float).reshape(-1, 4).T
+    w, h = right - left, bottom - top
+    return np.stack([left + w / 2, top + h / 2, w * h, w / np.maximum(h, 1e-6)], axis=1)
+
+
+def x_to_boxes(states):
+    """Kalman states -> (top, right, bottom, left) boxes"""
+    states = np.asarray(states, dtype=float).reshape(-1, 7)
+    w = np.sqrt(np.clip(states[:, 2] * states[:, 3], 0.0, None))
+    h = np.where(w > 0, states[:, 2] / np.maximum(w, 1e-6), 0.0)
+    boxes = np.stack([states[:, 1] - h / 2, states[:, 0] + w / 2, states[:, 1] + h / 2, states[:, 0] - w / 2], axis=1)
+    return np.rint(boxes).astype(int)
+
+
+def x_to_box(state):
+    return tuple(int(v) for v in x_to_boxes(state)[0])
+
+
+def scale_box(box, factor):
+    """A (top, right, bottom, left) box in pixels of an image `factor` times the size"""
+    return tuple(int(round(v * factor)) for v in box)
+
+
+class KalmanBox:
+    """
+    Constant-velocity Kalman filter over [cx, cy, area, aspect, vx, vy, v_area].
+
+    Each track owns one filter, but the tracker predicts and updates all of them
+    in one batched step, which keeps dozens of tracks cheap.
+    """
+
+    F = np.eye(7)
+    F[0, 4] = F[1, 5] = F[2, 6] = 1.0
+    R = np.diag([1.0, 1.0, 10.0, 0.01])
+    Q = np.diag([1.0, 1.0, 1.0, 1e-4, 0.01, 0.01, 1e-4])
+
+    def __init__(self, location):
+        self.x = np.zeros(7)
+        self.x[:4] = boxes_to_z([location])[0]
+        # Velocities are unknown at first, so start them uncertain
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+
+    @classmethod
+    def predict_all(cls, filters):
+        """Advance every filter by one frame and return the predicted states"""
+        X = np.array([f.x for f in filters])
+        P = np.array([f.P for f in filters])
+        # Never let the area go negative
+        X[X[:, 2] + X[:, 6] <= 0, 6] = 0.0
+        X = X @ cls.F.T
+        P = cls.F @ P @ cls.F.T + cls.Q
+        for f, x, p in zip(filters, X, P):
+            f.x, f.P = x, p
+        return X
+
+    @classmethod
+    def update_all(cls, filters, face_locations):
+        """Correct every filter with its matched detection"""
+        X = np.array([f.x for f in filters])
+        P = np.array([f.P for f in filters])
+        y = boxes_to_z(face_locations) - X[:, :4]
+        S = P[:, :4, :4] + cls.R
+        K = P[:, :, :4] @ np.linalg.inv(S)
+        X = X + (K @ y[:, :, None])[:, :, 0]
+        P = P - K @ P[:, :4, :]
+        for f, x, p in zip(filters, X, P):
+            f.x, f.P = x, p
+
+    def rescale(self, factor):
+        """Express the state in pixels of an image `factor` times the size"""
+        # Positions and their velocities scale linearly, the area and its velocity quadratically
+        d = np.array([factor, factor, factor ** 2, 1.0, factor, factor, factor ** 2])
+        self.x = self.x * d
+        self.P = self.P * np.outer(d, d)
+
+    def predicted_state(self, steps):
+        """State `steps` frames ahead, without changing the filter"""
+        return np.linalg.matrix_power(self.F, max(0, int(round(steps)))) @ self.x
+
+
+class Track:
+    def __init__(self, track_id, location):
+        self.id = track_id
+        self.location = location
+        self.kalman = KalmanBox(location)
+        self.predicted_location = location
+        self.misses = 0
+        self.hits = 1
+        self.age = 0
+
+        # Identity cache, filled in by FaceTracker.store
+        self.name = None
+        self.confidence = 0.0
+        self.encoding = None
+        self.verified_location = None
+        self.frames_since_verified = 0
+
+    @property
+    def identified(self):
+        return self.name is not None
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_missing=5, reverify_every=30, reverify_iou=0.5):
+        # Smallest overlap for a detection to continue a track
+        self.iou_threshold = iou_threshold
+        # Frames a track survives without a matching detection
+        self.max_missing = max_missing
+        # Re-verify a cached identity after this many frames...
+        self.reverify_every = reverify_every
+        # ...or once the box overlaps the verified box less than this
+        self.reverify_iou = reverify_iou
+
+        self.tracks = []
+        self._ids = itertools.count(1)
+        # Identity lookups and how many of them the cache answered
+        self.lookups = 0
+        self.hits = 0
+
+    def _associate(self, face_locations):
+        """Pair detections with the predicted tracks by Hungarian assignment on IoU"""
+        pairs = {}
+        if self.tracks and face_locations:
+            # scipy.optimize takes most of a second to import, so it is only imported once needed
+            from scipy.optimize import linear_sum_assignment
+            ious = iou_matrix([t.predicted_location for t in self.tracks], face_locations)
+            track_rows, detection_cols = linear_sum_assignment(-ious)
+            for t, d in zip(track_rows, detection_cols):
+                if ious[t, d] >= self.iou_threshold:
+                    pairs[d] = t
+        return pairs
+
+    def update(self, face_locations):
+        """Advance the tracks by one frame and return the track of every detection"""
+        if self.tracks:
+            predicted = x_to_boxes(KalmanBox.predict_all([t.kalman for t in self.tracks]))
+            for track, box in zip(self.tracks, predicted):
+                track.predicted_location = tuple(box)
+
+        pairs = self._associate(face_locations)
+
+        matched = set(pairs.values())
+        for i, track in enumerate(self.tracks):
+            track.age += 1
+            track.frames_since_verified += 1
+            if i not in matched:
+                track.misses += 1
+
+        if pairs:
+            KalmanBox.update_all([self.tracks[t].kalman for t in pairs.values()],
+                                 [face_locations[d] for d in pairs])
+
+        tracks = []
+        for d, location in enumerate(face_locations):
+            if d in pairs:
+                track = self.tracks[pairs[d]]
+                track.location = location
+                track.misses = 0
+                track.hits += 1
+            else:
+                track = Track(next(self._ids), location)
+                self.tracks.append(track)
+            tracks.append(track)
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_missing]
+        return tracks
+
+    def needs_verification(self, track):
+        """True if the track's identity has to be (re)computed from a new encoding"""
+        self.lookups += 1
+        if not track.identified or track.frames_since_verified >= self.reverify_every:
+            return True
+        overlap = iou_matrix([track.verified_location], [track.location])[0, 0]
+        if overlap < self.reverify_iou:
+            return True
+        self.hits += 1
+        return False
+
+    @property
+    def hit_ratio(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @staticmethod
+    def store(track, name, confidence, encoding):
+        track.name = name
+        track.confidence = confidence
+        track.encoding = encoding
+        track.verified_location = track.location
+        track.frames_since_verified = 0
+
+    def get(self, track_id):
+        for track in self.tracks:
+            if track.id == track_id:
+                return track
+        return None
+
+    def rescale(self, factor):
+        """Carry the tracks over to detection on frames `factor` times the size, keeping their ids"""
+        for track in self.tracks:
+            track.kalman.rescale(factor)
+            track.location = scale_box(track.location, factor)
+            track.predicted_location = scale_box(track.predicted_location, factor)
+            if track.verified_location is not None:
+                track.verified_location = scale_box(track.verified_location, factor)
+
+    def forget_identities(self):
+        """Drop every cached identity, e.g. after the gallery changed"""
+        for track in self.tracks:
+            track.name = None
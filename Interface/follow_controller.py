@@ -0,0 +1,224 @@
+"""
+Latency-compensated follow controller.
+
+By the time a face box comes out of recognition it describes where the target
+was a few hundred milliseconds ago: the Tello's H.264 feed arrives late and
+detection adds more. Steering on that stale box makes the drone overshoot and
+oscillate. The follower instead predicts where the target is *now*, from
+
+  - the target's own image motion, estimated from its recent observations, and
+  - the ego-motion caused by the RC commands already sent since the frame was
+    captured (the drone's response is modelled as a first-order lag),
+
+and drives yaw, up/down and forward/back from that prediction.
+
+Once the target is lost the follower hovers for search_delay seconds, in case
+it is only hidden for a moment, and then turns to look for it: first towards
+the side it was last seen on, then back past where it was lost to the other
+side, and from there on round in full circles, until search_timeout.
+"""
+
+import time
+from collections import deque
+import numpy as np
+
+
+def arrival_time(arrival):
+    """The time.time() of a frame source's perf_counter() arrival stamp, the clock the follower works in"""
+    return time.time() - (time.perf_counter() - arrival)
+
+
+class PredictiveFollower:
+    def __init__(self, frame_size=(720, 480), desired_face_width=64, video_latency=0.2, predictive=True,
+                 focal_length=800, known_face_width=16, yaw_gain=0.25, up_down_gain=0.3, forward_gain=1.0,
+                 deadband=15, max_speed=50, response_time=0.3, resend_interval=1.0, search=True, search_delay=0.5,
+                 search_yaw_speed=30, search_sweeps=(60, -60), search_timeout=30.0):
+        self.frame_center = (frame_size[0] / 2, frame_size[1] / 2)
+        # Face width in pixels at the distance we want to keep (64 px = 2 m with the defaults)
+        self.desired_face_width = desired_face_width
+        # Camera-to-GCS delay of the video feed up to the frame being decoded, which the GCS has no clock for. Everything
+        # after that, from the frame's arrival to the decision, is measured on every update()
+        self.video_latency = video_latency
+        self.predictive = predictive
+        self.focal_length = focal_length
+        self.known_face_width = known_face_width
+
+        self.yaw_gain = yaw_gain
+        self.up_down_gain = up_down_gain
+        self.forward_gain = forward_gain
+        # Pixel errors smaller than this are left alone
+        self.deadband = deadband
+        self.max_speed = max_speed
+        # Time constant of the drone's velocity response to an RC command, in seconds
+        self.response_time = response_time
+        # Resend an unchanged command this often, so the drone never acts on a stale one for long
+        self.resend_interval = resend_interval
+        # Yaw search for a lost target: the headings (degrees from where it was lost, positive towards the side it
+        # was last seen on) turned to in turn at search_yaw_speed deg/s, before turning on that way
+        self.search = search
+        self.search_delay = search_delay
+        self.search_yaw_speed = search_yaw_speed
+        self.search_sweeps = search_sweeps
+        self.search_timeout = search_timeout
+
+        # (send time, (lr, fb, ud, yaw)) of recent commands, for the ego-motion model,
+        # and the command that was in force before the oldest of them
+        self.commands = deque()
+        self.settled_command = (0, 0, 0, 0)
+        self.last_sent = (0, 0, 0, 0)
+        self.last_sent_time = 0.0
+        self.commands_sent = 0
+
+        self.last_observation = None
+        self.target_velocity = np.zeros(2)
+
+        # Side the target was last seen on (1 right, -1 left, None if not since stop()), when it was lost, and the
+        # degrees turned since and search sweep under way
+        self.last_seen_side = None
+        self.lost_since = None
+        self.search_heading = 0.0
+        self._search_leg = 0
+        self._search_time = 0.0
+
+    def distance(self, face_width):
+        return self.known_face_width * self.focal_length / max(face_width, 1.0)
+
+    def record_command(self, rc, now):
+        self.commands.append((now, tuple(rc)))
+        # Older commands have fully settled and only the one in force at the window start matters
+        while len(self.commands) > 1 and now - self.commands[1][0] > 5 * self.response_time + 1.0:
+            self.settled_command = self.commands.popleft()[1]
+
+    def _command_at(self, t):
+        rc = self.settled_command
+        for sent, command in self.commands:
+            if sent > t:
+                break
+            rc = command
+        return np.array(rc, dtype=float)
+
+    def ego_motion(self, start, end, face_width, step=0.02):
+        """Image shift (dx, dy) and scale of a target caused by the drone's own motion between start and end"""
+        if end <= start or not self.commands:
+            return 0.0, 0.0, 1.0
+
+        # Start from the command in force well before `start`, which the drone has settled to
+        t = start - 5 * self.response_time
+        velocity = self._command_at(t)
+        distance = self.distance(face_width)
+        dx = dy = 0.0
+        scale = 1.0
+        while t < end:
+            dt = min(step, end - t)
+            velocity += (self._command_at(t) - velocity) * (1 - np.exp(-dt / self.response_time))
+            if t + dt > start:
+                lr, fb, ud, yaw = velocity
+                # RC units are roughly cm/s for translation and deg/s for yaw
+                dx -= self.focal_length * (np.radians(yaw * dt) + lr * dt / distance)
+                dy += self.focal_length * ud * dt / distance
+                new_distance = max(distance - fb * dt, 1.0)
+                scale *= distance / new_distance
+                distance = new_distance
+            t += dt
+        return dx, dy, scale
+
+    def predict(self, box, capture_time, now):
+        """Predicted (center x, center y, width) of the target at `now`, from a box captured at `capture_time`"""
+        top, right, bottom, left = box
+        x, y, width = (left + right) / 2, (top + bottom) / 2, right - left
+        if not self.predictive:
+            return x, y, width
+
+        dx, dy, scale = self.ego_motion(capture_time, now, width)
+        ox, oy = x - self.frame_center[0], y - self.frame_center[1]
+        x = self.frame_center[0] + ox * scale + dx
+        y = self.frame_center[1] + oy * scale + dy
+        x, y = np.array([x, y]) + self.target_velocity * (now - capture_time)
+        return x, y, width * scale
+
+    def _update_target_velocity(self, box, capture_time):
+        top, right, bottom, left = box
+        position = np.array([(left + right) / 2, (top + bottom) / 2])
+        if self.last_observation is not None:
+            last_time, last_position, last_width = self.last_observation
+            dt = capture_time - last_time
+            if dt <= 0:
+                # The same results again, nothing new about the target
+                return
+            if dt < 1.0:
+                # Whatever the drone's own motion does not explain is the target moving
+                dx, dy, scale = self.ego_motion(last_time, capture_time, last_width)
+                explained = self.frame_center + (last_position - self.frame_center) * scale + (dx, dy)
+                velocity = (position - explained) / dt
+                self.target_velocity = 0.6 * self.target_velocity + 0.4 * velocity
+            else:
+                self.target_velocity = np.zeros(2)
+        self.last_observation = (capture_time, position, right - left)
+
+    def update(self, box, frame_time, now=None):
+        """
+        Feed the latest target box (full frame pixels) taken from the frame that
+        arrived at `frame_time` (see arrival_time()), and return the RC command
+        to send or None if it is unchanged. The prediction covers video_latency
+        and the measured time since the frame arrived.
+        """
+        now = time.time() if now is None else now
+        capture_time = frame_time - self.video_latency
+        if self.predictive:
+            self._update_target_velocity(box, capture_time)
+
+        x, y, width = self.predict(box, capture_time, now)
+        error_x = x - self.frame_center[0]
+        error_y = y - self.frame_center[1]
+        error_width = self.desired_face_width - width
+
+        self.last_seen_side = 1 if error_x >= 0 else -1
+        self.lost_since = None
+
+        yaw = self.yaw_gain * error_x if abs(error_x) > self.deadband else 0
+        ud = -self.up_down_gain * error_y if abs(error_y) > self.deadband else 0
+        fb = self.forward_gain * error_width if abs(error_width) > self.deadband / 4 else 0
+        return self._send((0, fb, ud, yaw), now)
+
+    def lost(self, now=None):
+        """The target is out of sight: hover in place, then turn to search for it"""
+        now = time.time() if now is None else now
+        self.last_observation = None
+        self.target_velocity = np.zeros(2)
+        if self.lost_since is None:
+            self.lost_since = now
+            self.search_heading = 0.0
+            self._search_leg = 0
+        else:
+            # The yaw sent last has been in force since the last call
+            self.search_heading += self.last_sent[3] * (now - self._search_time)
+        self._search_time = now
+        return self._send((0, 0, 0, self._search_yaw(now)), now)
+
+    def _search_yaw(self, now):
+        elapsed = now - self.lost_since
+        if (not self.search or self.last_seen_side is None or elapsed < self.search_delay
+                or elapsed > self.search_timeout):
+            return 0
+        while self._search_leg < len(self.search_sweeps):
+            error = self.last_seen_side * self.search_sweeps[self._search_leg] - self.search_heading
+            if abs(error) > self.deadband * self.yaw_gain:
+                return np.sign(error) * self.search_yaw_speed
+            self._search_leg += 1
+        return self.last_seen_side * self.search_yaw_speed
+
+    def stop(self, now=None):
+        """Stop following: hover, and do not search until a target has been seen again"""
+        self.last_seen_side = None
+        return self.lost(now)
+
+    def _send(self, rc, now):
+        # Round to steps of 5 so tiny changes do not flood the command link
+        rc = tuple(int(5 * round(np.clip(v, -self.max_speed, self.max_speed) / 5)) for v in rc)
+        if rc == self.last_sent and now - self.last_sent_time < self.resend_interval:
+            return None
+        self.last_sent = rc
+        self.last_sent_time = now
+        self.commands_sent += 1
+        self.record_command(rc, now)
+        return rc
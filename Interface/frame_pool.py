@@ -0,0 +1,77 @@
+"""
+Reusable frame buffers for the per-frame loop.
+
+Every video tick used to allocate fresh arrays for the resize, the colour
+conversions, the detector's quarter-size input and the display image, several
+MB per frame at 30 fps. Stages now borrow a buffer of the shape they need from
+a FramePool, have OpenCV write into it with `dst=`, and give it back when the
+frame is done with it. After the first few frames every borrow is served from
+the free list, which the counters make visible:
+
+    pool = FramePool()
+    ...run some frames...
+    mark = pool.allocations
+    ...run more frames...
+    assert pool.allocations == mark and pool.outstanding == 0
+"""
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+import cv2
+import numpy as np
+
+
+class FramePool:
+    def __init__(self, max_free=4):
+        # Free buffers kept per (shape, dtype); more than that are left to the garbage collector
+        self.max_free = max_free
+        self._free = defaultdict(list)
+        self._lock = threading.Lock()
+        # Buffers created because none of the right shape was free
+        self.allocations = 0
+        self.borrows = 0
+        # Borrowed and not given back yet
+        self.outstanding = 0
+
+    def borrow(self, shape, dtype=np.uint8):
+        """An uninitialised buffer of the given shape; give it back once nothing refers to it"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            self.borrows += 1
+            self.outstanding += 1
+            free = self._free[key]
+            if free:
+                return free.pop()
+            self.allocations += 1
+        return np.empty(shape, dtype=dtype)
+
+    def give_back(self, buffer):
+        key = (buffer.shape, buffer.dtype.str)
+        with self._lock:
+            self.outstanding -= 1
+            free = self._free[key]
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+    @contextmanager
+    def buffer(self, shape, dtype=np.uint8):
+        buffer = self.borrow(shape, dtype)
+        try:
+            yield buffer
+        finally:
+            self.give_back(buffer)
+
+    def resize(self, frame, size, interpolation=cv2.INTER_LINEAR):
+        """cv2.resize into a borrowed buffer; `size` is (width, height) as for cv2"""
+        width, height = size
+        dst = self.borrow((height, width) + frame.shape[2:], frame.dtype)
+        return cv2.resize(frame, (width, height), dst=dst, interpolation=interpolation)
+
+    def convert(self, frame, code, channels):
+        """cv2.cvtColor into a borrowed buffer with `channels` channels (1 for grey)"""
+        shape = frame.shape[:2] + ((channels,) if channels > 1 else ())
+        return cv2.cvtColor(frame, code, dst=self.borrow(shape, frame.dtype))
+
+    def stats(self):
+        return {"allocations": self.allocations, "borrows": self.borrows, "outstanding": self.outstanding}
@@ -0,0 +1,232 @@
+"""
+Frame sources for the video pipeline.
+
+Each controller used to read its camera its own way: the Tello through
+DroneLink, a webcam with cv2.VideoCapture on the GUI thread, the simulator
+through its own frame() method. A source now gives VideoPipeline (see
+video_pipeline.py) frames through one interface:
+
+    source.start() / source.stop()
+    frame, arrival = source.read()  # newest frame and the perf_counter() time it arrived, or (None, None)
+    source.on_frame                 # called from any thread when there is something new to show
+    source.status                   # bring-up progress, shown with status_frame() until the first frame
+    source.ready                    # set once there is a frame
+    source.realtime                 # False: read() returns every frame in order, as fast as it is called
+    source.finished                 # True once a file has no more frames
+    source.host                     # address that takes SDK commands, for the sources that fly
+
+DroneLink (drone_link.py) is the Tello source and SimulatedTello (simulator.py)
+the simulated one; CaptureSource reads a webcam and FileSource a video file.
+open_source() builds the right one from a command line argument.
+"""
+
+import os
+import threading
+import time
+import cv2
+import numpy as np
+
+# The Tello's own video size
+TELLO_FRAME_SIZE = (960, 720)
+
+
+class FrameSource:
+    # A live camera moves on whether or not its frames are read; a file played with realtime=False waits for read()
+    realtime = True
+
+    def __init__(self, on_frame=None):
+        # Called whenever there is something new to show: a frame or a status change. Must be thread-safe,
+        # e.g. FrameSignal.set
+        self.on_frame = on_frame
+        self.status = "Starting..."
+        self.error = None
+        self.ready = threading.Event()
+        self.finished = False
+        self.host = None
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def read(self):
+        """(newest frame, perf_counter() time it arrived), or (None, None) before the first frame"""
+        raise NotImplementedError
+
+    def _set_status(self, status):
+        self.status = status
+        print(f"Video source: {status}")
+        self._notify()
+
+    def _notify(self):
+        if self.on_frame is not None:
+            self.on_frame()
+
+    def status_frame(self, size=(720, 480)):
+        """Placeholder frame showing the bring-up progress"""
+        frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        cv2.putText(frame, self.status, (20, size[1] // 2), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
+        return frame
+
+
+class CaptureSource(FrameSource):
+    """Reads a cv2.VideoCapture (a webcam) on a background thread, so the GUI thread never blocks in read()"""
+
+    def __init__(self, source=0, on_frame=None):
+        super().__init__(on_frame)
+        self.source = source
+        self.capture = None
+        # (frame, arrival) in one attribute, so a reader never pairs a frame with the next one's time
+        self._latest = (None, None)
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._set_status(f"Opening camera {self.source}...")
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+
+    def read(self):
+        return self._latest
+
+    def _read(self):
+        # Opening a camera can take a second, so it happens here rather than in start()
+        self.capture = cv2.VideoCapture(self.source)
+        try:
+            while not self._stopped:
+                ret, frame = self.capture.read()
+                if not ret:
+                    self.error = f"cannot read from video source {self.source!r}"
+                    self.finished = True
+                    self._set_status(self.error)
+                    break
+                self._latest = (frame, time.perf_counter())
+                self.ready.set()
+                self._notify()
+        finally:
+            self.capture.release()
+
+
+class FileSource(FrameSource):
+    """
+    Plays a video file. With realtime=True a background thread paces the frames
+    at the file's frame rate and the pipeline drops the ones it is too slow for,
+    like it would from a camera. With realtime=False nothing runs in the
+    background: every read() decodes the next frame, so a run sees every frame
+    in the same order however fast or slow it goes, for benchmarks and
+    repeatable test runs.
+    """
+
+    def __init__(self, path, realtime=True, loop=False, fps=None, on_frame=None):
+        super().__init__(on_frame)
+        self.path = path
+        self.realtime = realtime
+        # Start over at the end instead of finishing (realtime only)
+        self.loop = loop and realtime
+        # Playback rate; None for the file's own, or 30 if it does not say
+        self.fps = fps
+        self.capture = None
+        self.frames_read = 0
+        self._latest = (None, None)
+        self._stopped = False
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.path)
+        if not self.capture.isOpened():
+            self.error = f"cannot open video file {self.path!r}"
+            self.finished = True
+            self._set_status(self.error)
+            return self
+        if self.fps is None:
+            self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self._set_status(f"Playing {os.path.basename(self.path)}")
+        if self.realtime:
+            threading.Thread(target=self._play, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        if not self.realtime and self.capture is not None:
+            self.capture.release()
+
+    def read(self):
+        if self.realtime or self.finished or self._stopped:
+            return self._latest
+        frame = self._next()
+        self._latest = (frame, time.perf_counter()) if frame is not None else (None, None)
+        return self._latest
+
+    def _next(self):
+        ret, frame = self.capture.read()
+        if not ret and self.loop and self.frames_read:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        if not ret:
+            self.finished = True
+            self._set_status(f"End of {os.path.basename(self.path)} after {self.frames_read} frames")
+            return None
+        self.frames_read += 1
+        self.ready.set()
+        return frame
+
+    def _play(self):
+        period = 1.0 / self.fps
+        due = time.perf_counter()
+        try:
+            while not self._stopped:
+                frame = self._next()
+                if frame is None:
+                    break
+                self._latest = (frame, time.perf_counter())
+                self._notify()
+                due += period
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Decoding fell behind; carry on from now rather than bursting to catch up
+                    due = time.perf_counter()
+        finally:
+            self.capture.release()
+
+
+def open_source(spec="tello", frame_size=(720, 480), startup=None, realtime=True, loop=False, on_frame=None):
+    """
+    A frame source from a command line argument: "tello" for the drone, a
+    number for a webcam, "sim" or "sim:<face photo>" for a simulated drone on
+    127.0.0.2, or the path of a video file. Not started yet. The drone's
+    frames are converted to `frame_size` as they are decoded, and the
+    simulator renders at it; None keeps the camera's own size, which tiled
+    detection needs to find faces on every pixel there is.
+    """
+    if spec in (None, "", "tello"):
+        from djitellopy import Tello
+        from drone_link import DroneLink
+        return DroneLink(Tello(), startup, frame_size=frame_size, on_frame=on_frame)
+    if spec.isdigit():
+        return CaptureSource(int(spec), on_frame=on_frame)
+    if spec == "sim" or spec.startswith("sim:"):
+        from face_gallery import PHOTO_EXTENSIONS
+        from simulator import SimulatedTello, photo_face
+        photo = spec[4:]
+        if not photo:
+            # A faces folder holds other folders too, and a gallery store no photos at all
+            photos = []
+            if os.path.isdir("faces"):
+                photos = sorted(f for f in os.listdir("faces") if f.endswith(PHOTO_EXTENSIONS))
+            if not photos:
+                raise ValueError("no photo in faces/ for the simulated drone to show; give one as sim:<face photo>")
+            photo = os.path.join("faces", photos[0])
+        # Close enough for the quarter-size detection frame, and slow enough to still be in view after takeoff
+        drone = SimulatedTello("127.0.0.2", photo_face(photo), frame_size=frame_size or TELLO_FRAME_SIZE,
+                               start_distance=100, target_speed=15)
+        drone.on_frame = on_frame
+        return drone
+    if not os.path.exists(spec):
+        raise ValueError(f"no video source {spec!r}: not tello, sim, a webcam number or an existing file")
+    return FileSource(spec, realtime=realtime, loop=loop, on_frame=on_frame)
@@ -0,0 +1,266 @@
+"""
+Memory-mapped gallery files for large watchlists.
+
+A GalleryStore is a folder holding the encoding matrix as float32 (or float16)
+.npy segments that are opened with mmap, so a gallery of a million identities
+opens in milliseconds, pages in only what matching touches, and is shared
+between processes through the page cache instead of being copied into each.
+
+    watchlist.gallery/
+        manifest.json          format version, encoder, dimension, dtype, segments
+        seg-00000.npy          (count, dim) encodings
+        seg-00000.names        one name per line, UTF-8
+        seg-00000.meta.jsonl   one JSON object per identity (optional)
+
+Segments are append-only: adding identities writes a new segment and then
+replaces the manifest, so readers that already have the store open never see
+a file change under them. compact() merges the segments into one.
+
+The store is tagged with the encoder that produced it and matches like a
+Gallery, so FaceRecognition accepts one in place of a faces folder.
+
+Build one from a folder of photos with
+
+    python gallery_store.py faces watchlist.gallery --encoder dlib-large --dtype float16
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+from quantized_index import Int8Index, two_stage_match
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+DTYPES = ("float32", "float16")
+
+
+def is_gallery_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _write_atomic(path, write):
+    """Write through a temporary file and rename it into place, so readers see the old or the new file"""
+    temp_path = path + ".tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+class GalleryStore:
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.encoder_name = manifest["encoder"]
+        self.dim = manifest["dim"]
+        self.dtype = np.dtype(manifest["dtype"])
+        self.segments = [np.load(self._file(segment["name"], ".npy"), mmap_mode="r")
+                         for segment in manifest["segments"]]
+        self.offsets = np.cumsum([0] + [len(segment) for segment in self.segments])
+        # Names and metadata are only read when first needed
+        self._names = None
+        self._metadata = {}
+        # Optional int8 index for two-stage matching, see quantize()
+        self.index = None
+        self.rerank_k = 32
+
+    def _file(self, segment_name, suffix):
+        return os.path.join(self.path, segment_name + suffix)
+
+    @classmethod
+    def create(cls, path, encoder_name, dim=128, dtype="float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported gallery dtype '{dtype}', expected one of {DTYPES}")
+        if is_gallery_store(path):
+            raise ValueError(f"{path} already holds a gallery")
+        os.makedirs(path, exist_ok=True)
+        manifest = {"format_version": FORMAT_VERSION, "encoder": encoder_name, "dim": dim, "dtype": dtype,
+                    "next_segment": 0, "segments": []}
+        cls._write_manifest(path, manifest)
+        return cls(path, manifest)
+
+    @classmethod
+    def open(cls, path, encoder=None):
+        store = cls(path, cls._read_manifest(path))
+        if encoder is not None:
+            store.check_encoder(encoder)
+        return store
+
+    @classmethod
+    def from_gallery(cls, path, gallery, dtype="float32"):
+        """Write an in-memory Gallery to a new store"""
+        store = cls.create(path, gallery.encoder_name, gallery.encodings.shape[1], dtype)
+        return store.append(gallery.names, gallery.encodings) if len(gallery) else store
+
+    @staticmethod
+    def _read_manifest(path):
+        with open(os.path.join(path, MANIFEST), encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path} has gallery format version {manifest.get('format_version')}, "
+                             f"expected {FORMAT_VERSION}")
+        return manifest
+
+    @staticmethod
+    def _write_manifest(path, manifest):
+        def write(temp_path):
+            with open(temp_path, "w", encoding="utf-8") as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+        _write_atomic(os.path.join(path, MANIFEST), write)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def names(self):
+        if self._names is None:
+            names = []
+            for segment in self.manifest["segments"]:
+                with open(self._file(segment["name"], ".names"), encoding="utf-8") as names_file:
+                    names.extend(names_file.read().split("\n")[:segment["count"]])
+            self._names = names
+        return self._names
+
+    def metadata(self, index):
+        """Metadata stored with identity `index`, or an empty dict"""
+        segment = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        if segment not in self._metadata:
+            path = self._file(self.manifest["segments"][segment]["name"], ".meta.jsonl")
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as meta_file:
+                    self._metadata[segment] = [json.loads(line) for line in meta_file]
+            else:
+                self._metadata[segment] = None
+        rows = self._metadata[segment]
+        return rows[index - self.offsets[segment]] if rows is not None else {}
+
+    @property
+    def encodings(self):
+        """All encodings as one float32 matrix; this copies, so prefer match()"""
+        if not self.segments:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate([np.asarray(segment, dtype=np.float32) for segment in self.segments])
+
+    def check_encoder(self, encoder):
+        if encoder.name != self.encoder_name:
+            raise ValueError(f"Gallery was built with '{self.encoder_name}' "
+                             f"but is being matched with '{encoder.name}'")
+
+    def rows(self, indices):
+        """float32 encodings of the identities at the (sorted) indices; only their pages are read"""
+        indices = np.asarray(indices)
+        segment_of = np.searchsorted(self.offsets, indices, side="right") - 1
+        rows = np.empty((len(indices), self.dim), dtype=np.float32)
+        for segment in np.unique(segment_of):
+            selected = segment_of == segment
+            rows[selected] = self.segments[segment][indices[selected] - self.offsets[segment]]
+        return rows
+
+    def quantize(self, encoder, rerank_k=32):
+        """
+        Match through an int8 coarse pass, re-ranking the best rerank_k candidates
+        exactly. The index is built in memory by reading every segment once.
+        """
+        self.index = Int8Index.build(self.segments, encoder.metric)
+        self.rerank_k = rerank_k
+        return self
+
+    def match(self, encoder, encoding, chunk_rows=32768):
+        """Return (index, distance) of the closest identity, or (None, None) if the store is empty"""
+        self.check_encoder(encoder)
+        encoding = np.asarray(encoding, dtype=np.float32)
+        if self.index is not None:
+            return two_stage_match(self.index, self.rows, encoder, encoding, self.rerank_k)
+        best_index, best_distance = None, None
+        for segment, offset in zip(self.segments, self.offsets):
+            # Chunks keep the float32 working copy small however big the segment is
+            for start in range(0, len(segment), chunk_rows):
+                distances = encoder.distance(np.asarray(segment[start:start + chunk_rows], dtype=np.float32), encoding)
+                i = int(np.argmin(distances))
+                if best_distance is None or distances[i] < best_distance:
+                    best_index, best_distance = int(offset) + start + i, float(distances[i])
+        return best_index, best_distance
+
+    def append(self, names, encodings, metadata=None):
+        """Write the identities as a new segment and return the store reopened with it"""
+        names = list(names)
+        encodings = np.asarray(encodings).reshape(len(names), self.dim)
+        for name in names:
+            if "\n" in name:
+                raise ValueError(f"Gallery names cannot contain line breaks: {name!r}")
+
+        # Start from the manifest on disk, in case another process appended since this one was read
+        manifest = self._read_manifest(self.path)
+        segment_name = f"seg-{manifest['next_segment']:05d}"
+        self._write_segment(segment_name, names, encodings, metadata)
+        manifest["next_segment"] += 1
+        manifest["segments"].append({"name": segment_name, "count": len(names)})
+        self._write_manifest(self.path, manifest)
+        return GalleryStore(self.path, manifest)
+
+    def _write_segment(self, segment_name, names, encodings, metadata):
+        def write_encodings(temp_path):
+            with open(temp_path, "wb") as encodings_file:
+                np.save(encodings_file, np.asarray(encodings).astype(self.dtype))
+        _write_atomic(self._file(segment_name, ".npy"), write_encodings)
+
+        def write_names(temp_path):
+            with open(temp_path, "w", encoding="utf-8") as names_file:
+                names_file.write("\n".join(names))
+        _write_atomic(self._file(segment_name, ".names"), write_names)
+
+        if metadata is not None:
+            def write_metadata(temp_path):
+                with open(temp_path, "w", encoding="utf-8") as meta_file:
+                    for row in metadata:
+                        meta_file.write(json.dumps(row) + "\n")
+            _write_atomic(self._file(segment_name, ".meta.jsonl"), write_metadata)
+
+    def add_identity(self, name, encoding, photo=None):
+        """Same as GalleryWatcher.add_identity; a store has no photo folder, so `photo` is ignored"""
+        return self.append([name], [encoding])
+
+    def compact(self):
+        """Merge every segment into one and return the reopened store; old segment files are removed"""
+        if len(self.segments) <= 1:
+            return self
+        metadata = [self.metadata(i) for i in range(len(self))]
+        manifest = json.loads(json.dumps(self.manifest))
+        segment_name = f"seg-{manifest['next_segment']:05d}"
+        self._write_segment(segment_name, self.names, self.encodings, metadata if any(metadata) else None)
+        old_segments = [segment["name"] for segment in manifest["segments"]]
+        manifest["next_segment"] += 1
+        manifest["segments"] = [{"name": segment_name, "count": len(self)}]
+        self._write_manifest(self.path, manifest)
+
+        # Processes that still map the old files keep them alive until they reopen
+        for old_segment in old_segments:
+            for suffix in (".npy", ".names", ".meta.jsonl"):
+                try:
+                    os.remove(self._file(old_segment, suffix))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # Windows will not delete a file another process still maps
+                    print(f"Could not remove {old_segment}{suffix}: {e}")
+        return GalleryStore(self.path, manifest)
+
+
+def main():
+    from face_encoders import create_encoder
+    from face_gallery import Gallery
+
+    parser = argparse.ArgumentParser(description="Build a memory-mapped gallery from a folder of face photos")
+    parser.add_argument("faces", help="folder of .jpg/.png photos, one person per photo")
+    parser.add_argument("store", help="gallery folder to create, e.g. watchlist.gallery")
+    parser.add_argument("--encoder", default="dlib-large")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32")
+    args = parser.parse_args()
+
+    encoder = create_encoder(args.encoder)
+    gallery = Gallery.from_directory(args.faces, encoder)
+    store = GalleryStore.from_gallery(args.store, gallery, args.dtype)
+    print(f"Wrote {len(store)} identities to {args.store}")
+
+
+if __name__ == "__main__":
+    main()
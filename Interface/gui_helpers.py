@@ -0,0 +1,145 @@
+"""
+Small Tkinter helpers shared by the controllers.
+"""
+
+import os
+import threading
+import time
+from tkinter import READABLE, _setit
+import cv2
+from PIL import Image, ImageTk
+from frame_pool import FramePool
+
+
+def set_menu_options(option_menu, variable, options, command=None):
+    """
+    Replace the entries of an OptionMenu, keeping the selection if it is still
+    offered. Otherwise the first option is selected and passed to command.
+    """
+    menu = option_menu["menu"]
+    menu.delete(0, "end")
+    for option in options:
+        menu.add_command(label=option, command=_setit(variable, option, command))
+    if variable.get() not in options:
+        variable.set(options[0])
+        if command is not None:
+            command(options[0])
+
+
+class TkFrameView:
+    """
+    Shows BGR frames on a Label. The RGBA conversion goes into a pooled buffer
+    that PIL wraps without copying, and frames of the same size are pasted into
+    one PhotoImage instead of building a new one every tick.
+    """
+
+    def __init__(self, label, pool=None):
+        self.label = label
+        self.pool = pool if pool is not None else FramePool()
+        self.photo = None
+
+    def show(self, frame):
+        height, width = frame.shape[:2]
+        rgba = self.pool.convert(frame, cv2.COLOR_BGR2RGBA, 4)
+        try:
+            image = Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1)
+            if self.photo is None or (self.photo.width(), self.photo.height()) != (width, height):
+                self.photo = ImageTk.PhotoImage(image=image)
+                self.label.imgtk = self.photo
+                self.label.configure(image=self.photo)
+            else:
+                # Tk copies the pixels, so the buffer can go straight back to the pool
+                self.photo.paste(image)
+        finally:
+            self.pool.give_back(rgba)
+
+
+class FrameSignal:
+    """
+    Runs `callback` on the Tk thread when another thread calls set(), e.g. the
+    decoder after a new frame, so the display repaints only when there is
+    something new instead of polling with after(). set() writes a byte into a
+    pipe that Tk watches with createfilehandler; any number of set() calls
+    before the callback runs wake it once. Tk has no file handlers on Windows,
+    where the flag is checked every `poll_ms` instead.
+
+    `min_interval` (seconds) caps the callback rate: a signal that comes
+    sooner is held back with after() until the interval is up.
+    """
+
+    def __init__(self, widget, callback, min_interval=0.0, poll_ms=5):
+        self.widget = widget
+        self.callback = callback
+        self.min_interval = min_interval
+        self.poll_ms = poll_ms
+        self._pending = threading.Event()
+        self._deferred = False
+        self._read_fd = self._write_fd = None
+        # perf_counter() time of the last callback
+        self.last_call = 0.0
+        self.signals = 0
+        self.calls = 0
+
+        if os.name == "posix":
+            self._read_fd, self._write_fd = os.pipe()
+            os.set_blocking(self._read_fd, False)
+            os.set_blocking(self._write_fd, False)
+            widget.tk.createfilehandler(self._read_fd, READABLE, self._on_readable)
+        else:
+            widget.after(poll_ms, self._poll)
+
+    def set(self):
+        """Ask for a callback; safe to call from any thread"""
+        self.signals += 1
+        if self._pending.is_set():
+            return
+        self._pending.set()
+        write_fd = self._write_fd
+        if write_fd is not None:
+            try:
+                os.write(write_fd, b"\0")
+            except OSError:
+                # Pipe full or closed: a wake-up is already on its way, or we are shutting down
+                pass
+
+    def _on_readable(self, fd, mask):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._pending.clear()
+        self._fire()
+
+    def _poll(self):
+        if self._pending.is_set():
+            self._pending.clear()
+            self._fire()
+        if self.callback is not None:
+            self.widget.after(self.poll_ms, self._poll)
+
+    def _fire(self):
+        if self.callback is None:
+            return
+        wait = self.min_interval - (time.perf_counter() - self.last_call)
+        if wait > 0:
+            if not self._deferred:
+                self._deferred = True
+                self.widget.after(int(wait * 1000) + 1, self._fire_deferred)
+            return
+        self.last_call = time.perf_counter()
+        self.calls += 1
+        self.callback()
+
+    def _fire_deferred(self):
+        self._deferred = False
+        self._fire()
+
+    def close(self):
+        self.callback = None
+        if self._read_fd is not None:
+            read_fd, write_fd = self._read_fd, self._write_fd
+            self._read_fd = self._write_fd = None
+            self.widget.tk.deletefilehandler(read_fd)
+            os.close(write_fd)
+            os.close(read_fd)
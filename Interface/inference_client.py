@@ -0,0 +1,216 @@
+"""
+Client side of the local inference service (see inference_service.py).
+
+RemoteEncoder is a FaceEncoder whose locate/encode/eye_landmarks calls run in
+the service, and RemoteGallery matches against the service's gallery, so a
+GCS using them loads no models and encodes no photos itself:
+
+    recognition = FaceRecognition(None, RemoteEncoder())
+
+or pass "remote" as the encoder name to the controllers.
+
+Messages are a 4-byte length, a JSON header and the raw bytes of any numpy
+arrays the header lists, over a Unix socket (or localhost TCP where Unix
+sockets are not available, e.g. "127.0.0.1:8765").
+"""
+
+import json
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import numpy as np
+from face_encoders import FaceEncoder
+
+if hasattr(socket, "AF_UNIX"):
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "stalker-inference.sock")
+else:
+    DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+
+class InferenceServiceError(Exception):
+    pass
+
+
+def parse_address(address):
+    """(family, address) for socket(): "host:port" is TCP, anything else a Unix socket path"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def _recv_exactly(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Inference service connection closed")
+        received += count
+    return data
+
+
+def send_message(sock, header, arrays=()):
+    arrays = [np.ascontiguousarray(array) for array in arrays]
+    header = dict(header, arrays=[(array.dtype.str, array.shape) for array in arrays])
+    header_bytes = json.dumps(header).encode("utf-8")
+    sock.sendall(b"".join([struct.pack("!I", len(header_bytes)), header_bytes] + [array.data for array in arrays]))
+
+
+def recv_message(sock):
+    """(header, arrays) of the next message"""
+    size, = struct.unpack("!I", _recv_exactly(sock, 4))
+    header = json.loads(_recv_exactly(sock, size).decode("utf-8"))
+    arrays = []
+    for dtype, shape in header.pop("arrays"):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) * dtype.itemsize
+        arrays.append(np.frombuffer(_recv_exactly(sock, count), dtype=dtype).reshape(shape))
+    return header, arrays
+
+
+class InferenceClient:
+    """One connection to the service; requests from several threads take turns on it"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=10.0):
+        family, socket_address = parse_address(address)
+        self.address = address
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_address)
+        self._lock = threading.Lock()
+
+    def request(self, op, arrays=(), **fields):
+        """Send one request and return (reply header, reply arrays)"""
+        with self._lock:
+            send_message(self.sock, dict(fields, op=op), arrays)
+            header, reply_arrays = recv_message(self.sock)
+        if "error" in header:
+            raise InferenceServiceError(header["error"])
+        return header, reply_arrays
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteEncoder(FaceEncoder):
+    """Stands in for the service's encoder: same name, thresholds and distance, inference done remotely"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, client=None):
+        self.client = client or InferenceClient(address)
+        info, _ = self.client.request("info")
+        self.name = info["encoder"]
+        self.metric = info["metric"]
+        self.tolerance = info["tolerance"]
+        self.confidence_threshold = info["confidence_threshold"]
+        self.min_confidence = info["min_confidence"]
+
+    def locate(self, rgb_image):
+        header, _ = self.client.request("locate", [rgb_image])
+        return [tuple(location) for location in header["locations"]]
+
+    def encode(self, rgb_image, face_locations):
+        if not face_locations:
+            return np.empty((0, 128))
+        _, (encodings,) = self.client.request("encode", [rgb_image], locations=[list(map(int, location))
+                                                                                for location in face_locations])
+        return encodings
+
+    def eye_landmarks(self, rgb_image, face_locations):
+        if not face_locations:
+            return []
+        header, _ = self.client.request("landmarks", [rgb_image], locations=[list(map(int, location))
+                                                                              for location in face_locations])
+        return [None if points is None else tuple(np.array(point) for point in points)
+                for points in header["landmarks"]]
+
+    def distance(self, encodings, encoding):
+        if len(encodings) == 0:
+            return np.empty(0)
+        if self.metric == "cosine":
+            return 1.0 - encodings @ encoding
+        return np.linalg.norm(encodings - encoding, axis=1)
+
+    def average(self, encodings):
+        mean = np.mean(encodings, axis=0)
+        return mean / (np.linalg.norm(mean) + 1e-12) if self.metric == "cosine" else mean
+
+    def gallery(self, on_change=None, interval=1.0):
+        """
+        The service's gallery. With on_change, a background thread checks every
+        `interval` seconds for a new gallery version and passes it the updated
+        RemoteGallery, like a GalleryWatcher's callback.
+        """
+        gallery = RemoteGallery(self.client)
+        if on_change is not None:
+            threading.Thread(target=self._watch_gallery, args=(gallery.version, on_change, interval),
+                             daemon=True).start()
+        return gallery
+
+    def _watch_gallery(self, version, on_change, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                header, _ = self.client.request("version")
+                if header["version"] != version:
+                    gallery = RemoteGallery(self.client)
+                    version = gallery.version
+                    on_change(gallery)
+            except (OSError, InferenceServiceError) as e:
+                print(f"Lost the inference service: {e}")
+                return
+
+    def stats(self, reset=False):
+        """The service's batch and throughput counters; reset=True starts a new counting period"""
+        header, _ = self.client.request("stats", reset=reset)
+        return header["stats"]
+
+
+class RemoteGallery:
+    """The service's gallery names at one version, matched in the service"""
+
+    def __init__(self, client):
+        self.client = client
+        header, _ = client.request("names")
+        self.encoder_name = header["encoder"]
+        self.version = header["version"]
+        self.names = header["names"]
+        # Matching happens in the service, which quantizes its own gallery if configured to
+        self.index = None
+        self.rerank_k = 32
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def encodings(self):
+        _, (encodings,) = self.client.request("encodings")
+        return encodings
+
+    def check_encoder(self, encoder):
+        if encoder.name != self.encoder_name:
+            raise ValueError(f"Gallery was built with '{self.encoder_name}' "
+                             f"but is being matched with '{encoder.name}'")
+
+    def quantize(self, encoder, rerank_k=32):
+        return self
+
+    def match(self, encoder, encoding):
+        self.check_encoder(encoder)
+        header, _ = self.client.request("match", [np.asarray(encoding, dtype=np.float32)])
+        index, distance, name = header["index"], header["distance"], header["name"]
+        if index is not None and (index >= len(self.names) or self.names[index] != name):
+            # The service matched against a newer gallery; report the same name in this one
+            index = self.names.index(name) if name in self.names else None
+            distance = distance if index is not None else None
+        return index, distance
+
+    def add_identity(self, name, encoding, photo=None):
+        """Same as GalleryWatcher.add_identity, done by the service; returns the updated gallery"""
+        arrays = [np.asarray(encoding, dtype=np.float32)] + ([photo] if photo is not None else [])
+        self.client.request("add_identity", arrays, name=name)
+        return RemoteGallery(self.client)
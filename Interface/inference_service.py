@@ -0,0 +1,296 @@
+"""
+Local inference service: one process owns the face models and the gallery,
+and every GCS, stream or tool on the machine sends it detection, encoding and
+matching requests instead of loading its own copy of dlib.
+
+Encoding requests from all clients go into one queue. The inference thread
+takes the first one, waits up to batch_window seconds for more to arrive (or
+until max_batch faces are waiting) and encodes every face in a single
+encode_batch call. Detection and landmark requests arriving meanwhile are run
+straight away rather than held back, and matching runs on the connection
+threads, which never touch the models.
+
+Batch sizes, queue wait and throughput are printed every report_interval
+seconds while there is work, and returned by the "stats" request.
+
+    python inference_service.py faces --encoder dlib-large --batch-window 0.005
+
+GCS processes then use it with the "remote" encoder, e.g.
+
+    python DroneControllerWithEnableAll.py remote
+"""
+
+import argparse
+import os
+import queue
+import socket
+import threading
+import time
+from contextlib import nullcontext
+import numpy as np
+from face_recognition_system import FaceRecognition
+from inference_client import DEFAULT_ADDRESS, parse_address, recv_message, send_message
+
+
+class _Job:
+    def __init__(self, op, image, locations):
+        self.op = op
+        self.image = image
+        self.locations = locations
+        self.enqueued = time.perf_counter()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ServiceStats:
+    """Counters since the last reset, summarised by summary()"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.batch_faces = []
+        self.batch_requests = []
+        self.waits = {"locate": [], "encode": [], "landmarks": []}
+        self.busy = 0.0
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-6)
+        faces = int(np.sum(self.batch_faces)) if self.batch_faces else 0
+        summary = {
+            "seconds": round(elapsed, 1),
+            "encode_batches": len(self.batch_faces),
+            "mean_batch_faces": round(float(np.mean(self.batch_faces)), 2) if self.batch_faces else 0.0,
+            "max_batch_faces": int(np.max(self.batch_faces)) if self.batch_faces else 0,
+            "mean_batch_requests": round(float(np.mean(self.batch_requests)), 2) if self.batch_requests else 0.0,
+            "faces_per_s": round(faces / elapsed, 1),
+            "frames_located_per_s": round(len(self.waits["locate"]) / elapsed, 1),
+            "busy": round(self.busy / elapsed, 3),
+        }
+        for op, waits in self.waits.items():
+            if waits:
+                summary[f"{op}_wait_ms"] = round(float(np.mean(waits)) * 1000, 2)
+                summary[f"{op}_wait_p95_ms"] = round(float(np.percentile(waits, 95)) * 1000, 2)
+        return summary
+
+
+class InferenceService:
+    def __init__(self, faces_dir, encoder="dlib-large", address=DEFAULT_ADDRESS, batch_window=0.005, max_batch=32,
+                 quantize=False, report_interval=10.0):
+        # Only the encoder and gallery are used; the folder is watched as in the GCS
+        self.recognition = FaceRecognition(faces_dir, encoder, load=False, quantize=quantize)
+        self.address = address
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.report_interval = report_interval
+        self.stats = ServiceStats()
+        self._queue = queue.Queue()
+        self._listener = None
+        self._running = False
+
+    def start(self):
+        """Load the models and gallery, then accept clients on background threads"""
+        self.recognition.load()
+        family, socket_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(socket_address):
+            try:
+                with socket.socket(family, socket.SOCK_STREAM) as probe:
+                    probe.connect(socket_address)
+                raise RuntimeError(f"An inference service is already listening on {self.address}")
+            except ConnectionRefusedError:
+                # Left behind by a service that did not shut down cleanly
+                os.remove(socket_address)
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(socket_address)
+        self._listener.listen()
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._infer, daemon=True).start()
+        print(f"Inference service listening on {self.address} (batch window {self.batch_window * 1000:g} ms, "
+              f"max batch {self.max_batch} faces)")
+        return self
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+        if self._listener is not None:
+            self._listener.close()
+            family, socket_address = parse_address(self.address)
+            if family == socket.AF_UNIX and os.path.exists(socket_address):
+                os.remove(socket_address)
+
+    def _accept(self):
+        while self._running:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        with connection:
+            while self._running:
+                try:
+                    header, arrays = recv_message(connection)
+                except (ConnectionError, OSError):
+                    return
+                try:
+                    reply, reply_arrays = self._handle(header, arrays)
+                except Exception as e:
+                    reply, reply_arrays = {"error": f"{type(e).__name__}: {e}"}, []
+                try:
+                    send_message(connection, reply, reply_arrays)
+                except OSError:
+                    return
+
+    def _handle(self, header, arrays):
+        """Reply header and arrays for one request"""
+        op = header["op"]
+        recognition = self.recognition
+        encoder = recognition.encoder
+        if op in ("locate", "encode", "landmarks"):
+            job = _Job(op, arrays[0], [tuple(location) for location in header.get("locations", [])])
+            self._queue.put(job)
+            job.done.wait()
+            if job.error is not None:
+                raise job.error
+            if op == "locate":
+                return {"locations": [list(map(int, location)) for location in job.result]}, []
+            if op == "encode":
+                return {}, [np.asarray(job.result, dtype=np.float32)]
+            return {"landmarks": [None if points is None else [np.asarray(point, dtype=float).tolist()
+                                                               for point in points] for points in job.result]}, []
+        if op == "info":
+            return {"encoder": encoder.name, "metric": encoder.metric, "tolerance": encoder.tolerance,
+                    "confidence_threshold": encoder.confidence_threshold, "min_confidence": encoder.min_confidence}, []
+        if op == "names":
+            # Version first: a swap in between makes the client ask again, never miss an update
+            version = recognition.gallery_version
+            return {"encoder": encoder.name, "version": version, "names": list(recognition.gallery.names)}, []
+        if op == "version":
+            return {"version": recognition.gallery_version}, []
+        if op == "encodings":
+            return {}, [np.asarray(recognition.gallery.encodings, dtype=np.float32)]
+        if op == "match":
+            version = recognition.gallery_version
+            gallery = recognition.gallery
+            index, distance = gallery.match(encoder, arrays[0])
+            if index is None:
+                return {"index": None, "distance": None, "version": version, "name": None}, []
+            return {"index": int(index), "distance": float(distance), "version": version,
+                    "name": gallery.names[index]}, []
+        if op == "add_identity":
+            photo = arrays[1] if len(arrays) > 1 else None
+            source = recognition.gallery_watcher if recognition.gallery_watcher is not None else recognition.gallery
+            recognition.swap_gallery(source.add_identity(header["name"], arrays[0], photo))
+            return {"version": recognition.gallery_version}, []
+        if op == "stats":
+            summary = self.stats.summary()
+            if header.get("reset"):
+                self.stats.reset()
+            return {"stats": summary}, []
+        raise ValueError(f"Unknown request '{op}'")
+
+    def _models(self):
+        """Held around every call into the encoder: the gallery watcher encodes new photos with the same models"""
+        return self.recognition.model_lock if self.recognition.encoder.shares_models else nullcontext()
+
+    def _run(self, job):
+        encoder = self.recognition.encoder
+        try:
+            with self._models():
+                if job.op == "locate":
+                    job.result = encoder.locate(job.image)
+                else:
+                    job.result = encoder.eye_landmarks(job.image, job.locations)
+        except Exception as e:
+            job.error = e
+        job.done.set()
+
+    def _infer(self):
+        last_report = time.perf_counter()
+        while True:
+            batch = []
+            faces = 0
+            deadline = None
+            while faces < self.max_batch:
+                timeout = None if deadline is None else deadline - time.perf_counter()
+                try:
+                    job = self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    return
+                if job.op != "encode":
+                    # Detection is not batched, so it runs while the encode batch fills
+                    start = time.perf_counter()
+                    self.stats.waits[job.op].append(start - job.enqueued)
+                    self._run(job)
+                    self.stats.busy += time.perf_counter() - start
+                    if deadline is None:
+                        break
+                    continue
+                if deadline is None:
+                    deadline = job.enqueued + self.batch_window
+                batch.append(job)
+                faces += len(job.locations)
+
+            if batch:
+                self._encode(batch, faces)
+
+            now = time.perf_counter()
+            if now - last_report >= self.report_interval:
+                last_report = now
+                summary = self.stats.summary()
+                if summary["encode_batches"] or summary["frames_located_per_s"]:
+                    print("Inference service: " + ", ".join(f"{key} {value}" for key, value in summary.items()))
+                self.stats.reset()
+
+    def _encode(self, batch, faces):
+        start = time.perf_counter()
+        for job in batch:
+            self.stats.waits["encode"].append(start - job.enqueued)
+        try:
+            with self._models():
+                results = self.recognition.encoder.encode_batch([(job.image, job.locations) for job in batch])
+        except Exception as e:
+            results = [None] * len(batch)
+            for job in batch:
+                job.error = e
+        for job, result in zip(batch, results):
+            job.result = result
+            job.done.set()
+        self.stats.busy += time.perf_counter() - start
+        self.stats.batch_faces.append(faces)
+        self.stats.batch_requests.append(len(batch))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("faces", help="faces folder or gallery store")
+    parser.add_argument("--encoder", default="dlib-large")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path or host:port")
+    parser.add_argument("--batch-window", type=float, default=0.005,
+                        help="seconds to wait for more faces before encoding a batch")
+    parser.add_argument("--max-batch", type=int, default=32, help="faces per encoder call")
+    parser.add_argument("--quantize", action="store_true", help="match through the int8 index")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    args = parser.parse_args()
+
+    service = InferenceService(args.faces, args.encoder, args.address, args.batch_window, args.max_batch,
+                               args.quantize, args.report_interval).start()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cheap motion gate for the recognition loop.
+
+While the drone hovers over an unchanged scene there is no reason to run face
+detection and encoding again. The gate compares a tiny grey copy of each frame
+with the frame the last results were computed on. Small global shifts (the
+drone drifting while it hovers) are estimated with phase correlation and
+compensated before differencing, so only real changes in the scene trigger a
+new detection.
+"""
+
+import time
+import cv2
+import numpy as np
+from frame_pool import FramePool
+
+
+class MotionGate:
+    def __init__(self, size=(64, 48), threshold=4.0, max_shift=3.0, max_skip=30, pool=None):
+        # Resolution the frames are compared at
+        self.size = size
+        # Mean absolute grey level difference that counts as a change
+        self.threshold = threshold
+        # Global shift (in pixels at `size`) that is still treated as hover drift
+        self.max_shift = max_shift
+        # Run detection at least every `max_skip` frames even if nothing moved
+        self.max_skip = max_skip
+        # Scratch and reference buffers come from here, so the gate allocates nothing per frame
+        self.pool = pool if pool is not None else FramePool()
+
+        self.reference = None
+        self.skipped_in_a_row = 0
+        self.frames = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    def _prepare(self, frame):
+        pool = self.pool
+        small = pool.resize(frame, self.size, cv2.INTER_AREA)
+        grey = pool.convert(small, cv2.COLOR_BGR2GRAY, 1) if small.ndim == 3 else small
+        blurred = cv2.GaussianBlur(grey, (3, 3), 0, dst=pool.borrow(grey.shape))
+        current = pool.borrow(grey.shape, np.float32)
+        current[...] = blurred
+        pool.give_back(blurred)
+        if grey is not small:
+            pool.give_back(grey)
+        pool.give_back(small)
+        return current
+
+    def change(self, current):
+        """Motion-compensated mean difference between `current` and the reference"""
+        (dx, dy), _ = cv2.phaseCorrelate(self.reference, current)
+        if abs(dx) > self.max_shift or abs(dy) > self.max_shift:
+            return float("inf")
+
+        # Undo the drift, then ignore the border it uncovered
+        shift = np.float32([[1, 0, -dx], [0, 1, -dy]])
+        with self.pool.buffer(current.shape, np.float32) as aligned, \
+                self.pool.buffer(current.shape, np.float32) as diff:
+            cv2.warpAffine(current, shift, self.size, dst=aligned, borderMode=cv2.BORDER_REPLICATE)
+            cv2.absdiff(aligned, self.reference, dst=diff)
+            m = int(np.ceil(self.max_shift))
+            return float(diff[m:-m or None, m:-m or None].mean())
+
+    def needs_update(self, frame):
+        """Return True if the frame needs new detection, False if the last results still apply"""
+        self.frames += 1
+        current = self._prepare(frame)
+
+        if (self.reference is None or self.skipped_in_a_row >= self.max_skip
+                or self.change(current) > self.threshold):
+            self.reset()
+            self.reference = current
+            self.skipped_in_a_row = 0
+            return True
+
+        self.pool.give_back(current)
+        self.skipped_in_a_row += 1
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        """Force the next frame through detection"""
+        if self.reference is not None:
+            self.pool.give_back(self.reference)
+        self.reference = None
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def stats(self):
+        return {"frames": self.frames, "skipped": self.skipped, "skip_ratio": self.skip_ratio,
+                "skips_per_second": self.skipped / max(1e-6, time.perf_counter() - self.started)}
@@ -0,0 +1,447 @@
+"""
+Ground control for several Tellos from one process.
+
+Each drone (a Tello EDU in station mode on its own IP, streaming video to its
+own local port) gets a DroneStream: a capture thread, its own recognition
+pipeline (motion gate, tracker, locked face), a follower and a command client.
+All streams share one gallery and one InferencePool. Every stream has a single
+slot in the pool that only ever holds its newest frame, and idle workers take
+the next stream with a waiting frame in round-robin order, so a slow or busy
+stream cannot starve the others and no stream builds up a backlog.
+
+Workers run side by side only with encoders that have models of their own:
+SFace, or "remote" (the inference service). dlib keeps its models in module
+globals that one thread at a time may use, so with it the pool runs a single
+worker whatever --workers says.
+
+Run against real drones:
+
+    python multi_drone.py --drones 192.168.1.21 192.168.1.22 --video-ports 11111 11112
+
+or against simulated drones on 127.0.0.2, 127.0.0.3, ... without a window:
+
+    python multi_drone.py --simulate 3 --headless --duration 30
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+from face_encoders import create_encoder
+from face_recognition_system import FaceRecognition
+from follow_controller import PredictiveFollower, arrival_time
+from frame_sources import TELLO_FRAME_SIZE
+from inference_client import RemoteEncoder
+from tello_client import LAND_WAIT, AsyncTelloClient
+from tiled_detection import TiledDetector, parse_tiles
+
+
+class StreamStats:
+    """Throughput and latency of one stream's recognition, over its last `window` frames"""
+
+    def __init__(self, window=60):
+        self.submitted = 0
+        self.processed = 0
+        # Frames replaced by a newer one before a worker got to them
+        self.dropped = 0
+        self.done_times = deque(maxlen=window)
+        # Seconds from the frame arriving to its results being ready
+        self.latencies = deque(maxlen=window)
+
+    @property
+    def fps(self):
+        if len(self.done_times) < 2:
+            return 0.0
+        return (len(self.done_times) - 1) / max(self.done_times[-1] - self.done_times[0], 1e-6)
+
+    @property
+    def latency(self):
+        return float(np.mean(self.latencies)) if self.latencies else 0.0
+
+    def summary(self):
+        return (f"{self.fps:5.1f} fps, {self.latency * 1000:4.0f} ms latency, "
+                f"{self.processed} processed, {self.dropped} dropped")
+
+
+class StreamSlot:
+    def __init__(self, name, recognition, on_results=None):
+        self.name = name
+        self.recognition = recognition
+        self.on_results = on_results
+        self.stats = StreamStats()
+        # (frame, frame_time, native frame or None) waiting for a worker; a newer frame replaces it
+        self.pending = None
+        self.busy = False
+        self.results = ([], [], [], [])
+
+
+class InferencePool:
+    def __init__(self, recognition, workers=2):
+        # Owns the gallery; every stream gets a pipeline sharing it
+        self.recognition = recognition
+        self.workers = workers
+        self.slots = []
+        self._next = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._threads = []
+
+    def add_stream(self, name, on_results=None):
+        slot = StreamSlot(name, self.recognition.for_stream(), on_results)
+        with self._condition:
+            self.slots.append(slot)
+        return slot
+
+    def submit(self, slot, frame, frame_time, native=None):
+        with self._condition:
+            if slot.pending is not None:
+                slot.stats.dropped += 1
+            slot.pending = (frame, frame_time, native)
+            slot.stats.submitted += 1
+            self._condition.notify()
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._work, args=(index,), daemon=True)
+                         for index in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        # Let a pass that is under way finish, so the interpreter does not exit inside the encoder
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def _take(self):
+        """Next stream with a waiting frame, in round-robin order, or None"""
+        for offset in range(len(self.slots)):
+            slot = self.slots[(self._next + offset) % len(self.slots)]
+            if slot.pending is not None and not slot.busy:
+                self._next = (self._next + offset + 1) % len(self.slots)
+                return slot
+        return None
+
+    def _work(self, index):
+        self.recognition.ready.wait()
+        encoder = self.recognition.encoder
+        if index > 0 and isinstance(encoder, RemoteEncoder):
+            # A connection of its own, so the service can batch this worker's faces with the others'
+            encoder = RemoteEncoder(encoder.client.address)
+        elif index > 0 and encoder.shares_models:
+            # Another worker would only queue for the same models
+            if index == 1:
+                print(f"{encoder.name} shares its models between threads: recognition runs on one worker")
+            return
+        elif index > 0:
+            # Encoders with their own models can run side by side
+            encoder = create_encoder(encoder.name)
+
+        while True:
+            with self._condition:
+                slot = self._take()
+                while self._running and slot is None:
+                    self._condition.wait()
+                    slot = self._take()
+                if not self._running:
+                    return
+                frame, frame_time, native = slot.pending
+                slot.pending = None
+                # One frame per stream at a time, so a stream's tracker is never used by two workers
+                slot.busy = True
+
+            try:
+                results = slot.recognition.recognize_faces(frame, encoder, native)
+                slot.results = results
+                if slot.on_results is not None:
+                    slot.on_results(frame_time, slot.recognition.last_results_fresh)
+            except Exception as e:
+                print(f"{slot.name}: recognition failed: {e}")
+            finally:
+                done = time.time()
+                slot.stats.processed += 1
+                slot.stats.done_times.append(done)
+                slot.stats.latencies.append(done - frame_time)
+                with self._condition:
+                    slot.busy = False
+                    self._condition.notify()
+
+
+class DroneStream:
+    """One drone: reads its frames into the pool and follows its locked face from the results"""
+
+    def __init__(self, name, link, client, pool, frame_size=(720, 480), follower=None):
+        self.name = name
+        # A frame source: DroneLink or SimulatedTello
+        self.link = link
+        self.client = client
+        self.frame_size = frame_size
+        self.follower = follower if follower is not None else PredictiveFollower(frame_size=frame_size)
+        self.pool = pool
+        self.slot = pool.add_stream(name, self.on_results)
+        self.recognition = self.slot.recognition
+        self.latest_frame = None
+        self.results_frame_time = time.time()
+        # Called (from any thread) when display_frame has something new; set by the GUI
+        self.on_display = None
+        self._running = False
+        self._new_frame = threading.Event()
+
+    def start(self):
+        self._running = True
+        self.link.on_frame = self._new_frame.set
+        threading.Thread(target=self._capture, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._new_frame.set()
+
+    def _capture(self):
+        last = None
+        while self._running:
+            # Woken by the source, with a timeout only so that stop() is noticed
+            self._new_frame.wait(0.5)
+            self._new_frame.clear()
+            frame, arrival = self.link.read()
+            if frame is not None and arrival != last:
+                last = arrival
+                frame_time = arrival_time(arrival)
+                self.latest_frame = cv2.resize(frame, self.frame_size)
+                # Tiled detection looks for faces on the frame at the size the source gave it
+                native = frame if self.recognition.tiled_detector is not None else None
+                self.pool.submit(self.slot, self.latest_frame, frame_time, native)
+                if self.on_display is not None:
+                    self.on_display()
+
+    def on_results(self, frame_time, fresh):
+        """Called on the worker thread once this stream's frame has been through recognition"""
+        if fresh:
+            self.results_frame_time = frame_time
+            if self.on_display is not None:
+                self.on_display()
+        if self.recognition.locked_face_name is None:
+            return
+        target = self.recognition.locked_target()
+        if target is None:
+            rc = self.follower.lost()
+        else:
+            # Recognition works on a reduced-size frame
+            rc = self.follower.update(self.recognition.to_frame(target), self.results_frame_time)
+        if rc is not None and self.client.is_flying:
+            self.client.send_rc(*rc)
+
+    def lock_face(self, name):
+        self.recognition.lock_face(name)
+        if self.recognition.locked_face_name is None:
+            # Hover rather than carry on with the last follow or search command
+            rc = self.follower.stop()
+            if rc is not None and self.client.is_flying:
+                self.client.send_rc(*rc)
+
+    def takeoff_land(self):
+        if self.client.is_flying:
+            return self.client.land()
+        return self.client.takeoff()
+
+    def display_frame(self):
+        """The newest frame with this stream's results and stats drawn on it, or None before the first frame"""
+        if self.latest_frame is None:
+            return None
+        frame = self.recognition.display_results(self.latest_frame.copy(), *self.slot.results)
+        cv2.putText(frame, f"{self.name}: {self.slot.stats.summary()}", (10, 20), cv2.FONT_HERSHEY_DUPLEX, 0.5,
+                    (0, 255, 0), 1)
+        return frame
+
+
+class MultiDroneController:
+    """One Tk window with a video column, target dropdown and takeoff/land button per drone"""
+
+    def __init__(self, streams, recognition, display_scale=0.5):
+        from tkinter import Tk, Label, Button, Frame, StringVar, OptionMenu
+        from gui_helpers import FrameSignal, set_menu_options
+        self._set_menu_options = set_menu_options
+
+        self.root = Tk()
+        self.root.title("Multi-Drone Controller - Tkinter")
+        # One repaint of every column per wake-up, whichever stream had something new, at most 30 times a second
+        self.frame_signal = FrameSignal(self.root, self.video_stream, min_interval=1 / 30)
+        for stream in streams:
+            stream.on_display = self.frame_signal.set
+        self.streams = streams
+        self.recognition = recognition
+        self.display_scale = display_scale
+        self.menu_gallery_version = None
+        self.columns = []
+        for i, stream in enumerate(streams):
+            column = Frame(self.root)
+            column.grid(row=0, column=i, padx=5, pady=5)
+            label = Label(column)
+            label.pack()
+            buttons = Frame(column)
+            buttons.pack(pady=5)
+            Button(buttons, text="Takeoff/Land", command=stream.takeoff_land).pack(side='left', padx=5)
+            variable = StringVar(self.root)
+            variable.set("Disable")
+            menu = OptionMenu(buttons, variable, "Disable",
+                              command=stream.lock_face)
+            menu.pack(side='left')
+            self.columns.append((label, variable, menu))
+
+    def run_app(self):
+        try:
+            self.refresh_face_menus()
+            self.root.mainloop()
+        finally:
+            self.frame_signal.close()
+            for stream in self.streams:
+                stream.stop()
+
+    def refresh_face_menus(self):
+        if self.recognition.ready.is_set() and self.recognition.gallery_version != self.menu_gallery_version:
+            self.menu_gallery_version = self.recognition.gallery_version
+            for stream, (label, variable, menu) in zip(self.streams, self.columns):
+                self._set_menu_options(menu, variable, ["Disable", *self.recognition.known_face_names],
+                                       stream.lock_face)
+        self.root.after(250, self.refresh_face_menus)
+
+    def video_stream(self):
+        from PIL import Image, ImageTk
+        for stream, (label, variable, menu) in zip(self.streams, self.columns):
+            frame = stream.display_frame()
+            if frame is None:
+                continue
+            frame = cv2.resize(frame, (0, 0), fx=self.display_scale, fy=self.display_scale)
+            imgtk = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)))
+            label.imgtk = imgtk
+            label.configure(image=imgtk)
+
+
+def simulation_target(recognition, faces_dir, target=None):
+    """
+    (name, photo file) of the person the simulated drones show and follow:
+    `target`, or the first known face. Waits for recognition to load, and
+    raises ValueError if it failed or there is no such face with a photo.
+    """
+    from face_gallery import PHOTO_EXTENSIONS
+    while not recognition.ready.wait(0.5):
+        if recognition.load_error is not None:
+            raise ValueError(f"face recognition failed to load: {recognition.load_error}")
+    names = recognition.known_face_names
+    if not names:
+        raise ValueError(f"no known faces in {faces_dir} for the simulated drones to show")
+    target = target or names[0]
+    if target not in names:
+        raise ValueError(f"--target {target} is not in the gallery: {', '.join(names)}")
+    photos = sorted(os.listdir(faces_dir)) if os.path.isdir(faces_dir) else []
+    photo = next((f for f in photos if f.endswith(PHOTO_EXTENSIONS) and os.path.splitext(f)[0] == target), None)
+    if photo is None:
+        raise ValueError(f"no photo of {target} in {faces_dir} for the simulated drones to show")
+    return target, photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drones", nargs="*", default=[], help="IP addresses of Tellos in station mode")
+    parser.add_argument("--video-ports", nargs="*", type=int, default=[],
+                        help="local port each drone streams to (default 11111, 11112, ...)")
+    parser.add_argument("--simulate", type=int, default=0, help="number of simulated drones on 127.0.0.2, ...")
+    parser.add_argument("--faces", default="faces")
+    parser.add_argument("--encoder", default="dlib-large", help='an encoder name, or "remote" for the inference service')
+    parser.add_argument("--workers", type=int, default=2,
+                        help="recognition threads; encoders sharing their models, like dlib's, use one")
+    parser.add_argument("--target", help="gallery name the simulated drones show and follow")
+    parser.add_argument("--tiles", type=parse_tiles,
+                        help="detect on the full-size frame cut into COLUMNSxROWS tiles, e.g. 2x2, for far-away faces")
+    parser.add_argument("--tile-workers", type=int, help="processes detecting on the tiles (default one per core)")
+    parser.add_argument("--headless", action="store_true", help="print stats instead of opening a window")
+    parser.add_argument("--duration", type=float, default=30.0, help="headless run time in seconds")
+    args = parser.parse_args()
+    if not args.drones and not args.simulate:
+        parser.error("give --drones or --simulate")
+
+    recognition = FaceRecognition(args.faces, args.encoder, load=False)
+    if args.tiles:
+        recognition.set_tiled_detection(TiledDetector(args.tiles, workers=args.tile_workers))
+    recognition.load_in_background()
+    pool = InferencePool(recognition, args.workers).start()
+
+    if args.simulate:
+        try:
+            target, photo = simulation_target(recognition, args.faces, args.target)
+        except ValueError as e:
+            pool.stop()
+            if recognition.tiled_detector is not None:
+                recognition.tiled_detector.stop()
+            parser.error(str(e))
+
+    streams = []
+    for i, host in enumerate(args.drones):
+        from djitellopy import Tello
+        from drone_link import DroneLink
+        video_port = args.video_ports[i] if i < len(args.video_ports) else 11111 + i
+        # Tiled detection wants the drone's own 960x720 frames
+        link = DroneLink(Tello(host, vs_udp=video_port), video_port=video_port,
+                         frame_size=None if args.tiles else (720, 480)).start()
+        streams.append(DroneStream(host, link, AsyncTelloClient(host).start(), pool))
+
+    simulated = []
+    if args.simulate:
+        from simulator import SimulatedTello, photo_face
+        face = photo_face(os.path.join(args.faces, photo), recognition.encoder)
+        for i in range(args.simulate):
+            host = f"127.0.0.{i + 2}"
+            # Close enough that the face is still detectable in the quarter-size frame, and a slow
+            # enough walker that it is still in view by the time the drone is up
+            drone = SimulatedTello(host, face, frame_size=TELLO_FRAME_SIZE if args.tiles else (720, 480),
+                                   start_distance=100, target_speed=15, seed=i).start()
+            simulated.append(drone)
+            follower = PredictiveFollower(frame_size=(720, 480), desired_face_width=160)
+            stream = DroneStream(f"sim-{i + 1}", drone, AsyncTelloClient(host).start(), pool, follower=follower)
+            stream.recognition.lock_face(target)
+            streams.append(stream)
+
+    for stream in streams:
+        stream.start()
+
+    if args.headless:
+        for stream in streams:
+            stream.client.takeoff()
+        end = time.time() + args.duration
+        while time.time() < end:
+            time.sleep(min(5.0, max(0.0, end - time.time())))
+            for stream in streams:
+                print(f"{stream.name}: {stream.slot.stats.summary()}")
+            for drone in simulated:
+                error = drone.simulator.tracking_error()
+                print(f"  {drone.address[0]}: target {'out of view' if error is None else f'{error:.0f} px off centre'}")
+    else:
+        MultiDroneController(streams, recognition).run_app()
+
+    for stream in streams:
+        stream.stop()
+    # Land whatever is still in the air and wait for the replies before the drones and clients go away
+    landings = [(stream, stream.client.land()) for stream in streams if stream.client.is_flying]
+    for stream, landing in landings:
+        try:
+            landing.result(timeout=LAND_WAIT)
+        except Exception as e:
+            print(f"{stream.name}: error landing: {e}")
+    pool.stop()
+    if recognition.tiled_detector is not None:
+        recognition.tiled_detector.stop()
+    for stream in streams:
+        stream.client.stop()
+    for drone in simulated:
+        drone.stop()
+
+
+if __name__ == "__main__":
+    main()
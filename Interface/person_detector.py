@@ -0,0 +1,135 @@
+"""
+Person detection for following the locked target beyond face range.
+
+Faces are detected on a quarter-size copy of the frame, where the face of
+someone a few metres away is a handful of pixels and is no longer found, just
+when the follower needs it. A person is about fourteen times as tall as their
+face is wide, so OpenCV's HOG people detector still finds them long after the
+face is lost. PersonDetector runs it
+
+  - near the target: on the region around where the person below the last
+    known face box must be, resized so that they come out a little taller than
+    the detector window, a few milliseconds however far away they are;
+  - over the whole frame at a coarse scale, once every scan_interval calls,
+    when there is no last position to look around.
+
+FaceRecognition then looks for the face only in the head region of each person
+found, upscaled (head_crop), and only when the face is wide enough to be
+recognised; otherwise the face box inferred from the person box stands in for
+it and keeps the person's track, and the identity cached on it, alive.
+"""
+
+import cv2
+import numpy as np
+
+# Height of the HOG window; people are found from this size up
+WINDOW_HEIGHT = 128
+# Width of the face and its top below the top of the box, as fractions of the height of a HOG person box
+FACE_WIDTH, FACE_TOP = 1 / 14, 0.155
+
+
+def face_box(person_box):
+    """(top, right, bottom, left) where the face of a (top, right, bottom, left) person box is"""
+    top, right, bottom, left = person_box
+    height = bottom - top
+    width = height * FACE_WIDTH
+    centre = (left + right) / 2
+    face_top = top + height * FACE_TOP
+    return int(face_top), int(centre + width / 2), int(face_top + width), int(centre - width / 2)
+
+
+def person_box(face_box):
+    """The person box below a face box; the inverse of face_box()"""
+    top, right, bottom, left = face_box
+    height = (right - left) / FACE_WIDTH
+    centre = (left + right) / 2
+    person_top = top - height * FACE_TOP
+    return int(person_top), int(centre + height / 4), int(person_top + height), int(centre - height / 4)
+
+
+class PersonDetector:
+    def __init__(self, scale=0.75, scan_interval=10, hit_threshold=0.0, pyramid_scale=1.1, min_face_width=16,
+                 head_face_width=40):
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        # Size of the copy of the frame searched when there is no last position
+        self.scale = scale
+        # Search the whole frame on one call in this many; a full search costs as much as several frames
+        self.scan_interval = scan_interval
+        self._calls_since_scan = scan_interval
+        # SVM margin a window needs to count as a person
+        self.hit_threshold = hit_threshold
+        self.pyramid_scale = pyramid_scale
+        # Narrowest face (full-frame pixels) worth looking for in the head crop, and the width it is upscaled to
+        self.min_face_width = min_face_width
+        self.head_face_width = head_face_width
+        # Searches run, and how many found somebody
+        self.searches = 0
+        self.found = 0
+
+    def detect(self, frame, near=None):
+        """
+        Person boxes (top, right, bottom, left) in a BGR frame, most confident
+        first. `near` is a face box of where the target was last seen, in
+        pixels of the frame.
+        """
+        height, width = frame.shape[:2]
+        if near is None:
+            self._calls_since_scan += 1
+            if self._calls_since_scan < self.scan_interval:
+                return []
+            self._calls_since_scan = 0
+            boxes = self._detect(frame, (0, width, height, 0), self.scale)
+        else:
+            top, right, bottom, left = person_box(near)
+            person_height = bottom - top
+            centre = (left + right) // 2
+            # Room to have moved a body width either way, or to have come a fifth closer
+            region = (top - person_height // 4, centre + person_height, bottom + person_height // 4,
+                      centre - person_height)
+            # The person a quarter taller than the window, so they are found if they come closer as well
+            boxes = self._detect(frame, region, min(3.0, 1.25 * WINDOW_HEIGHT / max(1, person_height)))
+        self.searches += 1
+        self.found += bool(boxes)
+        return boxes
+
+    def _detect(self, frame, region, scale):
+        height, width = frame.shape[:2]
+        top, right, bottom, left = region
+        top, right, bottom, left = max(0, top), min(width, right), min(height, bottom), max(0, left)
+        # Too little of the region in the frame to hold a detector window
+        if (right - left) * scale < WINDOW_HEIGHT / 2 or (bottom - top) * scale < WINDOW_HEIGHT:
+            return []
+        image = cv2.resize(frame[top:bottom, left:right], None, fx=scale, fy=scale)
+        # The window has a margin around the person; repeat the edges, so people cut off by the frame are found too
+        pad = WINDOW_HEIGHT // 8
+        image = cv2.copyMakeBorder(image, pad, pad, pad, pad, cv2.BORDER_REPLICATE)
+        rects, weights = self.hog.detectMultiScale(image, hitThreshold=self.hit_threshold, winStride=(8, 8),
+                                                   scale=self.pyramid_scale)
+        if len(rects) == 0:
+            return []
+        order = np.argsort(-np.asarray(weights).ravel())
+        boxes = []
+        for x, y, w, h in (np.asarray(rects)[order] - (pad, pad, 0, 0)) / scale:
+            boxes.append((int(top + y), int(left + x + w), int(top + y + h), int(left + x)))
+        return boxes
+
+    def head_crop(self, frame, person_box):
+        """
+        (crop, factor, (top, left)): the head region of a person box, upscaled
+        `factor` times so the face is head_face_width wide, and where it was cut
+        from; None if the face is too small to be recognised.
+        """
+        top, right, bottom, left = face_box(person_box)
+        width = right - left
+        if width < self.min_face_width:
+            return None
+        height, frame_width = frame.shape[:2]
+        # A face width all round, for the detector to see the whole head
+        top, bottom = max(0, top - width), min(height, bottom + width)
+        left, right = max(0, left - width), min(frame_width, right + width)
+        if bottom - top < width or right - left < width:
+            return None
+        factor = max(1.0, self.head_face_width / width)
+        crop = cv2.resize(frame[top:bottom, left:right], None, fx=factor, fy=factor)
+        return crop, factor, (top, left)
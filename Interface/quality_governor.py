@@ -0,0 +1,205 @@
+"""
+Adaptive quality governor for the video loop.
+
+The display size, the detection scale, how often faces are detected and how
+often the window refreshes used to be fixed constants, tuned for one laptop.
+On a slower machine the loop falls behind and the video the follower steers on
+gets older; on a faster one cycles are wasted. The governor measures the
+end-to-end latency (frame arrival to display) and the process CPU use once a
+second and moves along a ladder of quality profiles to hold a configured
+budget:
+
+  - over budget, it steps down to a cheaper profile straight away;
+  - comfortably under budget for a few seconds, it steps back up one profile.
+
+Each profile sets the detection interval, the detection scale, the display
+rate and optionally the face encoder, where the pipeline can switch it. While
+the drone is on the ground it switches to a low-power profile and returns to
+where it was on takeoff. Every adjustment is printed and kept in `log`.
+
+    governor = QualityGovernor(recognition, target_latency=0.15)
+    ...every repaint...
+    governor.record_frame(arrival)   # perf_counter() time the frame arrived
+    governor.update(flying)
+    frame_signal.min_interval = governor.display_interval
+"""
+
+import time
+from collections import deque
+
+
+class QualityProfile:
+    def __init__(self, name, detection_interval=1, detection_scale=0.25, display_fps=30, encoder=None):
+        self.name = name
+        # Detect faces on every n-th displayed frame
+        self.detection_interval = detection_interval
+        # Size of the detection frame relative to the displayed one; smaller is faster but misses distant faces
+        self.detection_scale = detection_scale
+        self.display_fps = display_fps
+        # Face encoder to switch to, or None for the one the pipeline started with
+        self.encoder = encoder
+
+    def __repr__(self):
+        encoder = f", {self.encoder}" if self.encoder else ""
+        return (f"{self.name} (detect every {self.detection_interval}, scale {self.detection_scale:g}, "
+                f"{self.display_fps} fps{encoder})")
+
+
+# From the most to the least expensive; the governor starts at "standard", the old fixed settings
+DEFAULT_LADDER = (
+    QualityProfile("sharp", detection_interval=1, detection_scale=0.33, display_fps=30),
+    QualityProfile("standard", detection_interval=1, detection_scale=0.25, display_fps=30),
+    QualityProfile("balanced", detection_interval=2, detection_scale=0.25, display_fps=30),
+    QualityProfile("light", detection_interval=3, detection_scale=0.25, display_fps=20),
+    QualityProfile("minimal", detection_interval=4, detection_scale=0.2, display_fps=15, encoder="dlib-small"),
+)
+
+# Nothing to follow on the ground, but the operator still wants to see the video and pick a face.
+# Landing never changes the encoder, since rebuilding the gallery for it takes seconds.
+LANDED_PROFILE = QualityProfile("landed", detection_interval=6, detection_scale=0.25, display_fps=10)
+
+
+class QualityGovernor:
+    def __init__(self, recognition=None, target_latency=0.15, cpu_budget=0.9, ladder=DEFAULT_LADDER,
+                 landed_profile=LANDED_PROFILE, start="standard", interval=1.0, headroom=0.7, step_up_after=3,
+                 max_step_up_after=60, settle=2):
+        # FaceRecognition to tune; None to only govern the display rate
+        self.recognition = recognition
+        # Frame arrival to display, in seconds. Judged on the slowest frame of each interval: with the
+        # motion gate and the tracker most frames skip the expensive work, so a percentile hides the ones that do not
+        self.target_latency = target_latency
+        # Process CPU time per wall second, all threads together (1.0 is one full core); None to ignore
+        self.cpu_budget = cpu_budget
+        self.ladder = list(ladder)
+        self.landed_profile = landed_profile
+        # Seconds between decisions
+        self.interval = interval
+        # Step up only while both measurements are below this fraction of their budget...
+        self.headroom = headroom
+        # ...for this many decisions in a row. Doubled (up to max_step_up_after) whenever a step up has
+        # to be taken back soon after, so a profile that is only just too expensive is not retried every few seconds
+        self.step_up_after = step_up_after
+        self.max_step_up_after = max_step_up_after
+        # Decisions skipped after a change, while the measurements still describe the old profile
+        self.settle = settle
+
+        # Encoder the pipeline loaded, and whether profiles may change it; both known once recognition is ready, as the
+        # inference service names its own model and gallery stores and shared pipelines cannot switch
+        self.base_encoder = None
+        self.switches_encoder = False
+        self.level = next(i for i, p in enumerate(self.ladder) if p.name == start)
+        self.profile = None
+        self.landed = False
+        # (time, from, to, reason) of every adjustment
+        self.log = []
+        self.latencies = deque(maxlen=1000)
+        self._last_arrival = None
+        self._calm = 0
+        self._required_calm = step_up_after
+        # Decisions since the last step up
+        self._since_step_up = None
+        self._settling = 0
+        self._window_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._apply(self.ladder[self.level], "start")
+
+    def record_frame(self, arrival):
+        """Call after a frame is displayed with the perf_counter() time it arrived; repeats are ignored"""
+        if arrival is None or arrival == self._last_arrival:
+            return
+        self._last_arrival = arrival
+        self.latencies.append(time.perf_counter() - arrival)
+
+    @property
+    def display_interval(self):
+        """Shortest time between two repaints, in seconds"""
+        return 1.0 / self.profile.display_fps
+
+    def measure(self):
+        """(worst latency, CPU fraction) since the last call, and start a new window"""
+        now, cpu = time.perf_counter(), time.process_time()
+        cpu_fraction = (cpu - self._cpu_start) / max(1e-6, now - self._window_start)
+        latency = max(self.latencies) if self.latencies else None
+        self.latencies.clear()
+        self._window_start, self._cpu_start = now, cpu
+        return latency, cpu_fraction
+
+    def update(self, flying=True):
+        """Call every tick; adjusts the profile at most once per interval"""
+        if time.perf_counter() - self._window_start < self.interval:
+            return
+        latency, cpu = self.measure()
+        measured = f"latency {'-' if latency is None else f'{latency * 1000:.0f} ms'}, CPU {cpu:.0%}"
+        if self.base_encoder is None and self.recognition is not None and self.recognition.ready.is_set():
+            self.base_encoder = self.recognition.encoder_name
+            self.switches_encoder = self.recognition.can_switch_encoder
+            if self.switches_encoder and not self.landed:
+                # A profile applied before recognition was ready
+                self.recognition.switch_encoder(self.profile.encoder or self.base_encoder)
+
+        if not flying and self.landed_profile is not None:
+            if not self.landed:
+                self.landed = True
+                self._apply(self.landed_profile, f"landed; {measured}", keep_encoder=True)
+            return
+        if self.landed:
+            self.landed = False
+            self._apply(self.ladder[self.level], f"took off; {measured}")
+            return
+        if self._since_step_up is not None:
+            self._since_step_up += 1
+            if self._since_step_up > 2 * self.max_step_up_after:
+                # Stable for long enough that conditions have probably changed
+                self._since_step_up = None
+                self._required_calm = self.step_up_after
+        if self.recognition is not None and self.recognition.switching_encoder:
+            # Re-encoding the gallery takes the CPU and the models for a while; judge the result afterwards
+            self._settling = self.settle
+            return
+        if self._settling:
+            self._settling -= 1
+            return
+
+        over_latency = latency is not None and latency > self.target_latency
+        over_cpu = self.cpu_budget is not None and cpu > self.cpu_budget
+        if over_latency or over_cpu:
+            self._calm = 0
+            if self.level < len(self.ladder) - 1:
+                if self._since_step_up is not None and self._since_step_up <= 2 * self._required_calm:
+                    self._required_calm = min(2 * self._required_calm, self.max_step_up_after)
+                self.level += 1
+                reason = "over the latency target" if over_latency else "over the CPU budget"
+                self._apply(self.ladder[self.level], f"{reason}; {measured}{self._stage_times()}")
+            return
+
+        required = self._required_calm
+        if self.profile.encoder is not None and self.switches_encoder:
+            # Switching back costs another gallery rebuild, so only leave once it is clearly not needed
+            required = self.max_step_up_after
+        calm = ((latency is None or latency < self.target_latency * self.headroom)
+                and (self.cpu_budget is None or cpu < self.cpu_budget * self.headroom))
+        self._calm = self._calm + 1 if calm else 0
+        if self._calm >= required and self.level > 0:
+            self._calm = 0
+            self._since_step_up = 0
+            self.level -= 1
+            self._apply(self.ladder[self.level], f"headroom; {measured}")
+
+    def _stage_times(self):
+        if self.recognition is None:
+            return ""
+        times = self.recognition.stage_times
+        return f", detect {times['detect'] * 1000:.0f} ms, encode {times['encode'] * 1000:.0f} ms"
+
+    def _apply(self, profile, reason, keep_encoder=False):
+        previous, self.profile = self.profile, profile
+        self._settling = self.settle
+        recognition = self.recognition
+        if recognition is not None:
+            recognition.detection_interval = profile.detection_interval
+            recognition.set_detection_scale(profile.detection_scale)
+            if not keep_encoder and self.switches_encoder:
+                recognition.switch_encoder(profile.encoder or self.base_encoder)
+        self.latencies.clear()
+        self.log.append((time.time(), previous.name if previous else None, profile.name, reason))
+        print(f"Quality: {previous.name if previous else '-'} -> {profile!r}: {reason}")
@@ -0,0 +1,94 @@
+"""
+int8 index for two-stage gallery matching.
+
+With a large gallery, matching one face means streaming the whole float
+encoding matrix through memory. The index keeps an int8 copy instead (one
+scale per dimension, a quarter of the float32 size) plus the exact squared
+norm of every row. A coarse pass over the int8 codes ranks the gallery by
+approximate distance, and only the best k candidates are re-ranked with the
+encoder's exact distance on the float rows, so the answer is exact whenever
+the true best match survives the coarse pass.
+"""
+
+import numpy as np
+
+
+class Int8Index:
+    def __init__(self, codes, scales, squared_norms, metric="l2"):
+        if metric not in ("l2", "cosine"):
+            raise ValueError(f"Unknown metric '{metric}', expected 'l2' or 'cosine'")
+        self.codes = codes
+        self.scales = scales
+        self.squared_norms = squared_norms
+        self.metric = metric
+
+    @classmethod
+    def build(cls, chunks, metric="l2"):
+        """
+        Quantize encodings given as a list of float matrices (a gallery's rows in
+        order, e.g. the segments of a GalleryStore).
+        """
+        chunks = [np.asarray(chunk) for chunk in chunks if len(chunk)]
+        if not chunks:
+            return cls(np.empty((0, 0), dtype=np.int8), np.ones(0, dtype=np.float32), np.empty(0, dtype=np.float32),
+                       metric)
+
+        # Symmetric per-dimension scale, so every dimension uses the full int8 range
+        max_abs = np.max([np.abs(chunk).max(axis=0) for chunk in chunks], axis=0).astype(np.float32)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+        codes = np.empty((sum(len(chunk) for chunk in chunks), len(scales)), dtype=np.int8)
+        squared_norms = np.empty(len(codes), dtype=np.float32)
+        start = 0
+        for chunk in chunks:
+            for first in range(0, len(chunk), 65536):
+                rows = np.asarray(chunk[first:first + 65536], dtype=np.float32)
+                end = start + len(rows)
+                codes[start:end] = np.clip(np.rint(rows / scales), -127, 127)
+                squared_norms[start:end] = np.einsum("ij,ij->i", rows, rows)
+                start = end
+        return cls(codes, scales, squared_norms, metric)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes + self.squared_norms.nbytes
+
+    def coarse_scores(self, encoding, start=0, end=None):
+        """Approximate distance ranking (lower is closer) of rows start:end to `encoding`"""
+        # Folding the scales into the query gives the dot products without dequantizing the gallery
+        query = (np.asarray(encoding, dtype=np.float32) * self.scales).astype(np.float32)
+        dots = self.codes[start:end].astype(np.float32) @ query
+        if self.metric == "cosine":
+            return -dots
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, and |q|^2 is the same for every row
+        return self.squared_norms[start:end] - 2.0 * dots
+
+    def candidates(self, encoding, k, chunk_rows=16384):
+        """Indices of the k rows the coarse pass ranks closest to `encoding`"""
+        if len(self) <= k:
+            return np.arange(len(self))
+        best_indices = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        # Small chunks keep the float32 conversion in cache
+        for start in range(0, len(self), chunk_rows):
+            scores = np.concatenate([best_scores, self.coarse_scores(encoding, start, start + chunk_rows)])
+            indices = np.concatenate([best_indices, np.arange(start, min(start + chunk_rows, len(self)))])
+            keep = np.argpartition(scores, k - 1)[:k] if len(scores) > k else slice(None)
+            best_scores, best_indices = scores[keep], indices[keep]
+        return best_indices
+
+
+def two_stage_match(index, rows, encoder, encoding, k=32):
+    """
+    (index, distance) of the best match: the int8 index picks k candidates and
+    `rows(indices)` fetches their float encodings for the exact distance.
+    """
+    if len(index) == 0:
+        return None, None
+    candidates = np.sort(index.candidates(encoding, k))
+    distances = encoder.distance(rows(candidates), encoding)
+    best = int(np.argmin(distances))
+    return int(candidates[best]), float(distances[best])
@@ -0,0 +1,337 @@
+"""
+Kinematic Tello simulator for testing the follow loop without a drone.
+
+A person walks around a flat room while a simulated drone responds to RC
+commands with a first-order velocity lag. The camera is a pinhole with the
+same focal length the controllers use for their distance estimate, so the
+face boxes it produces behave like the real ones. Boxes reach the controller
+late, after a configurable video latency and recognition time, which is what
+the predictive follower has to compensate for.
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from frame_sources import FrameSource
+
+
+class FollowSimulator:
+    def __init__(self, frame_size=(720, 480), focal_length=800, face_width=16, video_latency=0.2,
+                 processing_time=0.1, response_time=0.3, target_speed=40, start_distance=200, seed=0,
+                 turn_away_every=None, turn_away_for=2.0, dash_every=None, dash_for=1.0, dash_speed=200):
+        self.frame_size = frame_size
+        self.focal_length = focal_length
+        self.face_width = face_width
+        self.video_latency = video_latency
+        self.processing_time = processing_time
+        self.response_time = response_time
+        self.target_speed = target_speed
+        # The person turns their back to the camera for turn_away_for seconds out of every turn_away_every
+        self.turn_away_every = turn_away_every
+        self.turn_away_for = turn_away_for
+        # ...and runs across the camera's view at dash_speed cm/s for dash_for seconds out of every dash_every
+        self.dash_every = dash_every
+        self.dash_for = dash_for
+        self.dash_speed = dash_speed
+        self._dash_heading = None
+        self.rng = np.random.default_rng(seed)
+
+        self.time = 0.0
+        # Drone: position in cm, height in cm, heading in degrees (counter-clockwise) and velocity
+        self.drone_position = np.zeros(2)
+        self.drone_height = 150.0
+        self.drone_heading = 0.0
+        self.drone_velocity = np.zeros(4)
+        self.rc = np.zeros(4)
+
+        # Person: starts in front of the drone (2 m by default), face 1.7 m above the floor
+        self.target_position = np.array([float(start_distance), 0.0])
+        self.target_height = 170.0
+        self.target_heading = self.rng.uniform(0, 2 * np.pi)
+
+        # (capture time, box) of frames still on their way to the controller
+        self.in_flight = []
+        self.next_result_time = 0.0
+
+    def send_rc_control(self, left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity):
+        self.rc = np.array([left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity], dtype=float)
+
+    def target_box(self):
+        """Current (top, right, bottom, left) of the face in the camera image, or None if it is out of view"""
+        heading = np.radians(self.drone_heading)
+        forward_axis = np.array([np.cos(heading), np.sin(heading)])
+        right_axis = np.array([np.sin(heading), -np.cos(heading)])
+        offset = self.target_position - self.drone_position
+        forward = offset @ forward_axis
+        if forward < 30:
+            return None
+
+        right = offset @ right_axis
+        up = self.target_height - self.drone_height
+        x = self.frame_size[0] / 2 + self.focal_length * right / forward
+        y = self.frame_size[1] / 2 - self.focal_length * up / forward
+        half = self.focal_length * self.face_width / forward / 2
+        if not (0 <= x < self.frame_size[0] and 0 <= y < self.frame_size[1]):
+            return None
+        return int(y - half), int(x + half), int(y + half), int(x - half)
+
+    @property
+    def facing_camera(self):
+        if not self.turn_away_every:
+            return True
+        return self.time % self.turn_away_every < self.turn_away_every - self.turn_away_for
+
+    @property
+    def dashing(self):
+        if not self.dash_every:
+            return False
+        return self.time % self.dash_every >= self.dash_every - self.dash_for
+
+    def step(self, dt):
+        """Advance the world by dt seconds"""
+        self.time += dt
+
+        if self.dashing:
+            if self._dash_heading is None:
+                # Sideways to the camera, to either side
+                self._dash_heading = np.radians(self.drone_heading) + self.rng.choice((-1, 1)) * np.pi / 2
+            heading, speed = self._dash_heading, self.dash_speed
+        else:
+            self._dash_heading = None
+            # The person wanders with a slowly turning heading
+            self.target_heading += self.rng.normal(0, 0.8) * dt
+            heading, speed = self.target_heading, self.target_speed
+        self.target_position += speed * dt * np.array([np.cos(heading), np.sin(heading)])
+
+        # The drone's velocity follows the RC command with a first-order lag
+        self.drone_velocity += (self.rc - self.drone_velocity) * (1 - np.exp(-dt / self.response_time))
+        lr, fb, ud, yaw = self.drone_velocity
+        heading = np.radians(self.drone_heading)
+        self.drone_position += dt * (fb * np.array([np.cos(heading), np.sin(heading)])
+                                     + lr * np.array([np.sin(heading), -np.cos(heading)]))
+        self.drone_height += ud * dt
+        # Positive yaw turns the drone clockwise
+        self.drone_heading -= yaw * dt
+
+        box = self.target_box()
+        self.in_flight.append((self.time, box))
+
+    def recognition_result(self):
+        """
+        Return (frame_time, box) when a recognition pass finishes at the current
+        time, like the controller's video_stream would see it, otherwise None.
+        frame_time is when the frame reached the GCS, video_latency after capture.
+        """
+        if self.time < self.next_result_time:
+            return None
+        self.next_result_time = self.time + self.processing_time
+
+        # The newest frame that had arrived when this pass started
+        arrived_by = self.time - self.processing_time - self.video_latency
+        frames = [f for f in self.in_flight if f[0] <= arrived_by]
+        if not frames:
+            return None
+        self.in_flight = [f for f in self.in_flight if f[0] > arrived_by - 1.0]
+        capture_time, box = frames[-1]
+        return capture_time + self.video_latency, box
+
+    def tracking_error(self):
+        """Distance in pixels between the face and the image centre right now, or None if out of view"""
+        box = self.target_box()
+        if box is None:
+            return None
+        top, right, bottom, left = box
+        return np.hypot((left + right) / 2 - self.frame_size[0] / 2, (top + bottom) / 2 - self.frame_size[1] / 2)
+
+
+def run_follow(follower, duration=60.0, dt=1 / 30, **simulator_args):
+    """Fly a follower against the simulator and return (mean error px, commands per second, time in view)"""
+    simulator = FollowSimulator(**simulator_args)
+    errors = []
+    for _ in range(int(duration / dt)):
+        simulator.step(dt)
+        result = simulator.recognition_result()
+        if result is not None:
+            frame_time, box = result
+            if box is not None:
+                rc = follower.update(box, frame_time, simulator.time)
+            else:
+                rc = follower.lost(simulator.time)
+            if rc is not None:
+                simulator.send_rc_control(*rc)
+
+        error = simulator.tracking_error()
+        if error is not None:
+            errors.append(error)
+
+    mean_error = float(np.mean(errors)) if errors else float("nan")
+    return mean_error, follower.commands_sent / duration, len(errors) * dt / duration
+
+
+class SimulatedTello(FrameSource):
+    """
+    A FollowSimulator behind a Tello-like UDP command port, for running the GCS
+    against several drones on one machine. Each instance listens on its own
+    loopback address (127.0.0.2, 127.0.0.3, ...), like Tellos in station mode on
+    distinct IPs: SDK commands are answered with 'ok' and 'rc' commands drive
+    the simulated drone. Video frames are rendered in-process with a face photo
+    pasted at the target's position on a plain figure, and handed out
+    video_latency late; they are not streamed as H.264. A frame source like
+    DroneLink.
+    """
+
+    def __init__(self, host, face_image, port=8889, fps=30, frame_size=(720, 480), face_margin=0.3,
+                 torso_colour=(60, 60, 190), on_frame=None, **simulator_args):
+        super().__init__(on_frame)
+        self.address = (host, port)
+        self.host = host
+        self.status = "Starting the simulator..."
+        self.face_image = face_image
+        self.fps = fps
+        self.frame_size = frame_size
+        # Fraction of the face box the photo extends beyond it on each side
+        self.face_margin = face_margin
+        # BGR colour of the person's top, and of the back of their head while they are turned away
+        self.torso_colour = torso_colour
+        self.hair_colour = (30, 40, 50)
+        self.legs_colour = (70, 50, 40)
+        self.simulator = FollowSimulator(frame_size=frame_size, **simulator_args)
+        self.is_flying = False
+        self.commands = 0
+        self._frames = deque()
+        # (frame, arrival) read() hands out: the one captured video_latency ago, and when it became due
+        self._latest = (None, None)
+        self._lock = threading.Lock()
+        self._running = False
+        self._socket = None
+        rng = np.random.default_rng(simulator_args.get("seed", 0))
+        # Static textured background, so the motion gate sees only the face move
+        self._background = cv2.GaussianBlur(rng.integers(60, 200, (frame_size[1], frame_size[0], 3), dtype=np.uint8),
+                                            (0, 0), 3)
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(self.address)
+        self._socket.settimeout(0.5)
+        self._running = True
+        threading.Thread(target=self._serve, daemon=True).start()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._socket is not None:
+            self._socket.close()
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, sender = self._socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            command = data.decode("utf-8", errors="ignore").strip()
+            self.commands += 1
+            if command.startswith("rc "):
+                # RC commands get no reply
+                if self.is_flying:
+                    self.simulator.send_rc_control(*[float(v) for v in command.split()[1:5]])
+                continue
+            if command == "takeoff":
+                self.is_flying = True
+            elif command in ("land", "emergency"):
+                self.is_flying = False
+                self.simulator.send_rc_control(0, 0, 0, 0)
+            self._socket.sendto(b"ok", sender)
+
+    def _run(self):
+        dt = 1.0 / self.fps
+        while self._running:
+            started = time.time()
+            self.simulator.step(dt)
+            # Frames are rendered here rather than handed out by recognition_result
+            self.simulator.in_flight.clear()
+            with self._lock:
+                self._frames.append((started, self.render()))
+                # Keep just enough frames to hand them out video_latency late
+                while len(self._frames) > 1 and started - self._frames[1][0] >= self.simulator.video_latency:
+                    self._frames.popleft()
+                front = self._frames[0]
+            if started - front[0] >= self.simulator.video_latency and front[1] is not self._latest[0]:
+                self._latest = (front[1], time.perf_counter())
+                self.ready.set()
+                self._notify()
+            time.sleep(max(0.0, dt - (time.time() - started)))
+
+    def render(self):
+        frame = self._background.copy()
+        box = self.simulator.target_box()
+        if box is None:
+            return frame
+        top, right, bottom, left = box
+        width = right - left
+        centre = (left + right) // 2
+
+        def figure_part(points, colour):
+            # Polygon in face widths from the middle of the chin
+            cv2.fillPoly(frame, [np.array([(centre + x * width, bottom + y * width) for x, y in points], np.int32)],
+                         colour)
+
+        # A person about ten faces tall, so the people detector finds them: a top from the shoulders to the hips with
+        # the arms at its sides, three faces wide in all, and legs down to the floor
+        figure_part([(-1.1, 0.3), (1.1, 0.3), (0.95, 4), (-0.95, 4)], self.torso_colour)
+        for side in (-1, 1):
+            figure_part([(side * 1.15, 0.35), (side * 1.45, 0.7), (side * 1.5, 3.9), (side * 1.2, 3.9),
+                         (side * 1.15, 1.0)], self.torso_colour)
+            figure_part([(side * 0.95, 4), (side * 0.06, 4), (side * 0.2, 9), (side * 0.8, 9)], self.legs_colour)
+        # The hair around the face, and all there is to see of the head while they are turned away
+        cv2.ellipse(frame, (centre, (top + bottom) // 2 - width // 8), (width * 7 // 10, width * 9 // 10), 0, 0, 360,
+                    self.hair_colour, cv2.FILLED)
+        if not self.simulator.facing_camera:
+            return frame
+        margin = int(width * self.face_margin)
+        top, right, bottom, left = top - margin, right + margin, bottom + margin, left - margin
+        if right - left < 4:
+            return frame
+        face = cv2.resize(self.face_image, (right - left, bottom - top))
+        # Only the oval of the head, not the photo's background around it
+        mask = np.zeros(face.shape[:2], dtype=np.uint8)
+        cv2.ellipse(mask, (face.shape[1] // 2, face.shape[0] // 2), (width * 3 // 5, width * 3 // 4), 0, 0, 360, 255,
+                    cv2.FILLED)
+        # Clip the photo to the frame
+        y0, x0 = max(0, top), max(0, left)
+        y1, x1 = min(self.frame_size[1], bottom), min(self.frame_size[0], right)
+        if y1 > y0 and x1 > x0:
+            region = frame[y0:y1, x0:x1]
+            inside = mask[y0 - top:y1 - top, x0 - left:x1 - left] > 0
+            region[inside] = face[y0 - top:y1 - top, x0 - left:x1 - left][inside]
+        return frame
+
+    def read(self):
+        return self._latest
+
+
+def photo_face(photo_path, encoder=None, margin=0.3):
+    """
+    The first face in a photo with `margin` of its size around it, for the
+    simulated drones to show. Found with the recognition encoder if one is
+    given, otherwise with OpenCV's Haar cascade.
+    """
+    image = cv2.imread(photo_path)
+    if image is None:
+        raise FileNotFoundError(photo_path)
+    if encoder is not None:
+        locations = encoder.locate(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    else:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        locations = [(y, x + w, y + h, x) for x, y, w, h in cascade.detectMultiScale(grey, 1.1, 5, minSize=(30, 30))]
+    if len(locations) == 0:
+        raise ValueError(f"No face found in {photo_path}")
+    top, right, bottom, left = locations[0]
+    pad = int((right - left) * margin)
+    return image[max(0, top - pad):bottom + pad, max(0, left - pad):right + pad]
@@ -0,0 +1,54 @@
+"""
+Startup time accounting for the GCS.
+
+Stages are recorded as they finish, from whichever thread runs them, and the
+breakdown is printed once every expected stage has been seen.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Stages a full GCS startup goes through, in the order they are reported
+STARTUP_STAGES = ("window", "import", "model load", "gallery load", "warm-up", "first frame")
+# Stages of the drone link bring-up (see drone_link.py), which runs alongside them
+LINK_STAGES = ("connect", "stream on", "drone frame")
+
+
+class StartupTimer:
+    def __init__(self, expected=STARTUP_STAGES):
+        self.started = time.perf_counter()
+        self.expected = tuple(expected)
+        # stage -> (duration in seconds, seconds since start when it finished)
+        self.stages = {}
+        self.reported = False
+        self._lock = threading.Lock()
+
+    def mark(self, stage, duration=None):
+        """Record a finished stage; without a duration it counts from startup"""
+        since_start = time.perf_counter() - self.started
+        with self._lock:
+            self.stages[stage] = (since_start if duration is None else duration, since_start)
+            done = not self.reported and all(s in self.stages for s in self.expected)
+            if done:
+                self.reported = True
+        if done:
+            self.report()
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        yield
+        self.mark(stage, time.perf_counter() - start)
+
+    def elapsed(self, stage):
+        """Seconds from startup until the stage finished, or None if it has not yet"""
+        with self._lock:
+            return self.stages[stage][1] if stage in self.stages else None
+
+    def report(self):
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1][1])
+        print("Startup time breakdown:")
+        for stage, (duration, since_start) in stages:
+            print(f"  {stage:<14}{duration * 1000:>8.0f} ms  (ready at {since_start * 1000:.0f} ms)")
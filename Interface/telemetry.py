@@ -0,0 +1,203 @@
+"""
+Tello telemetry recorder.
+
+The Tello streams a state packet (attitude, velocity, height, TOF, battery,
+...) about ten times a second. The recorder parses each packet on a background
+thread straight into a fixed-size NumPy structured ring buffer, so no Python
+object is kept per sample and the HUD and controllers read windows of recent
+samples as zero-copy views. At landing the buffer is dumped to a compressed
+columnar .npz file, one array per field.
+"""
+
+import os
+import socket
+import threading
+import time
+import cv2
+import numpy as np
+
+# One state sample. Field names follow the Tello SDK state packet, plus the
+# GCS receive time; 'flight_time' is the packet's 'time' field.
+TELEMETRY_DTYPE = np.dtype([
+    ("t", "f8"),
+    ("pitch", "i2"), ("roll", "i2"), ("yaw", "i2"),
+    ("vgx", "i2"), ("vgy", "i2"), ("vgz", "i2"),
+    ("templ", "i2"), ("temph", "i2"),
+    ("tof", "i2"), ("h", "i2"), ("bat", "i2"),
+    ("baro", "f4"), ("flight_time", "i4"),
+    ("agx", "f4"), ("agy", "f4"), ("agz", "f4"),
+])
+
+# Packet key -> column in TELEMETRY_DTYPE
+_COLUMNS = {name: i for i, name in enumerate(TELEMETRY_DTYPE.names)}
+_COLUMNS["time"] = _COLUMNS.pop("flight_time")
+
+
+class TelemetryRing:
+    """
+    Fixed-size ring of telemetry samples.
+
+    Every sample is written twice, at i and i + capacity, so the last n samples
+    are always one contiguous slice and window() can return a view instead of
+    a copy. There is a single writer; readers get read-only views.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=TELEMETRY_DTYPE)
+        self.count = 0
+
+    def append(self, sample):
+        i = self.count % self.capacity
+        self._data[i] = sample
+        self._data[i + self.capacity] = sample
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def window(self, n=None):
+        """The last n samples (all of them by default), oldest first, as a read-only view"""
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity + self.capacity
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def since(self, seconds):
+        """Samples received in the last `seconds`, as a read-only view"""
+        window = self.window()
+        start = np.searchsorted(window["t"], time.time() - seconds)
+        return window[start:]
+
+    def latest(self):
+        """The newest sample, or None before the first packet"""
+        return self.window(1)[0] if self.count else None
+
+
+class TelemetryRecorder:
+    def __init__(self, capacity=4096):
+        self.ring = TelemetryRing(capacity)
+        self.packets = 0
+        self.bad_packets = 0
+        self._socket = None
+        self._thread = None
+        self._running = False
+        # Address of the drone whose djitellopy state is tapped, see tap_djitellopy()
+        self._tapped = None
+
+    def feed(self, packet, received=None):
+        """Parse one state packet (bytes or str) into the ring"""
+        if isinstance(packet, bytes):
+            packet = packet.decode("ascii", errors="ignore")
+        fields = {}
+        for field in packet.strip().split(";"):
+            key, _, value = field.partition(":")
+            fields[key] = value
+        self.feed_state(fields, received)
+
+    def feed_state(self, state, received=None):
+        """Record one state packet already split into {key: value}, such as djitellopy's parsed state"""
+        sample = [0] * len(TELEMETRY_DTYPE.names)
+        sample[0] = time.time() if received is None else received
+        found = 0
+        for key, value in state.items():
+            column = _COLUMNS.get(key)
+            if column is not None:
+                try:
+                    sample[column] = float(value)
+                    found += 1
+                except ValueError:
+                    pass
+        if found == 0:
+            # 'ok' replies and other non-state traffic
+            self.bad_packets += 1
+            return
+        self.ring.append(tuple(sample))
+        self.packets += 1
+
+    def listen(self, port=8890, host=""):
+        """Receive state packets on our own UDP socket, on a background thread"""
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self._socket.settimeout(0.5)
+        self._running = True
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while self._running:
+            try:
+                packet, _ = self._socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.feed(packet)
+
+    def tap_djitellopy(self, drone):
+        """
+        djitellopy already owns the state port, so record the state its own
+        receiver thread stores for `drone` (a Tello) instead of binding a second
+        socket. Only that drone's packets reach this recorder; stop() removes the tap.
+        """
+        from djitellopy import tello
+        host = drone.address[0]
+        tello.drones[host] = _StateTap(tello.drones[host], self)
+        self._tapped = host
+
+    def stop(self):
+        self._running = False
+        if self._socket is not None:
+            self._socket.close()
+        if self._tapped is not None:
+            from djitellopy import tello
+            entry = tello.drones.get(self._tapped)
+            if isinstance(entry, _StateTap) and entry.recorder is self:
+                tello.drones[self._tapped] = dict(entry)
+            self._tapped = None
+
+    def dump(self, path):
+        """Write everything in the ring to a compressed columnar .npz file"""
+        window = self.ring.window()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(path, **{name: window[name] for name in TELEMETRY_DTYPE.names})
+        print(f"Saved {len(window)} telemetry samples to {path}")
+        return path
+
+    def dump_flight(self, directory="telemetry"):
+        return self.dump(os.path.join(directory, time.strftime("flight-%Y%m%d-%H%M%S.npz")))
+
+
+class _StateTap(dict):
+    """
+    One drone's entry in djitellopy's module-level `drones` dict, keyed by its
+    address. djitellopy's receiver thread stores every state packet from that
+    address in entry['state'], which this hands to the drone's recorder too.
+    """
+
+    def __init__(self, entry, recorder):
+        super().__init__(entry)
+        self.recorder = recorder
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        # Only full state packets; an empty dict is djitellopy's parse of an 'ok'
+        if key == "state" and "bat" in value:
+            self.recorder.feed_state(value)
+
+
+def draw_hud(frame, ring):
+    """Draw battery, height, TOF and ground speed in the top-right corner of the frame"""
+    sample = ring.latest()
+    if sample is None:
+        return frame
+    speed = np.sqrt(float(sample["vgx"]) ** 2 + float(sample["vgy"]) ** 2)
+    lines = [f"Battery: {sample['bat']}%", f"Height: {sample['h']} cm",
+             f"TOF: {sample['tof']} cm", f"Speed: {speed:.0f} dm/s"]
+    x = frame.shape[1] - 170
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (x, 20 + 20 * i), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 255, 255), 1)
+    return frame
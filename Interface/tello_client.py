@@ -0,0 +1,208 @@
+"""
+asyncio client for the Tello SDK command port.
+
+All commands go through one asyncio event loop running on a single background
+thread, so Tk callbacks can fire takeoff, land or flip commands without
+spawning a thread per command. The Tello answers commands in order and without
+any request id, so the client keeps exactly one command in flight, matches the
+next reply to it, and enforces a per-command timeout. After a timeout it waits
+briefly so a late reply cannot be taken as the answer to the next command.
+
+'land' and 'emergency' preempt everything still queued; 'emergency' is sent
+immediately, even while another command is in flight, and that command fails
+as preempted. RC commands get no reply and bypass the queue.
+"""
+
+import asyncio
+import itertools
+import threading
+
+TELLO_IP = "192.168.10.1"
+CONTROL_UDP_PORT = 8889
+
+# Seconds to wait for a reply, per command
+TIMEOUTS = {"command": 7.0, "takeoff": 20.0, "land": 20.0, "flip": 10.0, "emergency": 3.0}
+DEFAULT_TIMEOUT = 7.0
+# Seconds a closing GUI waits for the reply to its last "land" before tearing down anyway
+LAND_WAIT = 5.0
+
+# Queue priorities: lower runs first
+PRIORITY_PREEMPT = 0
+PRIORITY_NORMAL = 1
+
+
+class TelloCommandError(Exception):
+    pass
+
+
+class _TelloProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, data, address):
+        self.client._on_reply(data)
+
+    def error_received(self, exc):
+        print(f"Tello command link error: {exc}")
+
+
+class AsyncTelloClient:
+    def __init__(self, host=TELLO_IP, port=CONTROL_UDP_PORT, late_reply_window=0.5):
+        self.address = (host, port)
+        self.late_reply_window = late_reply_window
+        self.loop = None
+        self.transport = None
+        self.queue = None
+        self.in_flight = None
+        self._thread = None
+        self._task = None
+        self._order = itertools.count()
+
+        self.is_flying = False
+        self.stats = {"sent": 0, "ok": 0, "errors": 0, "timeouts": 0, "preempted": 0, "late_replies": 0}
+
+    def start(self):
+        """Start the event loop thread and open the command socket"""
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._open())
+        ready.set()
+        self.loop.run_forever()
+        # stop() was called: close the socket and let the command task unwind before closing the loop
+        self.transport.close()
+        self._task.cancel()
+        self.loop.run_until_complete(asyncio.gather(self._task, return_exceptions=True))
+        self.loop.close()
+
+    async def _open(self):
+        self.transport, _ = await self.loop.create_datagram_endpoint(lambda: _TelloProtocol(self),
+                                                                     remote_addr=self.address)
+        self.queue = asyncio.PriorityQueue()
+        self._task = self.loop.create_task(self._process())
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Thread-safe API, returns concurrent.futures.Future objects resolved with the Tello's reply
+
+    def submit(self, command, timeout=None):
+        return asyncio.run_coroutine_threadsafe(self.execute(command, timeout), self.loop)
+
+    def takeoff(self):
+        return self.submit("takeoff")
+
+    def land(self):
+        return self.submit("land")
+
+    def emergency(self):
+        return self.submit("emergency")
+
+    def flip(self, direction):
+        """direction is 'left', 'right', 'forward' or 'back'"""
+        return self.submit(f"flip {direction[0]}")
+
+    def send_rc(self, left_right_velocity, forward_backward_velocity, up_down_velocity, yaw_velocity):
+        """RC commands have no reply, so they skip the queue"""
+        command = f"rc {left_right_velocity} {forward_backward_velocity} {up_down_velocity} {yaw_velocity}"
+        try:
+            self.loop.call_soon_threadsafe(self._send, command)
+        except RuntimeError:
+            # The client was stopped while the video loop was still steering
+            pass
+
+    # ------------------------------------------------------------------------------------------------------------
+    # Event loop side
+
+    def _send(self, command):
+        self.transport.sendto(command.encode("utf-8"))
+        self.stats["sent"] += 1
+
+    async def execute(self, command, timeout=None):
+        """Queue a command and wait for its reply"""
+        name = command.split()[0]
+        timeout = timeout or TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+        priority = PRIORITY_NORMAL
+
+        if name in ("land", "emergency"):
+            self._cancel_queued(command)
+            priority = PRIORITY_PREEMPT
+        if name == "emergency":
+            # Motors off now: do not wait for whatever is in flight, and fail it, or the 'ok' to the emergency
+            # would be taken as its reply and a takeoff in flight would leave the drone marked as flying
+            if self.in_flight is not None and not self.in_flight.done():
+                self.in_flight.set_exception(TelloCommandError(command))
+            self._send(command)
+            self.is_flying = False
+            return "ok"
+
+        reply = self.loop.create_future()
+        await self.queue.put((priority, next(self._order), command, timeout, reply))
+        return await reply
+
+    def _cancel_queued(self, command):
+        while not self.queue.empty():
+            *_, queued_command, _, reply = self.queue.get_nowait()
+            if not reply.done():
+                reply.set_exception(TelloCommandError(f"'{queued_command}' preempted by '{command}'"))
+                self.stats["preempted"] += 1
+
+    async def _process(self):
+        while True:
+            _, _, command, timeout, reply = await self.queue.get()
+            if reply.done():
+                continue
+
+            self.in_flight = self.loop.create_future()
+            self._send(command)
+            try:
+                response = await asyncio.wait_for(self.in_flight, timeout)
+            except asyncio.TimeoutError:
+                self.in_flight = None
+                self.stats["timeouts"] += 1
+                if command == "takeoff":
+                    # Only the reply may have been lost: assume the drone is up, so closing the GUI still lands it
+                    self.is_flying = True
+                if not reply.done():
+                    reply.set_exception(TelloCommandError(f"'{command}' got no reply within {timeout} s"))
+                # Let a late reply to this command arrive and be dropped before sending the next one
+                await asyncio.sleep(self.late_reply_window)
+                continue
+            except TelloCommandError as e:
+                self.in_flight = None
+                self.stats["preempted"] += 1
+                if not reply.done():
+                    reply.set_exception(TelloCommandError(f"'{command}' preempted by '{e}'"))
+                # The reply to the emergency is still on its way; drop it before sending the next command
+                await asyncio.sleep(self.late_reply_window)
+                continue
+            self.in_flight = None
+
+            if response.startswith("error"):
+                self.stats["errors"] += 1
+                if not reply.done():
+                    reply.set_exception(TelloCommandError(f"'{command}' failed: {response}"))
+                continue
+
+            self.stats["ok"] += 1
+            if command == "takeoff":
+                self.is_flying = True
+            elif command == "land":
+                self.is_flying = False
+            if not reply.done():
+                reply.set_result(response)
+
+    def _on_reply(self, data):
+        response = data.decode("utf-8", errors="ignore").strip()
+        if self.in_flight is not None and not self.in_flight.done():
+            self.in_flight.set_result(response)
+        else:
+            self.stats["late_replies"] += 1
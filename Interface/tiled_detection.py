@@ -0,0 +1,139 @@
+"""
+Tiled face detection on the full-size frame, spread over worker processes.
+
+Faces are detected on a quarter-size copy of the frame because the detector
+costs about as much per pixel as it finds faces small: on the full frame one
+core takes several times longer than the video allows. TiledDetector cuts the
+full-size frame into overlapping tiles and detects on each in a pool of worker
+processes, one per core, so the wall time per frame falls near linearly with
+the cores there are:
+
+  - the overlap is wider than the largest face a tile is meant to find, so
+    every such face is whole in at least one tile;
+  - one more job detects on a coarse copy of the whole frame, for faces too
+    large to fit in the overlap, at a sixteenth of the cost of a tile pass;
+  - merge_detections() then drops the duplicates found in two tiles, or in a
+    tile and the coarse pass, and the pieces of faces cut by a tile edge.
+
+Workers are separate processes rather than threads because dlib holds the GIL
+while it detects. They are started with spawn on every platform, as Windows has
+nothing else, and each builds its own copy of the encoder's detector, which
+takes a second or two, so start() them before the mission rather than on the
+first frame.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# Encoders built in this worker process, by name
+_encoders = {}
+
+
+def tile_grid(width, height, tiles=(2, 2), overlap=96):
+    """(top, right, bottom, left) of `tiles` (columns, rows) tiles covering a frame, overlapping by `overlap` px"""
+    columns, rows = tiles
+
+    def spans(size, count):
+        step = (size - overlap) / count
+        if step <= 0:
+            return [(0, size)]
+        return [(int(i * step), min(size, int((i + 1) * step) + overlap)) for i in range(count)]
+
+    return [(top, right, bottom, left) for top, bottom in spans(height, rows) for left, right in spans(width, columns)]
+
+
+def parse_tiles(spec):
+    """(columns, rows) from a 'COLUMNSxROWS' spec like '3x2'"""
+    try:
+        columns, rows = (int(n) for n in spec.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Expected tiles as COLUMNSxROWS, like 2x2, got '{spec}'") from None
+    if columns < 1 or rows < 1:
+        raise ValueError(f"Expected at least one tile, got '{spec}'")
+    return columns, rows
+
+
+def merge_detections(boxes, threshold=0.5):
+    """
+    Non-maximum suppression of (top, right, bottom, left) boxes: of boxes
+    covering more than `threshold` of the smaller one, only the largest is
+    kept, so a face cut by a tile edge gives way to the whole face.
+    """
+    kept = []
+    for box in sorted(boxes, key=lambda b: (b[1] - b[3]) * (b[2] - b[0]), reverse=True):
+        top, right, bottom, left = box
+        area = (right - left) * (bottom - top)
+        for other_top, other_right, other_bottom, other_left in kept:
+            overlap_width = min(right, other_right) - max(left, other_left)
+            overlap_height = min(bottom, other_bottom) - max(top, other_top)
+            # The box kept first is the larger one
+            if overlap_width > 0 and overlap_height > 0 and overlap_width * overlap_height > threshold * area:
+                break
+        else:
+            kept.append(box)
+    return kept
+
+
+def _encoder(name):
+    if name not in _encoders:
+        from face_encoders import create_encoder
+        _encoders[name] = create_encoder(name)
+    return _encoders[name]
+
+
+def _locate(encoder_name, rgb_image):
+    """Run in a worker: the faces in one tile"""
+    return _encoder(encoder_name).locate(rgb_image)
+
+
+class TiledDetector:
+    def __init__(self, tiles=(2, 2), overlap=96, workers=None, coarse_scale=0.25):
+        # Columns and rows the frame is cut into, and how far neighbouring tiles overlap (full-frame pixels)
+        self.tiles = tiles
+        self.overlap = overlap
+        # Worker processes; one per core by default, as there are only tiles + 1 jobs per frame to go round
+        self.workers = workers or min(os.cpu_count() or 1, tiles[0] * tiles[1] + 1)
+        # Size of the copy of the whole frame searched for faces too large for the overlap; None to skip it
+        self.coarse_scale = coarse_scale
+        self.pool = None
+
+    def __repr__(self):
+        columns, rows = self.tiles
+        return f"{columns}x{rows} tiles, {self.workers} worker{'s' if self.workers > 1 else ''}"
+
+    def start(self, encoder_name):
+        """Start the workers and have each build the encoder's detector, waiting until they have"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        # The pool only starts a worker when every running one is busy, so one warm-up job each starts them all
+        blank = np.zeros((120, 180, 3), dtype=np.uint8)
+        for future in [self.pool.submit(_locate, encoder_name, blank) for _ in range(self.workers)]:
+            future.result()
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def locate(self, rgb_image, encoder_name):
+        """(top, right, bottom, left) of the faces in a full-size RGB frame"""
+        if self.pool is None:
+            self.start(encoder_name)
+        height, width = rgb_image.shape[:2]
+        jobs = []
+        for top, right, bottom, left in tile_grid(width, height, self.tiles, self.overlap):
+            jobs.append((self.pool.submit(_locate, encoder_name, rgb_image[top:bottom, left:right]), top, left, 1.0))
+        if self.coarse_scale:
+            coarse = cv2.resize(rgb_image, None, fx=self.coarse_scale, fy=self.coarse_scale)
+            jobs.append((self.pool.submit(_locate, encoder_name, coarse), 0, 0, self.coarse_scale))
+
+        boxes = []
+        for future, y, x, scale in jobs:
+            for top, right, bottom, left in future.result():
+                boxes.append((int(top / scale) + y, int(right / scale) + x, int(bottom / scale) + y,
+                              int(left / scale) + x))
+        return merge_detections(boxes)
@@ -0,0 +1,165 @@
+"""
+Low-latency reader for the Tello video port.
+
+djitellopy's BackgroundFrameRead lets FFmpeg pick its own decoder threading
+(frame threading holds back one frame per thread), buffers input, and turns
+every decoded frame into a full 960x720 PIL image and then a numpy array,
+whether or not anything reads it. VideoIngest is a drop-in replacement (a
+`frame` attribute, start() and stop()) that:
+
+- opens the stream with FFmpeg's no-buffer and low-delay flags and decodes
+  with `threads` slice threads, which split one frame rather than delaying it;
+- converts a decoded frame only when `frame` is read, so frames that are
+  replaced before anyone reads them cost their decode and nothing else;
+- converts straight to `output_size` in the same pass as the colour
+  conversion, instead of converting at full size and resizing later;
+- while downstream is saturated (busy_after decoded frames in a row went
+  unread) asks the decoder to skip non-reference frames. Every frame the
+  decoder still needs is decoded, so the picture never breaks up.
+
+The stats property reports decode and conversion cost and the age of frames
+when they are read; `python benchmarks.py ingest` compares it with the
+djitellopy path on a recorded or synthetic H.264 stream.
+"""
+
+import threading
+import time
+import av
+import numpy as np
+
+TELLO_VIDEO_ADDRESS = "udp://@0.0.0.0:11111"
+
+
+class IngestStats:
+    def __init__(self):
+        self.decoded = 0
+        # Decoded frames replaced by a newer one before they were read, so never converted
+        self.unread = 0
+        self.converted = 0
+        self.skipping = 0
+        self.decode_time = 0.0
+        self.convert_time = 0.0
+        # Seconds from a frame's data arriving to its first read
+        self.ages = []
+
+    def summary(self):
+        return {
+            "decoded": self.decoded,
+            "unread": self.unread,
+            "converted": self.converted,
+            "frames decoded while skipping": self.skipping,
+            "decode ms/frame": round(self.decode_time * 1000 / max(1, self.decoded), 2),
+            "convert ms/frame": round(self.convert_time * 1000 / max(1, self.converted), 2),
+            "age at read ms": round(float(np.mean(self.ages)) * 1000, 1) if self.ages else None,
+        }
+
+
+class VideoIngest:
+    def __init__(self, address=TELLO_VIDEO_ADDRESS, threads=1, low_delay=True, output_size=None,
+                 pixel_format="rgb24", skip_when_busy=True, busy_after=2, fast_decode=False, open_timeout=10.0,
+                 read_timeout=5.0, on_frame=None):
+        self.address = address
+        self.threads = threads
+        self.low_delay = low_delay
+        # (width, height) to convert decoded frames to, or None for the stream's own size
+        self.output_size = output_size
+        # rgb24 like BackgroundFrameRead, or bgr24 for OpenCV
+        self.pixel_format = pixel_format
+        self.skip_when_busy = skip_when_busy
+        self.busy_after = busy_after
+        # Skip the in-loop deblocking filter: cheaper decoding for a slightly blockier picture
+        self.fast_decode = fast_decode
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        # Called on the decode thread after every decoded frame; must be thread-safe
+        self.on_frame = on_frame
+
+        self.stats = IngestStats()
+        self.error = None
+        self.container = None
+        self._lock = threading.Lock()
+        # Newest decoded av.VideoFrame not read yet, and when its data arrived
+        self._pending = None
+        self._pending_arrival = None
+        self._frame = np.zeros((300, 400, 3), dtype=np.uint8)
+        # perf_counter() time the packets of the current frame arrived, None for the placeholder
+        self.frame_arrival = None
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """Open the stream and decode it on a background thread"""
+        options = {"fflags": "nobuffer", "flags": "low_delay"} if self.low_delay else {}
+        self.container = av.open(self.address, options=options, timeout=(self.open_timeout, self.read_timeout))
+        stream = self.container.streams.video[0]
+        codec_context = stream.codec_context
+        codec_context.thread_type = "SLICE"
+        codec_context.thread_count = self.threads
+        if self.low_delay:
+            codec_context.flags |= av.codec.context.Flags.low_delay
+        if self.fast_decode:
+            codec_context.options = {"skip_loop_filter": "all"}
+        self._thread = threading.Thread(target=self._decode, args=(stream,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+
+    def _decode(self, stream):
+        codec_context = stream.codec_context
+        unread_in_a_row = 0
+        try:
+            for packet in self.container.demux(stream):
+                if self._stopped:
+                    break
+                arrival = time.perf_counter()
+                start = time.perf_counter()
+                frames = codec_context.decode(packet)
+                self.stats.decode_time += time.perf_counter() - start
+                for frame in frames:
+                    self.stats.decoded += 1
+                    if codec_context.skip_frame != "DEFAULT":
+                        self.stats.skipping += 1
+                    with self._lock:
+                        if self._pending is not None:
+                            self.stats.unread += 1
+                            unread_in_a_row += 1
+                        else:
+                            unread_in_a_row = 0
+                        self._pending = frame
+                        self._pending_arrival = arrival
+                    if self.on_frame is not None:
+                        self.on_frame()
+                if self.skip_when_busy:
+                    skip = "NONREF" if unread_in_a_row >= self.busy_after else "DEFAULT"
+                    if codec_context.skip_frame != skip:
+                        codec_context.skip_frame = skip
+        except (av.error.FFmpegError, OSError) as e:
+            if not self._stopped:
+                self.error = e
+                print(f"Video ingest stopped: {e}")
+        finally:
+            self.container.close()
+
+    @property
+    def frame(self):
+        """The newest frame as a numpy array; the same object until a newer frame is decoded"""
+        with self._lock:
+            if self._pending is not None:
+                start = time.perf_counter()
+                if self.output_size is not None:
+                    width, height = self.output_size
+                    self._frame = self._pending.to_ndarray(width=width, height=height, format=self.pixel_format)
+                else:
+                    self._frame = self._pending.to_ndarray(format=self.pixel_format)
+                now = time.perf_counter()
+                self.stats.convert_time += now - start
+                self.stats.converted += 1
+                self.stats.ages.append(now - self._pending_arrival)
+                self.frame_arrival = self._pending_arrival
+                if len(self.stats.ages) > 1000:
+                    del self.stats.ages[:500]
+                self._pending = None
+            return self._frame
+
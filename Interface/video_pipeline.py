@@ -0,0 +1,158 @@
+"""
+The video loop every controller runs.
+
+Each tick reads the newest frame from a source (see frame_sources.py), resizes
+it into a pooled buffer, hands it to the controller's `process` step
+(recognition, following, drawing), shows the result and gives the buffer back.
+Until the source has a frame its status is shown instead. The controllers used
+to carry their own copy of this loop; now an optimization made here reaches
+all of them.
+
+Ticks come from the source rather than a polling timer:
+
+  - attach(label) shows the video on a Tk label and ticks whenever the source
+    signals something new, through a FrameSignal;
+  - run() ticks on the calling thread without a window, for benchmarks and
+    test runs. A file opened with realtime=False is then played as fast as the
+    pipeline goes, every frame in order, so two runs see the same frames.
+
+    pipeline = VideoPipeline(open_source("clip.mp4", realtime=False).start(), process)
+    print(pipeline.run().summary())
+"""
+
+import threading
+import time
+from frame_pool import FramePool
+
+
+class PipelineStats:
+    def __init__(self):
+        # Frames processed and shown
+        self.frames = 0
+        # Wake-ups that brought no new frame: status changes, or a frame that was already shown
+        self.repeats = 0
+        # Seconds spent in process() and on the display
+        self.busy_time = 0.0
+        self.first_frame = None
+        self.last_frame = None
+
+    @property
+    def fps(self):
+        if self.frames < 2:
+            return 0.0
+        return (self.frames - 1) / max(1e-6, self.last_frame - self.first_frame)
+
+    def summary(self):
+        per_frame = self.busy_time / self.frames * 1000 if self.frames else 0.0
+        return f"{self.frames} frames at {self.fps:.1f} fps, {per_frame:.1f} ms per frame, {self.repeats} repeats"
+
+
+class VideoPipeline:
+    def __init__(self, source, process=None, frame_size=(720, 480), pool=None, overlay=None, startup=None,
+                 governor=None, flying=None):
+        self.source = source
+        # process(frame, arrival) returns the frame to show. It gets a pooled copy of the newest frame at frame_size
+        # to draw on, and the perf_counter() time the frame arrived
+        self.process = process
+        self.frame_size = frame_size
+        # The recognition pipeline's pool when there is one, so both reuse the same buffers
+        self.pool = pool if pool is not None else FramePool()
+        # overlay(frame) draws on everything shown, the status placeholder included (e.g. the telemetry HUD)
+        self.overlay = overlay
+        # Optional StartupTimer that gets the 'first frame' stage
+        self.startup = startup
+        # Optional QualityGovernor, fed the arrival times and allowed to set the display rate
+        self.governor = governor
+        # Callable returning whether the drone is in the air, for the governor's landed profile
+        self.flying = flying
+
+        self.stats = PipelineStats()
+        # The frame process() is working on as the source gave it, before the resize: at the camera's own size for a
+        # source opened with frame_size=None, for tiled detection. None outside process()
+        self.source_frame = None
+        self.view = None
+        self.signal = None
+        self._last_arrival = None
+
+    def attach(self, label, root=None):
+        """Show the video on a Tk label, repainting whenever the source has something new"""
+        from gui_helpers import FrameSignal, TkFrameView
+        self.view = TkFrameView(label, self.pool)
+        self.signal = FrameSignal(root if root is not None else label, self._on_signal)
+        self.source.on_frame = self.signal.set
+        # Show the source status straight away; from then on the source's notifications drive the display
+        self.signal.set()
+        return self
+
+    def _on_signal(self):
+        self.tick()
+        if not self.source.realtime and not self.source.finished:
+            # A file played as fast as possible signals nothing; ask for the next frame straight away
+            self.signal.set()
+
+    def tick(self):
+        """Show the newest frame, or the source status until there is one. True if a new frame was processed"""
+        frame, arrival = self.source.read()
+        if frame is None:
+            self._show(self.source.status_frame(self.frame_size))
+            return False
+        if arrival == self._last_arrival:
+            self.stats.repeats += 1
+            return False
+        self._last_arrival = arrival
+
+        start = time.perf_counter()
+        # A copy in a pooled buffer: sources hand out the same frame until a new one arrives
+        self.source_frame = frame
+        frame = self.pool.resize(frame, self.frame_size)
+        try:
+            self._show(self.process(frame, arrival) if self.process is not None else frame)
+        finally:
+            self.pool.give_back(frame)
+            self.source_frame = None
+        now = time.perf_counter()
+        stats = self.stats
+        stats.frames += 1
+        stats.busy_time += now - start
+        stats.first_frame = stats.first_frame or now
+        stats.last_frame = now
+        if self.startup is not None and self.startup.elapsed("first frame") is None:
+            self.startup.mark("first frame")
+
+        if self.governor is not None:
+            self.governor.record_frame(arrival)
+            self.governor.update(self.flying() if self.flying is not None else True)
+            if self.signal is not None:
+                self.signal.min_interval = self.governor.display_interval
+        return True
+
+    def _show(self, frame):
+        if self.overlay is not None:
+            frame = self.overlay(frame)
+        if self.view is not None:
+            self.view.show(frame)
+
+    def run(self, max_frames=None, duration=None):
+        """
+        Tick on this thread, without a window, until the source finishes,
+        max_frames frames are processed or duration seconds pass. Returns the
+        stats.
+        """
+        wake = threading.Event()
+        self.source.on_frame = wake.set
+        end = time.perf_counter() + duration if duration is not None else None
+        while not (max_frames is not None and self.stats.frames >= max_frames):
+            if end is not None and time.perf_counter() >= end:
+                break
+            if self.source.realtime:
+                wake.wait(0.1 if end is None else max(0.0, min(0.1, end - time.perf_counter())))
+                wake.clear()
+            self.tick()
+            if self.source.finished:
+                break
+        return self.stats
+
+    def stop(self):
+        if self.signal is not None:
+            self.signal.close()
+        self.source.stop()
@@ -0,0 +1,54 @@
+import numpy as np
+
+from face_encoders import SFaceEncoder
+
+
+class CropDetector(SFaceEncoder):
+    """SFaceEncoder without the ONNX models: _detect() finds one face at a fixed place in whatever it is given"""
+
+    def __init__(self, row):
+        self._last_detections = {}
+        self.row = np.asarray(row, dtype=np.float32)
+
+    def _detect(self, bgr_image):
+        return self.row[None, :].copy()
+
+
+def yunet_row(x, y, width, height):
+    # Box, then right eye, left eye, nose tip and mouth corners, then the score
+    landmarks = [x + 0.3 * width, y + 0.4 * height, x + 0.7 * width, y + 0.4 * height, x + 0.5 * width,
+                 y + 0.6 * height, x + 0.35 * width, y + 0.8 * height, x + 0.65 * width, y + 0.8 * height]
+    return [x, y, width, height, *landmarks, 0.9]
+
+
+def test_detection_in_a_crop_is_moved_to_image_coordinates():
+    encoder = CropDetector(yunet_row(10, 12, 40, 48))
+    image = np.zeros((480, 720, 3), dtype=np.uint8)
+    # A box from another detector, away from the origin, so the landmarks are looked for in a crop
+    top, right, bottom, left = 200, 360, 260, 300
+    row = encoder._detection_for(image, (top, right, bottom, left))
+
+    pad = (bottom - top) // 4
+    x0, y0 = left - pad, top - pad
+    np.testing.assert_allclose(row, yunet_row(10 + x0, 12 + y0, 40, 48))
+
+
+def test_sface_accepts_matches_down_to_the_calibrated_similarity():
+    from face_gallery import Gallery
+    from face_recognition_system import FaceRecognition
+
+    encoder = CropDetector(yunet_row(0, 0, 1, 1))
+    recognition = FaceRecognition(None, encoder, load=False, watch_gallery=False)
+    known = np.zeros(128, dtype=np.float32)
+    known[0] = 1.0
+    recognition.gallery = Gallery(encoder.name, ["alice"], [known])
+
+    def probe(similarity):
+        encoding = np.zeros(128, dtype=np.float32)
+        encoding[0], encoding[1] = similarity, np.sqrt(1 - similarity ** 2)
+        return recognition.match_face(encoding)[0]
+
+    # OpenCV's published operating point for SFace is a cosine similarity of 0.363
+    assert probe(0.9) == "alice"
+    assert probe(0.37) == "alice"
+    assert probe(0.35) == "Unknown"
@@ -0,0 +1,62 @@
+from face_tracker import FaceTracker
+
+
+def box_at(x, y=100, size=60):
+    """(top, right, bottom, left) box of a face whose top-left corner is at (x, y)"""
+    return (y, x + size, y + size, x)
+
+
+def walk(tracker, start, frames, step=5):
+    """Feed a face moving `step` px to the right per frame and return the track ids it got"""
+    return [tracker.update([box_at(start + step * i)])[0].id for i in range(frames)]
+
+
+def test_track_id_persists_while_the_face_moves():
+    tracker = FaceTracker()
+    ids = walk(tracker, 100, 20)
+    assert ids == [ids[0]] * 20
+    assert len(tracker.tracks) == 1
+
+
+def test_two_faces_keep_their_ids():
+    tracker = FaceTracker()
+    first = tracker.update([box_at(100), box_at(400)])
+    for i in range(1, 15):
+        # Listed in the other order every other frame; the ids must follow the boxes, not the order
+        boxes = [box_at(100 + 5 * i), box_at(400 - 5 * i)]
+        tracks = tracker.update(boxes if i % 2 else boxes[::-1])
+        ids = [t.id for t in tracks] if i % 2 else [t.id for t in tracks][::-1]
+        assert ids == [first[0].id, first[1].id]
+
+
+def test_occluded_track_coasts_and_is_picked_up_again():
+    tracker = FaceTracker(max_missing=5)
+    track_id = walk(tracker, 100, 10)[-1]
+    last = tracker.get(track_id).predicted_location
+
+    # Hidden for fewer frames than max_missing: the track stays, predicted along its motion
+    for misses in range(1, 4):
+        assert tracker.update([]) == []
+        track = tracker.get(track_id)
+        assert track is not None and track.misses == misses
+        assert track.predicted_location[3] > last[3]
+        last = track.predicted_location
+
+    # It reappears where it would have got to, and continues the same track
+    track = tracker.update([box_at(100 + 5 * 13)])[0]
+    assert track.id == track_id and track.misses == 0
+    assert len(tracker.tracks) == 1
+
+
+def test_track_is_deleted_after_max_missing_frames():
+    tracker = FaceTracker(max_missing=5)
+    track_id = walk(tracker, 100, 10)[-1]
+
+    for _ in range(5):
+        tracker.update([])
+    assert tracker.get(track_id) is not None
+    tracker.update([])
+    assert tracker.get(track_id) is None and tracker.tracks == []
+
+    # The same face coming back is a new track
+    assert tracker.update([box_at(100 + 5 * 16)])[0].id != track_id
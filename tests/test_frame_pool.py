@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+
+from face_encoders import FaceEncoder
+from face_recognition_system import FaceRecognition
+from frame_pool import FramePool
+from frame_sources import FrameSource
+from video_pipeline import VideoPipeline
+
+
+class NoFacesEncoder(FaceEncoder):
+    """Finds nothing, so only the frame handling around the encoder runs"""
+    name = "none"
+
+    def locate(self, rgb_image):
+        return []
+
+    def encode(self, rgb_image, face_locations):
+        return np.empty((0, 128))
+
+
+class ListSource(FrameSource):
+    """Hands out the frames of a list in turn, one per read(), like a file played with realtime=False"""
+    realtime = False
+
+    def __init__(self, frames):
+        super().__init__()
+        self.frames = frames
+        self.count = 0
+
+    def read(self):
+        frame = self.frames[self.count % len(self.frames)]
+        self.count += 1
+        return frame, time.perf_counter()
+
+
+def moving_frames(count=30, size=(960, 720)):
+    # A moving scene, so the motion gate lets every frame through to detection
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    return [np.roll(background, 7 * i, axis=1) for i in range(count)]
+
+
+def recognition_pipeline(frames):
+    recognition = FaceRecognition(None, NoFacesEncoder(), load=False, watch_gallery=False)
+    recognition.ready.set()
+
+    def process(frame, arrival):
+        results = recognition.recognize_faces(frame)
+        return recognition.display_results(recognition.display_stats(frame), *results)
+
+    return recognition, VideoPipeline(ListSource(frames), process, pool=recognition.frame_pool)
+
+
+def test_pool_reuses_buffers():
+    pool = FramePool()
+    first = pool.borrow((480, 720, 3))
+    pool.give_back(first)
+    assert pool.borrow((480, 720, 3)) is first
+    assert pool.allocations == 1 and pool.borrows == 2 and pool.outstanding == 1
+
+
+def test_pipeline_ticks_allocate_nothing_after_warm_up():
+    recognition, pipeline = recognition_pipeline(moving_frames())
+    pool = recognition.frame_pool
+    pipeline.run(max_frames=10)
+    warm_allocations = pool.allocations
+    # The motion gate keeps its reference frame borrowed
+    warm_outstanding = pool.outstanding
+
+    pipeline.run(max_frames=110)
+    assert pipeline.stats.frames == 110
+    assert pool.allocations == warm_allocations
+    assert pool.outstanding == warm_outstanding
+    assert pool.borrows > warm_allocations
@@ -0,0 +1,48 @@
+import numpy as np
+
+from face_encoders import FaceEncoder
+from gallery_store import GalleryStore
+
+
+class L2Encoder(FaceEncoder):
+    """Only the distance of the dlib encoders, which is all matching a gallery needs"""
+    name = "l2-test"
+
+    def distance(self, encodings, encoding):
+        return np.linalg.norm(encodings - encoding, axis=1)
+
+
+def random_encodings(count, seed):
+    return np.random.default_rng(seed).normal(size=(count, 128)).astype(np.float32)
+
+
+def test_appended_segments_reload_as_one_memory_mapped_gallery(tmp_path):
+    path = str(tmp_path / "watchlist.gallery")
+    first, second = random_encodings(5, 0), random_encodings(3, 1)
+    store = GalleryStore.create(path, L2Encoder.name)
+    store = store.append([f"a{i}" for i in range(5)], first, metadata=[{"row": i} for i in range(5)])
+    # A reader opened before the second append keeps seeing the first segment only
+    reader = GalleryStore.open(path)
+    store.append([f"b{i}" for i in range(3)], second)
+
+    assert len(reader) == 5
+    reloaded = GalleryStore.open(path, L2Encoder())
+    assert len(reloaded) == 8 and len(reloaded.segments) == 2
+    assert all(isinstance(segment, np.memmap) for segment in reloaded.segments)
+    assert reloaded.names == [f"a{i}" for i in range(5)] + [f"b{i}" for i in range(3)]
+    np.testing.assert_array_equal(reloaded.encodings, np.vstack([first, second]))
+    # Rows either side of the segment boundary
+    np.testing.assert_array_equal(reloaded.rows([4, 5]), np.vstack([first[4], second[0]]))
+    assert reloaded.metadata(2) == {"row": 2} and reloaded.metadata(6) == {}
+
+    assert reloaded.match(L2Encoder(), second[1]) == (6, 0.0)
+
+
+def test_float16_store_matches_like_float32(tmp_path):
+    encodings = random_encodings(50, 2)
+    store = GalleryStore.create(str(tmp_path / "half.gallery"), L2Encoder.name, dtype="float16")
+    store = store.append([str(i) for i in range(50)], encodings)
+
+    assert store.segments[0].dtype == np.float16
+    probes = encodings + random_encodings(50, 3) * 0.05
+    assert [store.match(L2Encoder(), probe)[0] for probe in probes] == list(range(50))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from face_encoders import FaceEncoder
+from face_gallery import Gallery
+from quantized_index import Int8Index
+
+
+class L2Encoder(FaceEncoder):
+    name = "l2-test"
+
+    def distance(self, encodings, encoding):
+        return np.linalg.norm(encodings - encoding, axis=1)
+
+
+class CosineEncoder(FaceEncoder):
+    """Unit-length encodings compared by cosine distance, like SFace"""
+    name = "cosine-test"
+    metric = "cosine"
+
+    def distance(self, encodings, encoding):
+        return 1.0 - encodings @ encoding
+
+
+def unit(rows):
+    return rows / np.linalg.norm(rows, axis=-1, keepdims=True)
+
+
+@pytest.mark.parametrize("encoder", [L2Encoder(), CosineEncoder()], ids=lambda encoder: encoder.metric)
+def test_int8_pass_and_rerank_find_the_brute_force_best_match(encoder):
+    rng = np.random.default_rng(0)
+    encodings = unit(rng.normal(size=(5000, 128))).astype(np.float32)
+    exact = Gallery(encoder.name, [str(i) for i in range(len(encodings))], encodings)
+    quantized = Gallery(encoder.name, exact.names, encodings).quantize(encoder, rerank_k=8)
+
+    # Noisy views of gallery members, and faces that are in nobody's neighbourhood
+    probes = np.vstack([unit(encodings[:50] + rng.normal(scale=0.03, size=(50, 128))),
+                        unit(rng.normal(size=(50, 128)))]).astype(np.float32)
+    for probe in probes:
+        best, distance = quantized.match(encoder, probe)
+        assert (best, distance) == pytest.approx(exact.match(encoder, probe))
+
+
+def test_index_is_a_quarter_of_the_float32_gallery():
+    encodings = np.random.default_rng(1).normal(size=(1000, 128)).astype(np.float32)
+    index = Int8Index.build([encodings[:600], encodings[600:]])
+    assert len(index) == 1000
+    assert index.codes.nbytes == encodings.nbytes // 4
@@ -0,0 +1,32 @@
+import numpy as np
+
+from telemetry import TelemetryRecorder, TelemetryRing
+
+
+def sample(t):
+    return (t,) + (0,) * 16
+
+
+def test_window_is_a_contiguous_view_across_the_wrap_point():
+    ring = TelemetryRing(capacity=8)
+    for count in range(1, 21):
+        ring.append(sample(count))
+        for n in (1, 3, 8):
+            window = ring.window(n)
+            # Oldest first, even once the newest samples have wrapped round to the start of the ring
+            assert list(window["t"]) == list(range(max(1, count - n + 1), count + 1))
+            assert np.shares_memory(window, ring._data)
+            assert not window.flags.writeable
+    assert len(ring) == 8 and ring.latest()["t"] == 20
+
+
+def test_feed_parses_state_packets_and_skips_replies():
+    recorder = TelemetryRecorder(capacity=8)
+    recorder.feed(b"pitch:1;roll:-2;yaw:30;vgx:0;vgy:0;vgz:0;templ:60;temph:62;tof:120;h:100;bat:87;"
+                  b"baro:12.34;time:5;agx:1.00;agy:2.00;agz:-998.00;\r\n", received=1.5)
+    recorder.feed(b"ok")
+
+    latest = recorder.ring.latest()
+    assert (latest["t"], latest["bat"], latest["h"], latest["flight_time"]) == (1.5, 87, 100, 5)
+    assert latest["baro"] == np.float32(12.34)
+    assert recorder.packets == 1 and recorder.bad_packets == 1
@@ -0,0 +1,101 @@
+import socket
+import threading
+
+import pytest
+
+from tello_client import AsyncTelloClient, TelloCommandError
+
+
+class FakeTello:
+    """UDP endpoint standing in for the drone's command port; answers with replies[command], or not at all if None"""
+
+    def __init__(self, replies=None):
+        self.replies = replies or {}
+        self.received = []
+        self.got = threading.Condition()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.settimeout(0.1)
+        self.address = self.socket.getsockname()
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, sender = self.socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            command = data.decode("utf-8")
+            with self.got:
+                self.received.append(command)
+                self.got.notify_all()
+            reply = self.replies.get(command.split()[0], "ok")
+            if reply is not None:
+                self.socket.sendto(reply.encode("utf-8"), sender)
+
+    def wait_for(self, count, timeout=2.0):
+        with self.got:
+            assert self.got.wait_for(lambda: len(self.received) >= count, timeout)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.socket.close()
+
+
+@pytest.fixture
+def connect():
+    opened = []
+
+    def connect(replies=None):
+        tello = FakeTello(replies)
+        client = AsyncTelloClient(*tello.address, late_reply_window=0.05).start()
+        opened.append((tello, client))
+        return tello, client
+
+    yield connect
+    for tello, client in opened:
+        client.stop()
+        client._thread.join()
+        tello.close()
+
+
+def test_is_flying_follows_the_replies(connect):
+    tello, client = connect({"takeoff": "error Motor stop"})
+    with pytest.raises(TelloCommandError):
+        client.takeoff().result(timeout=2)
+    assert not client.is_flying
+
+    tello.replies["takeoff"] = "ok"
+    assert client.takeoff().result(timeout=2) == "ok"
+    assert client.is_flying
+    assert client.land().result(timeout=2) == "ok"
+    assert not client.is_flying
+    assert tello.received == ["takeoff", "takeoff", "land"]
+
+
+def test_emergency_jumps_the_queue(connect):
+    # The takeoff gets no reply, so it stays in flight and the flip waits behind it
+    tello, client = connect({"takeoff": None})
+    takeoff = client.takeoff()
+    tello.wait_for(1)
+    flip = client.flip("left")
+
+    assert client.emergency().result(timeout=2) == "ok"
+    with pytest.raises(TelloCommandError, match="preempted"):
+        takeoff.result(timeout=2)
+    with pytest.raises(TelloCommandError, match="preempted"):
+        flip.result(timeout=2)
+    assert tello.received == ["takeoff", "emergency"]
+    assert not client.is_flying
+    assert client.stats["preempted"] == 2
+
+
+def test_takeoff_without_a_reply_counts_as_flying(connect):
+    tello, client = connect({"takeoff": None})
+    with pytest.raises(TelloCommandError, match="no reply"):
+        client.submit("takeoff", timeout=0.2).result(timeout=2)
+    assert client.is_flying
+    assert client.stats["timeouts"] == 1